@@ -1,101 +1,359 @@
-import sqlite3
-
-connection = sqlite3.connect("project_database.db")
-cursor = connection.cursor()
-
-cursor.execute("""
-CREATE TABLE IF NOT EXISTS TEAM_MEMBER (
-    Member_ID INTEGER PRIMARY KEY,
-    Email TEXT NOT NULL UNIQUE,
-    Phone INTEGER,
-    Name TEXT NOT NULL
-);
-""")
-
-
-cursor.execute("""
-CREATE TABLE IF NOT EXISTS SUB_TEAM (
-    Team_ID INTEGER PRIMARY KEY,
-    Description TEXT NOT NULL,
-    Responsibilities TEXT,
-    Team_Lead INTEGER NOT NULL,
-    FOREIGN KEY (Team_Lead) REFERENCES TEAM_MEMBER(Member_ID)
-);
-""")
-
-cursor.execute("""
-CREATE TABLE IF NOT EXISTS PROJECT (
-    Project_ID INTEGER PRIMARY KEY,
-    Start_Date DATE NOT NULL,
-    End_Date DATE NOT NULL,
-    In_Use BOOLEAN NOT NULL,
-    Owner INTEGER NOT NULL,
-    FOREIGN KEY (Owner) REFERENCES TEAM_MEMBER(Member_ID)
-);
-""")
-
-cursor.execute("""
-CREATE TABLE IF NOT EXISTS MATERIALS (
-    Name TEXT PRIMARY KEY NOT NULL,
-    Uses INTEGER,
-    Needs INTEGER,
-    Link TEXT,
-    Material_Type TEXT,
-    Description TEXT,
-    FOREIGN KEY (Uses) REFERENCES PROJECT(Project_ID),
-    FOREIGN KEY (Needs) REFERENCES MAINTENANCE_PROCEDURE(Procedure_ID)
-);
-""")
-
-cursor.execute("""
-CREATE TABLE IF NOT EXISTS MAINTENANCE_PROCEDURE (
-    Procedure_ID INTEGER PRIMARY KEY,
-    Description TEXT NOT NULL,
-    Last_Edited DATE NOT NULL,
-    Maintainer INTEGER NOT NULL,
-    FOREIGN KEY (Maintainer) REFERENCES TEAM_MEMBER(Member_ID)
-);
-""")
-
-cursor.execute("""
-CREATE TABLE IF NOT EXISTS DIMENSIONS (
-    Material TEXT NOT NULL,
-    Dimensions TEXT NOT NULL,
-    FOREIGN KEY (Material) REFERENCES MATERIALS(Name)
-);
-""")
-
-cursor.execute("""
-CREATE TABLE IF NOT EXISTS OUTSIDE_RESEARCH (
-    Research INTEGER,
-    Name TEXT PRIMARY KEY,
-    Description TEXT,
-    Link TEXT,
-    Reference_ID INTEGER,
-    FOREIGN KEY (Research) REFERENCES PROJECT(Project_ID),
-    FOREIGN KEY (Reference_ID) REFERENCES MAINTENANCE_PROCEDURE(Procedure_ID)
-);
-""")
-
-cursor.execute("""
-CREATE TABLE IF NOT EXISTS PROJECT_MEMBERS (
-    Project INTEGER NOT NULL,
-    Member INTEGER NOT NULL,
-    FOREIGN KEY (Project) REFERENCES PROJECT(Project_ID),
-    FOREIGN KEY (Member) REFERENCES TEAM_MEMBER(Member_ID)
-);
-""")
-
-cursor.execute("""
-CREATE TABLE IF NOT EXISTS PROCEDURE_CONTRIBUTERS (
-    Procedure INTEGER NOT NULL,
-    Member INTEGER NOT NULL,
-    FOREIGN KEY (Procedure) REFERENCES MAINTENANCE_PROCEDURE(Procedure_ID),
-    FOREIGN KEY (Member) REFERENCES TEAM_MEMBER(Member_ID)
-);
-""")
-
-connection.commit()
-connection.close()
-
-print("Database schema created successfully.")
+from Phase3database import connect_to_database
+
+
+def create_schema(cursor):
+    """
+    Creates every table used by the application if it does not already exist.
+    """
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS TEAM_MEMBER (
+        Member_ID INTEGER PRIMARY KEY,
+        Email TEXT NOT NULL UNIQUE,
+        Phone INTEGER,
+        Name TEXT NOT NULL
+    );
+    """)
+
+
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS SUB_TEAM (
+        Team_ID INTEGER PRIMARY KEY,
+        Description TEXT NOT NULL,
+        Responsibilities TEXT,
+        Team_Lead INTEGER NOT NULL,
+        FOREIGN KEY (Team_Lead) REFERENCES TEAM_MEMBER(Member_ID)
+    );
+    """)
+
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS PROJECT (
+        Project_ID INTEGER PRIMARY KEY,
+        Start_Date DATE NOT NULL,
+        End_Date DATE NOT NULL,
+        In_Use BOOLEAN NOT NULL,
+        Owner INTEGER NOT NULL,
+        FOREIGN KEY (Owner) REFERENCES TEAM_MEMBER(Member_ID)
+    );
+    """)
+
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS MATERIALS (
+        Name TEXT PRIMARY KEY NOT NULL,
+        Uses INTEGER,
+        Needs INTEGER,
+        Link TEXT,
+        Material_Type TEXT,
+        Description TEXT,
+        FOREIGN KEY (Uses) REFERENCES PROJECT(Project_ID),
+        FOREIGN KEY (Needs) REFERENCES MAINTENANCE_PROCEDURE(Procedure_ID)
+    );
+    """)
+
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS MAINTENANCE_PROCEDURE (
+        Procedure_ID INTEGER PRIMARY KEY,
+        Description TEXT NOT NULL,
+        Last_Edited DATE NOT NULL,
+        Maintainer INTEGER NOT NULL,
+        FOREIGN KEY (Maintainer) REFERENCES TEAM_MEMBER(Member_ID)
+    );
+    """)
+
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS DIMENSIONS (
+        Material TEXT NOT NULL,
+        Dimensions TEXT NOT NULL,
+        FOREIGN KEY (Material) REFERENCES MATERIALS(Name)
+    );
+    """)
+
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS OUTSIDE_RESEARCH (
+        Research INTEGER,
+        Name TEXT PRIMARY KEY,
+        Description TEXT,
+        Link TEXT,
+        Reference_ID INTEGER,
+        FOREIGN KEY (Research) REFERENCES PROJECT(Project_ID),
+        FOREIGN KEY (Reference_ID) REFERENCES MAINTENANCE_PROCEDURE(Procedure_ID)
+    );
+    """)
+
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS PROJECT_MEMBERS (
+        Project INTEGER NOT NULL,
+        Member INTEGER NOT NULL,
+        FOREIGN KEY (Project) REFERENCES PROJECT(Project_ID),
+        FOREIGN KEY (Member) REFERENCES TEAM_MEMBER(Member_ID)
+    );
+    """)
+
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS PROCEDURE_CONTRIBUTERS (
+        Procedure INTEGER NOT NULL,
+        Member INTEGER NOT NULL,
+        FOREIGN KEY (Procedure) REFERENCES MAINTENANCE_PROCEDURE(Procedure_ID),
+        FOREIGN KEY (Member) REFERENCES TEAM_MEMBER(Member_ID)
+    );
+    """)
+
+
+def create_indexes(cursor):
+    """
+    Creates an index for every foreign-key lookup path so the application's
+    WHERE clauses are served by an index search instead of a full table scan.
+    The membership indexes hold both columns so they cover the lookup on their own.
+    """
+    # Membership tables: forward (who is on this project) and reverse (what is this member on)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_project_members_project ON PROJECT_MEMBERS (Project, Member);")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_project_members_member ON PROJECT_MEMBERS (Member, Project);")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_procedure_contributers_procedure ON PROCEDURE_CONTRIBUTERS (Procedure, Member);")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_procedure_contributers_member ON PROCEDURE_CONTRIBUTERS (Member, Procedure);")
+
+    # Materials and research linked to projects and maintenance procedures
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_materials_uses ON MATERIALS (Uses);")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_materials_needs ON MATERIALS (Needs);")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_dimensions_material ON DIMENSIONS (Material, Dimensions);")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_outside_research_research ON OUTSIDE_RESEARCH (Research);")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_outside_research_reference ON OUTSIDE_RESEARCH (Reference_ID);")
+
+    # Owner / lead / maintainer references back to TEAM_MEMBER
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_sub_team_team_lead ON SUB_TEAM (Team_Lead);")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_project_owner ON PROJECT (Owner);")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_maintenance_procedure_maintainer ON MAINTENANCE_PROCEDURE (Maintainer);")
+
+
+# Membership tables: table -> (column of what the member belongs to, index on it and Member)
+MEMBERSHIP_TABLES = {
+    "PROJECT_MEMBERS": ("Project", "idx_project_members_project"),
+    "PROCEDURE_CONTRIBUTERS": ("Procedure", "idx_procedure_contributers_procedure"),
+}
+
+
+def create_membership_keys(cursor):
+    """
+    Makes each membership table's forward index unique, so a member is linked to a
+    project or procedure at most once. The tables must hold no duplicate pairs.
+    """
+    for table, (owner, index) in MEMBERSHIP_TABLES.items():
+        cursor.execute(f"DROP INDEX IF EXISTS {index};")
+        cursor.execute(f"CREATE UNIQUE INDEX {index} ON {table} ({owner}, Member);")
+
+
+def create_range_indexes(cursor):
+    """
+    Creates the indexes serving date-range queries: projects by In_Use and End_Date
+    (e.g. active projects ending this quarter) and procedures by Last_Edited.
+    """
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_project_in_use_end_date ON PROJECT (In_Use, End_Date);")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_maintenance_procedure_last_edited ON MAINTENANCE_PROCEDURE (Last_Edited);")
+
+
+# Columns whose stored values are checked by triggers: table -> {column: declared type}.
+# Dates must be ISO-8601 (YYYY-MM-DD) so they sort and compare as text, and booleans 0 or 1.
+CHECKED_COLUMNS = {
+    "PROJECT": {"Start_Date": "DATE", "End_Date": "DATE", "In_Use": "BOOLEAN"},
+    "MAINTENANCE_PROCEDURE": {"Last_Edited": "DATE"},
+}
+
+
+def invalid_value(column, column_type, row="new"):
+    # The '+0 days' makes date() roll an out-of-range day over (2024-02-30 to 2024-03-01)
+    if column_type == "DATE":
+        return f"{row}.{column} IS NOT date({row}.{column}, '+0 days')"
+    return f"{row}.{column} NOT IN (0, 1)"
+
+
+def create_value_checks(cursor):
+    """
+    Creates triggers refusing any insert or update that would store a date other than
+    YYYY-MM-DD or a boolean other than 0 or 1, whichever path the write comes from.
+    An update only checks the columns it changes.
+    """
+    for table, columns in CHECKED_COLUMNS.items():
+        message = f"{table}: " + ", ".join(f"{column} must be {'a YYYY-MM-DD date' if column_type == 'DATE' else '0 or 1'}"
+                                           for column, column_type in columns.items())
+        inserted = " OR ".join(invalid_value(column, column_type) for column, column_type in columns.items())
+        updated = " OR ".join(f"(new.{column} IS NOT old.{column} AND {invalid_value(column, column_type)})"
+                              for column, column_type in columns.items())
+        cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS {table}_check_insert BEFORE INSERT ON {table}
+        WHEN {inserted} BEGIN
+            SELECT RAISE(ABORT, '{message}');
+        END;
+        """)
+        cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS {table}_check_update BEFORE UPDATE OF {", ".join(columns)} ON {table}
+        WHEN {updated} BEGIN
+            SELECT RAISE(ABORT, '{message}');
+        END;
+        """)
+
+
+# Full-text search tables, the table each one indexes and the columns it indexes.
+# Each is an external-content FTS5 table keyed by its source table's rowid, so the
+# text is stored once and only the search index is added.
+SEARCH_TABLES = {
+    "MATERIALS_SEARCH": ("MATERIALS", ["Name", "Material_Type", "Description", "Link"]),
+    "OUTSIDE_RESEARCH_SEARCH": ("OUTSIDE_RESEARCH", ["Name", "Description", "Link"]),
+    "MAINTENANCE_PROCEDURE_SEARCH": ("MAINTENANCE_PROCEDURE", ["Description"]),
+}
+
+
+def create_search_index(cursor):
+    """
+    Creates the full-text search tables and the triggers that keep them in sync with
+    MATERIALS, OUTSIDE_RESEARCH and MAINTENANCE_PROCEDURE. A search table created over
+    a table that already has rows is filled from it.
+    """
+    for search_table, (table, columns) in SEARCH_TABLES.items():
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (search_table,))
+        exists = cursor.fetchone()
+
+        column_list = ", ".join(columns)
+        old_values = ", ".join(f"old.{column}" for column in columns)
+        new_values = ", ".join(f"new.{column}" for column in columns)
+
+        # prefix='2 3' adds prefix indexes so the short prefix queries typed while searching stay fast
+        cursor.execute(f"""
+        CREATE VIRTUAL TABLE IF NOT EXISTS {search_table} USING fts5(
+            {column_list}, content='{table}', prefix='2 3'
+        );
+        """)
+
+        cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS {search_table}_insert AFTER INSERT ON {table} BEGIN
+            INSERT INTO {search_table} (rowid, {column_list}) VALUES (new.rowid, {new_values});
+        END;
+        """)
+        cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS {search_table}_delete AFTER DELETE ON {table} BEGIN
+            INSERT INTO {search_table} ({search_table}, rowid, {column_list}) VALUES ('delete', old.rowid, {old_values});
+        END;
+        """)
+        # Only changes to the indexed columns touch the index; relinking a row to another
+        # project or procedure does not
+        cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS {search_table}_update AFTER UPDATE OF {column_list} ON {table} BEGIN
+            INSERT INTO {search_table} ({search_table}, rowid, {column_list}) VALUES ('delete', old.rowid, {old_values});
+            INSERT INTO {search_table} (rowid, {column_list}) VALUES (new.rowid, {new_values});
+        END;
+        """)
+
+        if not exists:
+            rebuild_search_index(cursor, search_table)
+
+
+def rebuild_search_index(cursor, search_table=None):
+    """
+    Rebuilds one search table, or all of them, from the rows of the tables they index.
+    Needed after VACUUM, which may renumber the rowids of MATERIALS and OUTSIDE_RESEARCH.
+    """
+    for name in [search_table] if search_table else SEARCH_TABLES:
+        cursor.execute(f"INSERT INTO {name} ({name}) VALUES ('rebuild');")
+
+
+# Summary tables of row counts, each kept up to date by triggers on the table it counts:
+# summary table -> (counted table, column grouped on, count column). Reading a count is
+# a primary-key lookup instead of a scan of the counted table.
+SUMMARY_TABLES = {
+    "PROJECT_MEMBER_COUNTS": ("PROJECT_MEMBERS", "Project", "Members"),
+    "PROJECT_MATERIAL_COUNTS": ("PROJECT_MATERIALS", "Project", "Materials"),
+    "PROJECT_RESEARCH_COUNTS": ("PROJECT_RESEARCH", "Project", "Research"),
+    "PROCEDURE_CONTRIBUTOR_COUNTS": ("PROCEDURE_CONTRIBUTERS", "Procedure", "Contributors"),
+    "PROCEDURE_MATERIAL_COUNTS": ("PROCEDURE_MATERIALS", "Procedure", "Materials"),
+    "OWNER_PROJECT_COUNTS": ("PROJECT", "Owner", "Projects"),
+}
+
+
+def create_summary_tables(cursor):
+    """
+    Creates the summary tables and the triggers that add to and take from their counts
+    as rows are inserted, deleted or moved to another group. A summary table created
+    over a table that already has rows is filled from it.
+    Groups whose count drops to zero are deleted, so a missing row means zero.
+    """
+    for summary, (table, column, count) in SUMMARY_TABLES.items():
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (summary,))
+        exists = cursor.fetchone()
+
+        cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS {summary} (
+            {column} INTEGER PRIMARY KEY,
+            {count} INTEGER NOT NULL
+        );
+        """)
+
+        add = (f"INSERT INTO {summary} ({column}, {count}) VALUES (new.{column}, 1) "
+               f"ON CONFLICT ({column}) DO UPDATE SET {count} = {count} + 1;")
+        remove = (f"UPDATE {summary} SET {count} = {count} - 1 WHERE {column} = old.{column}; "
+                  f"DELETE FROM {summary} WHERE {column} = old.{column} AND {count} <= 0;")
+        cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS {summary}_insert AFTER INSERT ON {table} BEGIN
+            {add}
+        END;
+        """)
+        cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS {summary}_delete AFTER DELETE ON {table} BEGIN
+            {remove}
+        END;
+        """)
+        cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS {summary}_update AFTER UPDATE OF {column} ON {table}
+        WHEN old.{column} IS NOT new.{column} BEGIN
+            {remove}
+            {add}
+        END;
+        """)
+
+        if not exists:
+            rebuild_summary_tables(cursor, summary)
+
+
+def rebuild_summary_tables(cursor, summary=None):
+    """
+    Recounts one summary table, or all of them, from the tables they count.
+    """
+    for name in [summary] if summary else SUMMARY_TABLES:
+        table, column, count = SUMMARY_TABLES[name]
+        cursor.execute(f"DELETE FROM {name};")
+        cursor.execute(f"INSERT INTO {name} ({column}, {count}) "
+                       f"SELECT {column}, count(*) FROM {table} GROUP BY {column};")
+
+
+def check_summary_tables(cursor, summary=None):
+    """
+    Compares one summary table, or all of them, with a fresh count of the tables they
+    count. Returns (summary table, group, stored count, actual count) for every group
+    that differs; an empty list means the summaries are consistent.
+    """
+    differences = []
+    for name in [summary] if summary else SUMMARY_TABLES:
+        table, column, count = SUMMARY_TABLES[name]
+        cursor.execute(f"""
+        WITH actual AS (
+            SELECT {column} AS Grouped, count(*) AS Actual FROM {table} GROUP BY {column}
+        )
+        SELECT a.Grouped, s.{count}, a.Actual FROM actual AS a
+        LEFT JOIN {name} AS s ON s.{column} = a.Grouped
+        WHERE s.{count} IS NOT a.Actual
+        UNION ALL
+        SELECT s.{column}, s.{count}, 0 FROM {name} AS s
+        WHERE s.{column} NOT IN (SELECT Grouped FROM actual);
+        """)
+        differences.extend((name, *row) for row in cursor.fetchall())
+    return differences
+
+
+if __name__ == "__main__":
+    # The schema is built by applying every migration; see Phase3migrations.py
+    from Phase3migrations import migrate
+
+    connection = connect_to_database()
+    if not connection:
+        exit(1)
+
+    version = migrate(connection)
+    connection.close()
+
+    print(f"Database schema created successfully (version {version}).")
@@ -1,22 +1,74 @@
+import datetime
+import json
+import re
 import sqlite3
+import sys
+
+from Phase3catalog import convert_date, schema_catalog, table_schema
+from Phase3cache import (SUB_TEAM_CACHE, TEAM_MEMBER_CACHE, cache_key, check_data_version,
+                         invalidate_after_commit, print_cache_stats)
+from Phase3database import connect_to_database
+from Phase3instrument import QUERY_DUMP, QUERY_LOG, operation, print_query_report
+from Phase3pool import close_transactions, print_transaction_stats, unit_of_work
+from Phase3queries import TABLES, fetch_all, fetch_one, iterate, run, run_many
+from Phase3viewer import PAGE_SIZE, display_table
+
+
+def get_team_member(conn, member_id):
+    """
+    Returns the TEAM_MEMBER row with the given ID, or None if there is none.
+    Served from the team member cache when possible.
+    """
+    key = cache_key(member_id)
+    if key is None:
+        return fetch_one(conn, "team_member", (member_id,))
+    return TEAM_MEMBER_CACHE.get(key, lambda: fetch_one(conn, "team_member", (key,)))
+
+
+def get_project(conn, project_id):
+    """
+    Returns the PROJECT row with the given ID, or None if there is none.
+    """
+    return fetch_one(conn, "project", (project_id,))
+
+
+def create_project(conn, start_date, end_date, in_use, owner_id, member_ids, name=None):
+    """
+    Creates a project named `name` and assigns the given team members to it.
+
+    Member IDs that do not belong to a team member are skipped. The dates are stored
+    as YYYY-MM-DD and `in_use` as 0 or 1. Returns the new project ID, the assigned
+    member IDs and the skipped member IDs. Raises ValueError if a date or `in_use`
+    cannot be read or the owner does not exist.
+    """
+    project = table_schema(conn, "PROJECT")
+    start_date = project.coerce("Start_Date", start_date)
+    end_date = project.coerce("End_Date", end_date)
+    in_use = project.coerce("In_Use", in_use)
+    if start_date is None or end_date is None or in_use is None:
+        raise ValueError("A project needs a start date, an end date and whether it is in use.")
+    if not get_team_member(conn, owner_id):
+        raise ValueError(f"No team member found with ID {owner_id}.")
+
+    project_id = run(conn, "insert_project", (name, start_date, end_date, in_use, owner_id)).lastrowid
+
+    assigned = []
+    skipped = []
+    for member_id in member_ids:
+        if get_team_member(conn, member_id):
+            assigned.append(member_id)
+        else:
+            skipped.append(member_id)
+
+    run_many(conn, "insert_project_member", [(project_id, member_id) for member_id in assigned])
+
+    return project_id, assigned, skipped
 
-# Connect to SQLite database
-def connect_to_database():
-    try:
-        conn = sqlite3.connect('project_database.db')
-        print("Connected to the database successfully.")
-        return conn
-    except sqlite3.Error as e:
-        print(f"An error occurred while connecting to the database: {e}")
-        return None
 
-# Placeholder function definitions
 def create_project_and_assign_team_members(conn):
     """
     Creates a new project and assigns team members to it.
     """
-    cursor = conn.cursor()
-
     # Step 1: Input and create a new project
     print("\n--- Create New Project ---")
     project_name = input("Enter the project name: ").strip()
@@ -26,240 +78,278 @@ def create_project_and_assign_team_members(conn):
     owner_id = input("Enter the owner ID (team member responsible): ").strip()
 
     # Verify the owner exists
-    cursor.execute("SELECT * FROM TEAM_MEMBER WHERE Member_ID = ?", (owner_id,))
-    owner = cursor.fetchone()
-    if not owner:
+    if not get_team_member(conn, owner_id):
         print(f"No team member found with ID {owner_id}. Project creation aborted.")
         return
 
-    # Insert the new project
-    cursor.execute("""
-        INSERT INTO PROJECT (Start_Date, End_Date, In_Use, Owner)
-        VALUES (?, ?, ?, ?)
-    """, (start_date, end_date, in_use, owner_id))
-    project_id = cursor.lastrowid
-    print(f"Project '{project_name}' created with ID {project_id}.")
-
-    # Step 2: Assign team members to the project
+    # Step 2: Choose the team members to assign to the project
     print("\n--- Assign Team Members ---")
     team_member_ids = input("Enter a comma-separated list of team member IDs to assign to this project: ").split(",")
     team_member_ids = [member_id.strip() for member_id in team_member_ids]
 
-    for member_id in team_member_ids:
-        # Verify the team member exists
-        cursor.execute("SELECT * FROM TEAM_MEMBER WHERE Member_ID = ?", (member_id,))
-        team_member = cursor.fetchone()
-        if not team_member:
-            print(f"No team member found with ID {member_id}. Skipping assignment.")
-            continue
-
-        # Add team member to project_members table
-        cursor.execute("""
-            INSERT INTO PROJECT_MEMBERS (Project, Member)
-            VALUES (?, ?)
-        """, (project_id, member_id))
+    # Insert the new project and its team members as one committed unit of work
+    try:
+        with unit_of_work(conn):
+            project_id, assigned, skipped = create_project(conn, start_date, end_date, in_use, owner_id,
+                                                           team_member_ids, project_name)
+    except ValueError as e:
+        print(f"{e} Project creation aborted.")
+        return
+    print(f"Project '{project_name}' created with ID {project_id}.")
+    for member_id in skipped:
+        print(f"No team member found with ID {member_id}. Skipping assignment.")
+    for member_id in assigned:
         print(f"Team member ID {member_id} assigned to project ID {project_id}.")
 
     # Step 3: Display confirmation and project details
     print("\n--- Project Details ---")
     print(f"Project ID: {project_id}")
+    print(f"Name: {project_name}")
     print(f"Start Date: {start_date}")
 
 
+# Columns shown whenever the available projects are listed
+PROJECT_COLUMNS = "Project_ID, Name, Start_Date, End_Date, In_Use, Owner"
+
+
+def format_project(project):
+    """
+    Formats a row of PROJECT_COLUMNS for the project listings.
+    """
+    return (f"ID: {project[0]}, Name: {project[1]}, Start Date: {project[2]}, End Date: {project[3]}, "
+            f"In Use: {bool(project[4])}, Owner ID: {project[5]}")
+
+
+def parse_delimited_items(items_input, field_count):
+    """
+    Parses a comma-separated list of pipe-delimited items in one pass.
+
+    Returns the list of well-formed items as tuples of stripped fields, and the
+    list of raw entries that did not have exactly `field_count` fields.
+    """
+    items = []
+    skipped = []
+    for entry in items_input.split(","):
+        fields = entry.strip().split("|")
+        if len(fields) != field_count:
+            skipped.append("|".join(fields))
+            continue
+        items.append(tuple(map(str.strip, fields)))
+    return items, skipped
+
+
+# Named statements that look up which of a list of names already exist in each table
+EXISTING_NAME_QUERIES = {
+    "MATERIALS": "existing_material_names",
+    "OUTSIDE_RESEARCH": "existing_research_names",
+}
+
+
+def find_existing_names(conn, table, names):
+    """
+    Returns the subset of `names` already present in the Name column of `table`,
+    looking them all up with a single query instead of one query per name.
+    """
+    rows = fetch_all(conn, EXISTING_NAME_QUERIES[table], (json.dumps(list(names)),))
+    return {row[0] for row in rows}
+
+
+def track_materials_batch(conn, project_id, materials):
+    """
+    Adds and links a whole list of materials to a project as one batch.
+
+    `materials` holds (name, material_type, description, link) tuples. New materials
+    are inserted and every material is linked to the project through PROJECT_MATERIALS,
+    each step one executemany in the caller's transaction. A material keeps any other
+    projects it is linked to. Returns a dict with the number of materials inserted and
+    newly linked; repeated names and materials already linked to the project are in
+    neither count. Raises ValueError if the project does not exist.
+    """
+    if not get_project(conn, project_id):
+        raise ValueError(f"No project found with ID {project_id}.")
+
+    inserted = run_many(conn, "insert_material", materials)
+    linked = run_many(conn, "link_project_material", [(project_id, material[0]) for material in materials])
+
+    return {"inserted": inserted, "linked": linked}
+
+
+def track_outside_resources_batch(conn, project_id, resources):
+    """
+    Adds and links a whole list of outside resources to a project as one batch.
+
+    `resources` holds (name, description, link) tuples, linked to the project through
+    PROJECT_RESEARCH. Returns a dict with the number of resources inserted and newly
+    linked, as for track_materials_batch. Raises ValueError if the project does not exist.
+    """
+    if not get_project(conn, project_id):
+        raise ValueError(f"No project found with ID {project_id}.")
+
+    inserted = run_many(conn, "insert_research", resources)
+    linked = run_many(conn, "link_project_research", [(project_id, resource[0]) for resource in resources])
+
+    return {"inserted": inserted, "linked": linked}
+
+
+# Named statements listing the projects and procedures each kind of item is linked to
+ITEM_LINK_QUERIES = {
+    "MATERIALS": ("material_projects", "material_procedures"),
+    "OUTSIDE_RESEARCH": ("research_projects", "research_procedures"),
+}
+
+
+def get_item_links(conn, table, name):
+    """
+    Returns the IDs of the projects and of the maintenance procedures that the named
+    material or outside research item is linked to, each found by an index search.
+    """
+    projects_query, procedures_query = ITEM_LINK_QUERIES[table]
+    return ([row[0] for row in fetch_all(conn, projects_query, (name,))],
+            [row[0] for row in fetch_all(conn, procedures_query, (name,))])
+
+
 def track_materials_for_project(conn):
     """
     Tracks materials for a specified project, adding new materials if necessary.
     """
-    cursor = conn.cursor()
-
     # Step 1: Retrieve and display available projects
-    cursor.execute("SELECT Project_ID, Start_Date, End_Date, In_Use, Owner FROM PROJECT")
-    projects = cursor.fetchall()
-    if not projects:
+    print("\nAvailable Projects:")
+    if not display_table(conn, "PROJECT", PROJECT_COLUMNS, format_row=format_project):
         print("No projects available in the database.")
         return
 
-    print("\nAvailable Projects:")
-    for project in projects:
-        print(f"ID: {project[0]}, Start Date: {project[1]}, End Date: {project[2]}, In Use: {bool(project[3])}, Owner ID: {project[4]}")
-
     project_id = input("\nEnter the Project ID to track materials for: ")
 
     # Verify the project exists
-    cursor.execute("SELECT * FROM PROJECT WHERE Project_ID = ?", (project_id,))
-    project = cursor.fetchone()
-    if not project:
+    if not get_project(conn, project_id):
         print(f"No project found with ID {project_id}.")
         return
 
     print(f"\nTracking materials for Project ID {project_id}.")
 
-    # Step 2: Handle materials
-    materials_input = input("Enter a comma-separated list of materials (format: name|material_type|description|link): ").split(",")
-    materials = [material.strip().split("|") for material in materials_input]
+    # Step 2: Parse the whole list once and add/link it in a single batch
+    materials_input = input("Enter a comma-separated list of materials (format: name|material_type|description|link): ")
+    materials, skipped = parse_delimited_items(materials_input, 4)
 
-    for material in materials:
-        if len(material) != 4:
-            print(f"Skipping invalid material input: {'|'.join(material)}")
-            continue
-
-        name, material_type, description, link = map(str.strip, material)
-
-        # Check if the material exists
-        cursor.execute("SELECT Name FROM MATERIALS WHERE Name = ?", (name,))
-        if not cursor.fetchone():
-            # Insert the material into the database
-            cursor.execute("""
-                INSERT INTO MATERIALS (Name, Material_Type, Description, Link, Uses)
-                VALUES (?, ?, ?, ?, ?)
-            """, (name, material_type, description, link, project_id))
-            print(f"Material '{name}' added to MATERIALS table.")
+    for material in skipped:
+        print(f"Skipping invalid material input: {material}")
 
-        # Link the material to the project
-        cursor.execute("""
-            UPDATE MATERIALS SET Uses = ? WHERE Name = ?
-        """, (project_id, name))
-        print(f"Material '{name}' linked to Project ID {project_id}.")
+    with unit_of_work(conn):
+        counts = track_materials_batch(conn, project_id, materials)
+    print(f"Materials inserted: {counts['inserted']}, linked to Project ID {project_id}: {counts['linked']}, skipped: {len(skipped)}.")
 
     # Step 3: Display the list of materials associated with the project
     print("\nMaterials associated with the project:")
-    cursor.execute("""
-        SELECT Name, Material_Type, Description, Link FROM MATERIALS WHERE Uses = ?
-    """, (project_id,))
-    materials = cursor.fetchall()
-
-    for material in materials:
-        print(f"Name: {material[0]}, Type: {material[1]}, Description: {material[2]}, Link: {material[3]}")
-
-    conn.commit()
-    cursor.close()
+    display_table(conn, "MATERIALS", "Name, Material_Type, Description, Link",
+                  "Name IN (SELECT Material FROM PROJECT_MATERIALS WHERE Project = ?)", (project_id,),
+                  format_row=lambda material: f"Name: {material[0]}, Type: {material[1]}, Description: {material[2]}, Link: {material[3]}")
 
 
 def track_outside_resources_for_project(conn):
     """
     Tracks outside resources for a specified project, adding new resources if necessary.
     """
-    cursor = conn.cursor()
-
     # Step 1: Retrieve the project
-    cursor.execute("SELECT Project_ID, Start_Date, End_Date, In_Use, Owner FROM PROJECT")
-    projects = cursor.fetchall()
-    if not projects:
+    print("\nAvailable Projects:")
+    if not display_table(conn, "PROJECT", PROJECT_COLUMNS, format_row=format_project):
         print("No projects available in the database.")
         return
 
-    print("\nAvailable Projects:")
-    for project in projects:
-        print(f"ID: {project[0]}, Start Date: {project[1]}, End Date: {project[2]}, In Use: {bool(project[3])}, Owner ID: {project[4]}")
-
     project_id = input("\nEnter the Project ID to track resources for: ")
 
     # Verify the project exists
-    cursor.execute("SELECT * FROM PROJECT WHERE Project_ID = ?", (project_id,))
-    project = cursor.fetchone()
-    if not project:
+    if not get_project(conn, project_id):
         print(f"No project found with ID {project_id}.")
         return
 
     print(f"\nTracking resources for Project ID {project_id}.")
 
-    # Step 2: Handle outside resources
-    resources_input = input("Enter a comma-separated list of resources (format: name|description|link): ").split(",")
-    resources = [resource.strip().split("|") for resource in resources_input]
+    # Step 2: Parse the whole list once and add/link it in a single batch
+    resources_input = input("Enter a comma-separated list of resources (format: name|description|link): ")
+    resources, skipped = parse_delimited_items(resources_input, 3)
 
-    for resource in resources:
-        if len(resource) != 3:
-            print(f"Skipping invalid resource input: {'|'.join(resource)}")
-            continue
-
-        name, description, link = map(str.strip, resource)
+    for resource in skipped:
+        print(f"Skipping invalid resource input: {resource}")
 
-        # Check if the resource exists
-        cursor.execute("SELECT Name FROM OUTSIDE_RESEARCH WHERE Name = ?", (name,))
-        if not cursor.fetchone():
-            # Insert the resource into the database
-            cursor.execute("""
-                INSERT INTO OUTSIDE_RESEARCH (Name, Description, Link, Research)
-                VALUES (?, ?, ?, ?)
-            """, (name, description, link, project_id))
-            print(f"Resource '{name}' added to OUTSIDE_RESEARCH table.")
-
-        # Link the resource to the project
-        cursor.execute("""
-            UPDATE OUTSIDE_RESEARCH SET Research = ? WHERE Name = ?
-        """, (project_id, name))
-        print(f"Resource '{name}' linked to Project ID {project_id}.")
+    with unit_of_work(conn):
+        counts = track_outside_resources_batch(conn, project_id, resources)
+    print(f"Resources inserted: {counts['inserted']}, linked to Project ID {project_id}: {counts['linked']}, skipped: {len(skipped)}.")
 
     # Step 3: Display the list of resources associated with the project
     print("\nResources associated with the project:")
-    cursor.execute("""
-        SELECT Name, Description, Link FROM OUTSIDE_RESEARCH WHERE Research = ?
-    """, (project_id,))
-    resources = cursor.fetchall()
+    display_table(conn, "OUTSIDE_RESEARCH", "Name, Description, Link",
+                  "Name IN (SELECT Research FROM PROJECT_RESEARCH WHERE Project = ?)", (project_id,),
+                  format_row=lambda resource: f"Name: {resource[0]}, Description: {resource[1]}, Link: {resource[2]}")
+
+
+def create_maintenance_procedure(conn, description, maintainer_id, last_edited, materials, resources):
+    """
+    Creates a maintenance procedure and links the named materials and outside resources to it,
+    adding any that do not exist yet.
+
+    Returns the new procedure ID and the sets of material and resource names that were
+    newly added. `last_edited` is stored as YYYY-MM-DD. Raises ValueError if it cannot
+    be read or the maintainer does not exist.
+    """
+    last_edited = table_schema(conn, "MAINTENANCE_PROCEDURE").coerce("Last_Edited", last_edited)
+    if last_edited is None:
+        raise ValueError("A maintenance procedure needs a last edited date.")
+    if not get_team_member(conn, maintainer_id):
+        raise ValueError(f"No team member found with ID {maintainer_id}.")
 
-    for resource in resources:
-        print(f"Name: {resource[0]}, Description: {resource[1]}, Link: {resource[2]}")
+    # Retrieve the auto-generated Procedure_ID
+    procedure_id = run(conn, "insert_procedure", (description, last_edited, maintainer_id)).lastrowid
 
-    conn.commit()
-    cursor.close()
+    materials = [material for material in materials if material]
+    added_materials = set(materials) - find_existing_names(conn, "MATERIALS", materials)
+    run_many(conn, "insert_material_name", [(material,) for material in added_materials])
+    run_many(conn, "link_procedure_material", [(procedure_id, material) for material in materials])
+
+    resources = [resource for resource in resources if resource]
+    added_resources = set(resources) - find_existing_names(conn, "OUTSIDE_RESEARCH", resources)
+    run_many(conn, "insert_research_name", [(resource,) for resource in added_resources])
+    run_many(conn, "link_procedure_research", [(procedure_id, resource) for resource in resources])
+
+    return procedure_id, added_materials, added_resources
 
 
 def create_maintenance_procedure_with_resources_and_materials(conn):
     """
     Creates a new maintenance procedure, associates materials and resources, and displays details.
     """
-    cursor = conn.cursor()
-
     # Step 1: Gather input for the new maintenance procedure
     procedure_name = input("Enter the name of the maintenance procedure: ")
     maintainer_id = input("Enter the Maintainer ID: ")
     last_edited_date = input("Enter the last edited date (YYYY-MM-DD): ")
 
-    # Insert the new maintenance procedure into the database
-    cursor.execute("""
-        INSERT INTO MAINTENANCE_PROCEDURE (Description, Last_Edited, Maintainer)
-        VALUES (?, ?, ?)
-    """, (procedure_name, last_edited_date, maintainer_id))
-    procedure_id = cursor.lastrowid  # Retrieve the auto-generated Procedure_ID
-
-    print(f"\nMaintenance Procedure '{procedure_name}' created with ID {procedure_id}.\n")
+    # Verify the maintainer exists
+    if not get_team_member(conn, maintainer_id):
+        print(f"No team member found with ID {maintainer_id}. Maintenance procedure creation aborted.")
+        return
 
-    # Step 2: Handle materials association
+    # Step 2: Gather the materials and outside resources to associate
     materials_list = input("Enter a comma-separated list of materials (e.g., material1, material2): ").split(",")
-    for material in map(str.strip, materials_list):
-        # Check if material exists
-        cursor.execute("SELECT Name FROM MATERIALS WHERE Name = ?", (material,))
-        if not cursor.fetchone():
-            # Insert new material if not exists
-            cursor.execute("""
-                INSERT INTO MATERIALS (Name, Uses, Needs)
-                VALUES (?, NULL, ?)
-            """, (material, procedure_id))  # `Uses` is set to NULL since it's unrelated to projects.
-            print(f"Material '{material}' added to MATERIALS table.")
+    resources_list = input("Enter a comma-separated list of resources (e.g., resource1, resource2): ").split(",")
+    materials = [material.strip() for material in materials_list]
+    resources = [resource.strip() for resource in resources_list]
 
-        # Link material to the maintenance procedure
-        cursor.execute("""
-            UPDATE MATERIALS SET Needs = ? WHERE Name = ?
-        """, (procedure_id, material))
-        print(f"Material '{material}' linked to Maintenance Procedure ID {procedure_id}.")
+    # Step 3: Insert the procedure and link everything to it
+    try:
+        with unit_of_work(conn):
+            procedure_id, added_materials, added_resources = create_maintenance_procedure(
+                conn, procedure_name, maintainer_id, last_edited_date, materials, resources)
+    except ValueError as e:
+        print(f"{e} Maintenance procedure creation aborted.")
+        return
 
-    # Step 3: Handle outside resources association
-    resources_list = input("Enter a comma-separated list of resources (e.g., resource1, resource2): ").split(",")
-    for resource in map(str.strip, resources_list):
-        # Check if resource exists
-        cursor.execute("SELECT Name FROM OUTSIDE_RESEARCH WHERE Name = ?", (resource,))
-        if not cursor.fetchone():
-            # Insert new resource if not exists
-            cursor.execute("""
-                INSERT INTO OUTSIDE_RESEARCH (Name, Reference_ID)
-                VALUES (?, ?)
-            """, (resource, procedure_id))
+    print(f"\nMaintenance Procedure '{procedure_name}' created with ID {procedure_id}.\n")
+    for material in filter(None, materials):
+        if material in added_materials:
+            print(f"Material '{material}' added to MATERIALS table.")
+        print(f"Material '{material}' linked to Maintenance Procedure ID {procedure_id}.")
+    for resource in filter(None, resources):
+        if resource in added_resources:
             print(f"Resource '{resource}' added to OUTSIDE_RESEARCH table.")
-
-        # Link resource to the maintenance procedure
-        cursor.execute("""
-            UPDATE OUTSIDE_RESEARCH SET Reference_ID = ? WHERE Name = ?
-        """, (procedure_id, resource))
         print(f"Resource '{resource}' linked to Maintenance Procedure ID {procedure_id}.")
 
     # Step 4: Display confirmation
@@ -269,8 +359,23 @@ def create_maintenance_procedure_with_resources_and_materials(conn):
     print("Materials:", ", ".join(materials_list))
     print("Resources:", ", ".join(resources_list))
 
-    conn.commit()
-    cursor.close()
+
+def get_sub_teams(conn):
+    """
+    Returns the ID and description of every sub-team, served from the sub-team cache when possible.
+    """
+    return SUB_TEAM_CACHE.get("all", lambda: fetch_all(conn, "sub_teams"))
+
+
+def get_sub_team_responsibilities(conn, team_id):
+    """
+    Returns the responsibilities of a sub-team as a one-column row, or None if
+    the sub-team does not exist. Served from the sub-team cache when possible.
+    """
+    key = cache_key(team_id)
+    if key is None:
+        return fetch_one(conn, "sub_team_responsibilities", (team_id,))
+    return SUB_TEAM_CACHE.get(key, lambda: fetch_one(conn, "sub_team_responsibilities", (key,)))
 
 
 def search_responsibilities_by_sub_team(conn):
@@ -282,12 +387,9 @@ def search_responsibilities_by_sub_team(conn):
     2. Prompt the user to select a sub-team by its ID.
     3. Retrieve and display the responsibilities for the selected sub-team.
     """
-    cursor = conn.cursor()
-
     # Step 1: Display all available sub-teams
     print("\nAvailable Sub-Teams:")
-    cursor.execute("SELECT Team_ID, Description FROM SUB_TEAM")
-    sub_teams = cursor.fetchall()
+    sub_teams = get_sub_teams(conn)
     if not sub_teams:
         print("No sub-teams found.")
         return
@@ -299,8 +401,7 @@ def search_responsibilities_by_sub_team(conn):
     sub_team_id = input("\nEnter Sub-Team ID to view responsibilities: ")
 
     # Step 3: Verify the Sub-Team exists and retrieve its responsibilities
-    cursor.execute("SELECT Responsibilities FROM SUB_TEAM WHERE Team_ID = ?", (sub_team_id,))
-    result = cursor.fetchone()
+    result = get_sub_team_responsibilities(conn, sub_team_id)
     if result:
         responsibilities = result[0]
         print(f"\nResponsibilities for Sub-Team ID {sub_team_id}:")
@@ -308,7 +409,32 @@ def search_responsibilities_by_sub_team(conn):
     else:
         print("Invalid Sub-Team ID. Please try again.")
 
-    cursor.close()
+
+# Named statements fetching the entity and streaming its roster for each contact directory
+CONTACT_DIRECTORIES = {
+    "project": ("project", "project_contacts"),
+    "maintenance procedure": ("maintenance_procedure", "procedure_contacts"),
+}
+
+
+def get_contact_entity(conn, entity_type, entity_id):
+    """
+    Returns the project or maintenance procedure row a contact lookup is for, or None.
+    """
+    entity_query, _ = CONTACT_DIRECTORIES[entity_type]
+    return fetch_one(conn, entity_query, (entity_id,))
+
+
+def iter_contact_info(conn, entity_type, entity_id):
+    """
+    Streams the roster of a project or maintenance procedure using a single joined query.
+
+    Yields (member_id, contact_info) for every membership row, where contact_info is the
+    TEAM_MEMBER row or None if the member no longer exists.
+    """
+    _, contacts_query = CONTACT_DIRECTORIES[entity_type]
+    for row in iterate(conn, contacts_query, (entity_id,)):
+        yield row[0], (row[1:] if row[1] is not None else None)
 
 
 def retrieve_contact_info_for_project_or_maintenance_procedure(conn):
@@ -325,26 +451,15 @@ def retrieve_contact_info_for_project_or_maintenance_procedure(conn):
     print("\n=== Retrieve Contact Info for Project or Maintenance Procedure ===")
 
     try:
-        cursor = conn.cursor()
-
         # Display all projects
         print("\nAvailable Projects:")
-        cursor.execute("SELECT * FROM project;")
-        projects = cursor.fetchall()
-        if projects:
-            for project in projects:
-                print(f"ID: {project[0]}, Name: {project[1]}, Start: {project[2]}, End: {project[3]}")
-        else:
+        if not display_table(conn, "PROJECT", PROJECT_COLUMNS, format_row=format_project):
             print("No projects available.")
 
         # Display all maintenance procedures
         print("\nAvailable Maintenance Procedures:")
-        cursor.execute("SELECT * FROM maintenance_procedure;")
-        procedures = cursor.fetchall()
-        if procedures:
-            for procedure in procedures:
-                print(f"ID: {procedure[0]}, Name: {procedure[1]}, Start: {procedure[2]}, End: {procedure[3]}")
-        else:
+        if not display_table(conn, "MAINTENANCE_PROCEDURE", "Procedure_ID, Description, Last_Edited, Maintainer",
+                             format_row=format_procedure):
             print("No maintenance procedures available.")
 
         # Prompt user for inputs
@@ -352,65 +467,274 @@ def retrieve_contact_info_for_project_or_maintenance_procedure(conn):
         entity_id = input("Enter the Entity ID: ").strip()
         entity_type = input("Enter the Entity Type (project or maintenance procedure): ").strip().lower()
 
-        if entity_type == "project":
-            # Retrieve project information
-            cursor.execute("SELECT * FROM project WHERE Project_ID = ?;", (entity_id,))
-            project = cursor.fetchone()
-            if not project:
-                print(f"No project found with ID {entity_id}.")
-                return
+        if entity_type not in CONTACT_DIRECTORIES:
+            print("Invalid entity type. Please enter 'project' or 'maintenance procedure'.")
+            return
 
-            print(f"\nProject Details: {project}")
+        # Retrieve the project or maintenance procedure information
+        entity = get_contact_entity(conn, entity_type, entity_id)
+        if not entity:
+            print(f"No {entity_type} found with ID {entity_id}.")
+            return
 
-            # Retrieve team members assigned to the project
-            cursor.execute("SELECT Member FROM project_members WHERE Project = ?;", (entity_id,))
-            team_members = cursor.fetchall()
-            if not team_members:
-                print(f"No team members found for project ID {entity_id}.")
-                return
+        print(f"\n{entity_type.title()} Details: {entity}")
 
-            print("\nTeam Member Contact Information:")
-            for member in team_members:
-                cursor.execute("SELECT * FROM team_member WHERE Member_ID = ?;", (member[0],))
-                contact_info = cursor.fetchone()
-                if contact_info:
-                    print(contact_info)
-                else:
-                    print(f"No contact information found for team member ID {member[0]}.")
-
-        elif entity_type == "maintenance procedure":
-            # Retrieve maintenance procedure information
-            cursor.execute("SELECT * FROM maintenance_procedure WHERE Procedure_ID = ?;", (entity_id,))
-            procedure = cursor.fetchone()
-            if not procedure:
-                print(f"No maintenance procedure found with ID {entity_id}.")
-                return
+        # Retrieve the contact information of every assigned team member in one query
+        found_members = False
+        for member_id, contact_info in iter_contact_info(conn, entity_type, entity_id):
+            if not found_members:
+                print("\nTeam Member Contact Information:")
+                found_members = True
+            if contact_info:
+                print(contact_info)
+            else:
+                print(f"No contact information found for team member ID {member_id}.")
+
+        if not found_members:
+            print(f"No team members found for {entity_type} ID {entity_id}.")
+
+    except sqlite3.Error as e:
+        print(f"An error occurred: {e}")
+    except Exception as e:
+        print(f"An unexpected error occurred: {e}")
 
-            print(f"\nMaintenance Procedure Details: {procedure}")
 
-            # Retrieve team members assigned to the maintenance procedure
-            cursor.execute("SELECT Member FROM PROCEDURE_CONTRIBUTERS WHERE Procedure = ?;", (entity_id,))
-            team_members = cursor.fetchall()
-            if not team_members:
-                print(f"No team members found for maintenance procedure ID {entity_id}.")
+def search_query(text):
+    """
+    Turns free text into an FTS5 query matching items that contain every word,
+    each as a prefix (so "alum sheet" finds "Aluminium Sheet"). Returns "" if the
+    text has no words. Words are quoted so FTS5 operators typed by the user are
+    searched for rather than interpreted.
+    """
+    return " ".join(f'"{word}"*' for word in re.findall(r"\w+", text))
+
+
+def search_catalog(conn, text, page=1, page_size=None):
+    """
+    Searches the names, types, descriptions and links of materials, outside research
+    and maintenance procedures. Returns one page of (kind, name or procedure ID,
+    snippet) tuples, best match first.
+    """
+    query = search_query(text)
+    if not query:
+        return []
+    page_size = page_size or PAGE_SIZE
+    rows = fetch_all(conn, "search_catalog", (query, query, query, page_size, (page - 1) * page_size))
+    return [row[:3] for row in rows]
+
+
+def search_materials_research_and_procedures(conn):
+    """
+    Searches materials, outside research and maintenance procedures by keyword.
+
+    Steps:
+    1. Prompt the user for the words to search for.
+    2. Display the matching items a page at a time, best match first.
+    """
+    print("\n=== Search Materials, Research and Procedures ===")
+
+    # Step 1: Prompt for the search terms
+    text = input("Enter words to search for: ").strip()
+    if not search_query(text):
+        print("Please enter at least one word to search for.")
+        return
+
+    # Step 2: Display the results page by page
+    try:
+        page = 1
+        while True:
+            results = search_catalog(conn, text, page)
+            if not results and page == 1:
+                print(f"No materials, research or procedures match '{text}'.")
+                return
+            for kind, item, summary in results:
+                print(f"{kind.title()}: {item} - {summary}")
+            if len(results) < PAGE_SIZE:
+                return
+            if sys.stdin.isatty() and input("-- More -- (press Enter for more results, 'q' to stop): ").strip().lower() == "q":
                 return
+            page += 1
+    except sqlite3.Error as e:
+        print(f"An error occurred: {e}")
 
-            print("\nTeam Member Contact Information:")
-            for member in team_members:
-                cursor.execute("SELECT * FROM team_member WHERE Member_ID = ?;", (member[0],))
-                contact_info = cursor.fetchone()
-                if contact_info:
-                    print(contact_info)
-                else:
-                    print(f"No contact information found for team member ID {member[0]}.")
 
-        else:
-            print("Invalid entity type. Please enter 'project' or 'maintenance procedure'.")
+# Conditions the dashboard can filter projects on, each taking one parameter
+DASHBOARD_FILTERS = {
+    # The unary + keeps SQLite from answering this through the (In_Use, End_Date) index,
+    # which would read the projects out of Project_ID order and sort every page
+    "in_use": "+p.In_Use = ?",
+    "active_from": "p.End_Date >= ?",
+    "active_to": "p.Start_Date <= ?",
+}
+
+DASHBOARD_COLUMNS = ["Project_ID", "Name", "Start_Date", "End_Date", "In_Use", "Owner",
+                     "Members", "Materials", "Research", "Procedures"]
+
+
+def iter_project_dashboard(conn, in_use=None, active_from=None, active_to=None, page_size=None):
+    """
+    Yields pages of dashboard rows: each project with its team size and the number of
+    materials, outside research and maintenance procedures linked to it. A procedure
+    is linked to a project when it uses one of the project's materials or research.
+
+    Each page is one query that seeks past the last Project_ID seen and reads the
+    counts from the summary tables and the link tables' covering indexes, so every
+    page costs the same no matter how many projects there are. Projects can be
+    filtered on In_Use and on being active (running) at some point between
+    `active_from` and `active_to`.
+    """
+    page_size = page_size or PAGE_SIZE
+    values = {"in_use": None if in_use is None else int(in_use), "active_from": active_from, "active_to": active_to}
+    filters = [(condition, values[name]) for name, condition in DASHBOARD_FILTERS.items() if values[name] is not None]
+    conditions = "".join(f" AND {condition}" for condition, _ in filters)
+    params = tuple(value for _, value in filters)
 
+    last_project = 0
+    while True:
+        rows = fetch_all(conn, "project_dashboard", (last_project, *params, page_size), filters=conditions)
+        if rows:
+            yield rows
+        if len(rows) < page_size:
+            return
+        last_project = rows[-1][0]
+
+
+def format_dashboard_row(row):
+    project_id, name, start_date, end_date, in_use, owner, members, materials, research, procedures = row
+    return (f"{project_id:>8} | {str(name or ''):<24.24} | {start_date} to {end_date} | "
+            f"{'In use' if in_use else 'Idle':<6} | owner {owner:>6} | {members:>4} members | "
+            f"{materials:>4} materials | {research:>4} research | {procedures:>4} procedures")
+
+
+def project_dashboard_report(conn):
+    """
+    Shows every project with its team size and linked materials, research and
+    procedures, optionally filtered on In_Use and on a date range.
+
+    Steps:
+    1. Prompt the user for the filters to apply.
+    2. Display the dashboard a page at a time.
+    """
+    print("\n=== Project Dashboard ===")
+
+    # Step 1: Prompt for the filters
+    in_use_input = input("Only projects in use? (yes/no, blank for all): ").strip().lower()
+    if in_use_input not in ("", "yes", "y", "no", "n"):
+        print("Please answer yes, no or leave it blank.")
+        return
+    in_use = None if not in_use_input else in_use_input in ("yes", "y")
+    active_from = input("Active on or after (YYYY-MM-DD, blank for any): ").strip() or None
+    active_to = input("Active on or before (YYYY-MM-DD, blank for any): ").strip() or None
+
+    # Step 2: Display the dashboard page by page
+    try:
+        shown = 0
+        for rows in iter_project_dashboard(conn, in_use, active_from, active_to):
+            if shown and sys.stdin.isatty():
+                if input("-- More -- (press Enter for the next page, 'q' to stop): ").strip().lower() == "q":
+                    break
+            for row in rows:
+                print(format_dashboard_row(row))
+            shown += len(rows)
+        if not shown:
+            print("No projects match those filters.")
     except sqlite3.Error as e:
         print(f"An error occurred: {e}")
-    except Exception as e:
-        print(f"An unexpected error occurred: {e}")
+
+
+def quarter_dates(day=None):
+    """
+    Returns the first and last dates of the calendar quarter containing `day`
+    (today by default) as YYYY-MM-DD strings.
+    """
+    day = day or datetime.date.today()
+    first_month = (day.month - 1) // 3 * 3 + 1
+    first = datetime.date(day.year, first_month, 1)
+    next_quarter = datetime.date(day.year + (first_month == 10), (first_month + 2) % 12 + 1, 1)
+    return first.isoformat(), (next_quarter - datetime.timedelta(days=1)).isoformat()
+
+
+# Below every ID, so the first page of a date range starts at its first date
+LOWEST_ID = -2 ** 63
+
+
+def iter_projects_ending(conn, start_date, end_date, in_use=None, page_size=None):
+    """
+    Yields pages of PROJECT_COLUMNS rows for the projects whose End_Date falls between
+    `start_date` and `end_date` inclusive, e.g. the active projects ending this quarter
+    with in_use=True and the dates from quarter_dates(). Rows come in In_Use, End_Date,
+    Project_ID order, and each page is one seek on the (In_Use, End_Date) index past
+    the last row of the page before. Raises ValueError for a date that is not YYYY-MM-DD.
+    """
+    page_size = page_size or PAGE_SIZE
+    start_date, end_date = convert_date(start_date), convert_date(end_date)
+
+    for in_use_value in [0, 1] if in_use is None else [int(bool(in_use))]:
+        last = (start_date, LOWEST_ID)
+        while True:
+            rows = fetch_all(conn, "projects_ending_between", (in_use_value, end_date, *last, page_size))
+            if rows:
+                yield rows
+            if len(rows) < page_size:
+                break
+            last = (rows[-1][3], rows[-1][0])
+
+
+def iter_procedures_edited(conn, start_date, end_date, page_size=None):
+    """
+    Yields pages of maintenance procedures last edited between `start_date` and
+    `end_date` inclusive, oldest edit first, each page one seek on the Last_Edited
+    index. Raises ValueError for a date that is not YYYY-MM-DD.
+    """
+    page_size = page_size or PAGE_SIZE
+    start_date, end_date = convert_date(start_date), convert_date(end_date)
+
+    last = (start_date, LOWEST_ID)
+    while True:
+        rows = fetch_all(conn, "procedures_edited_between", (end_date, *last, page_size))
+        if rows:
+            yield rows
+        if len(rows) < page_size:
+            return
+        last = (rows[-1][2], rows[-1][0])
+
+
+def format_procedure(procedure):
+    return f"ID: {procedure[0]}, Name: {procedure[1]}, Last Edited: {procedure[2]}, Maintainer ID: {procedure[3]}"
+
+
+def get_table_columns(conn, table):
+    """
+    Returns the column names of `table`, or an empty list if it does not exist.
+    """
+    try:
+        return table_schema(conn, table).columns
+    except ValueError:
+        return []
+
+
+def add_row(conn, table, values):
+    """
+    Inserts one row into `table` from a dict of column name to value and returns
+    its rowid. Values are converted to the column types (e.g. 'yes' to 1 for a
+    BOOLEAN) first. Raises ValueError for an unknown table or column, a value of the
+    wrong type or a missing required value.
+    """
+    schema = table_schema(conn, table)
+    row = schema.row(values)
+    invalidate_after_commit(conn, schema.name)
+    return run(conn, "insert_row", row, **schema.insert).lastrowid
+
+
+def add_rows(conn, table, rows):
+    """
+    Inserts many rows, each a dict of column name to value, with one executemany of
+    the table's prebuilt INSERT and returns the number inserted.
+    """
+    schema = table_schema(conn, table)
+    params = [schema.row(values) for values in rows]
+    invalidate_after_commit(conn, schema.name)
+    return run_many(conn, "insert_row", params, **schema.insert)
 
 
 def add_item(conn):
@@ -419,158 +743,283 @@ def add_item(conn):
     Prompts the user for column values to insert into the table.
     """
     print("\n=== Add Item to Table ===")
-    print("Available tables: SUB_TEAM, TEAM_MEMBER, PROJECT, MATERIALS, MAINTENANCE_PROCEDURE, DIMENSIONS, OUTSIDE_RESEARCH, PROJECT_MEMBERS, PROCEDURE_CONTRIBUTORS")
+    print("Available tables: " + ", ".join(TABLES))
     print("Example: To add a new team member, specify: TEAM_MEMBER and provide values for Member_ID, Email, Phone_#, Name")
 
     # Prompt user for table name
     table = input("Enter the table name: ").strip()
 
     try:
-        cursor = conn.cursor()
-        # Retrieve column names for the specified table
-        cursor.execute(f"PRAGMA table_info({table});")
-        columns = cursor.fetchall()
-
-        if not columns:
-            print(f"Table '{table}' does not exist.")
-            return
-
-        column_names = [col[1] for col in columns]
-        print(f"\nColumns in table '{table}': {', '.join(column_names)}")
+        # Look the table's columns up in the schema catalog
+        schema = table_schema(conn, table)
+        print(f"\nColumns in table '{schema.name}': "
+              + ", ".join(f"{column} ({schema.types[column] or 'ANY'})" for column in schema.columns))
 
         # Prompt user for values for each column
-        values = []
-        for column in column_names:
+        values = {}
+        for column in schema.columns:
             value = input(f"Enter value for '{column}' (leave blank for NULL): ").strip()
-            values.append(value if value else None)
+            values[column] = value if value else None
 
-        # Construct the INSERT statement
-        placeholders = ', '.join(['?'] * len(column_names))
-        query = f"INSERT INTO {table} ({', '.join(column_names)}) VALUES ({placeholders});"
-        print(f"Executing query: {query} with values {values}")  # Debugging info
-        cursor.execute(query, values)
-        conn.commit()
+        print(f"Inserting into '{schema.name}' values {list(values.values())}")  # Debugging info
+        with unit_of_work(conn):
+            add_row(conn, schema.name, values)
 
-        print(f"Successfully added a new item to table '{table}'.")
+        print(f"Successfully added a new item to table '{schema.name}'.")
+    except ValueError as e:
+        print(e)
     except sqlite3.Error as e:
         print(f"An error occurred: {e}")
     except Exception as e:
         print(f"An unexpected error occurred: {e}")
 
 
+def parse_predicates(text):
+    """
+    Turns "Column = value AND Column = value" into a dict of column to value. Values
+    may be quoted, and NULL matches NULL.
+    """
+    predicates = {}
+    for part in re.split(r"\s+AND\s+", text.strip(), flags=re.IGNORECASE):
+        column, separator, value = part.partition("=")
+        column, value = column.strip(), value.strip()
+        if not separator or not column:
+            raise ValueError(f"Expected 'Column = value', got '{part.strip()}'.")
+        if len(value) >= 2 and value[0] == value[-1] and value[0] in "'\"":
+            value = value[1:-1]
+        predicates[column] = None if value.upper() == "NULL" else value
+    return predicates
+
+
+def plan_delete(conn, table, predicates):
+    """
+    Returns the DELETE steps for removing the rows of `table` matching `predicates`
+    (a dict of column to value, all of which must match) together with the rows of
+    dependent tables that refer to them: a list of (table, condition, params), children
+    before parents. Each condition is parameterized and served by an index.
+
+    Raises ValueError for an unknown table or column, a match that no index serves, or
+    if rows of another table with its own identity (e.g. a PROJECT owned by a team
+    member being deleted) still refer to the rows.
+    """
+    catalog = schema_catalog(conn)
+    schema = catalog.table(table)
+    if schema.name.upper() not in TABLES:
+        raise ValueError(f"Rows cannot be removed from '{schema.name}'.")
+    if not predicates:
+        raise ValueError("Give at least one column to match.")
+    matched = {}
+    for name, value in predicates.items():
+        if name.strip().lower() == "rowid":
+            matched["rowid"] = value
+        else:
+            column = schema.column(name)
+            matched[column] = schema.coerce(column, value)
+    if not schema.indexed & set(matched):
+        raise ValueError(f"None of {', '.join(matched)} is indexed on {schema.name}; match on an indexed column instead.")
+
+    condition = " AND ".join(f"{column} IS ?" for column in matched)
+    return cascade_steps(conn, catalog, schema, condition, tuple(matched.values()))
+
+
+def cascade_plan(catalog, schema, condition):
+    """
+    Returns the statements removing the rows of `schema` matching `condition` without
+    running any: the (table, condition) DELETE steps, children before parents, and
+    the (table, condition, column) counts of rows with an identity of their own that
+    must not refer to the rows.
+    """
+    steps = []
+    checks = []
+    for child, column, parent_column in catalog.referencing(schema.name):
+        child_condition = f"{column} IN (SELECT {parent_column} FROM {schema.name} WHERE {condition})"
+        # A child without an INTEGER PRIMARY KEY of its own only holds links or details
+        # of its parent, so its rows go with the parent's
+        if child.integer_key is None:
+            child_steps, child_checks = cascade_plan(catalog, child, child_condition)
+            steps.extend(child_steps)
+            checks.extend(child_checks)
+        else:
+            checks.append((child.name, child_condition, column))
+    steps.append((schema.name, condition))
+    return steps, checks
+
+
+def cascade_steps(conn, catalog, schema, condition, params):
+    steps, checks = cascade_plan(catalog, schema, condition)
+    for table, check_condition, column in checks:
+        referring = fetch_one(conn, "count_where", params, table=table, condition=check_condition)[0]
+        if referring:
+            raise ValueError(f"{referring} {table} row(s) still refer to the rows through {column}; "
+                             f"delete or reassign them first.")
+    return [(table, step_condition, params) for table, step_condition in steps]
+
+
+def delete_rows(conn, table, predicates, dry_run=False):
+    """
+    Deletes the rows of `table` matching `predicates` and every dependent row referring
+    to them, e.g. a project's PROJECT_MEMBERS, PROJECT_MATERIALS and PROJECT_RESEARCH
+    links, each with one indexed DELETE. Returns {table: rows removed}, or with
+    `dry_run` the rows each table would lose without deleting anything. Run it in a
+    unit of work so the whole cascade commits or rolls back together.
+    """
+    removed = {}
+    for step_table, condition, params in plan_delete(conn, table, predicates):
+        if dry_run:
+            removed[step_table] = removed.get(step_table, 0) + fetch_one(
+                conn, "count_where", params, table=step_table, condition=condition)[0]
+        else:
+            invalidate_after_commit(conn, step_table)
+            removed[step_table] = removed.get(step_table, 0) + run(
+                conn, "delete_where", params, table=step_table, condition=condition).rowcount
+    return removed
+
+
+def format_removed(removed):
+    return ", ".join(f"{rows} from {table}" for table, rows in removed.items())
+
+
 def remove_item(conn):
     """
-    Removes an item from a specified table in the database.
-    Displays the contents of the table for reference before and after removal.
+    Removes the rows of a table matching one or more column values, along with the
+    rows of other tables that depend on them.
+
+    Steps:
+    1. Prompt the user for the table and display its contents for reference.
+    2. Prompt for the column values the rows to remove must match.
+    3. Show how many rows each table would lose and ask for confirmation.
+    4. Delete them in one transaction and display the updated table.
     """
     print("\n=== Remove Item from Table ===")
-    print("Available tables: SUB_TEAM, TEAM_MEMBER, PROJECT, MATERIALS, MAINTENANCE_PROCEDURE, DIMENSIONS, OUTSIDE_RESEARCH, PROJECT_MEMBERS, PROCEDURE_CONTRIBUTORS")
+    print("Available tables: " + ", ".join(TABLES))
     print("Example: To remove a team member with ID 5, specify: TEAM_MEMBER and 'Member_ID = 5'")
 
-    # Prompt user for table name
-    table = input("Enter the table name: ").strip()
+    # Step 1: Prompt for the table and display its contents
+    table = input("Enter the table name: ").strip().upper()
 
     try:
-        # Display the contents of the table
-        cursor = conn.cursor()
+        if table not in TABLES:
+            print(f"Table '{table}' does not exist.")
+            return
+        columns = ", ".join(table_schema(conn, table).columns)
         print(f"\nContents of table '{table}':")
-        cursor.execute(f"SELECT * FROM {table};")
-        rows = cursor.fetchall()
-        column_names = [description[0] for description in cursor.description]  # Get column headers
-
-        if rows:
-            # Print the table contents
-            print(f"{' | '.join(column_names)}")
-            print("-" * (len(column_names) * 15))
-            for row in rows:
-                print(" | ".join(map(str, row)))
-        else:
+        if not display_table(conn, table, columns):
             print(f"Table '{table}' is empty.")
-        
-        # Prompt user for condition
-        condition = input(f"\nEnter the condition for deletion (e.g., 'Column_Name = Value'): ").strip()
-        
-        # Execute the DELETE statement
-        query = f"DELETE FROM {table} WHERE {condition};"
-        print(f"Executing query: {query}")  # Debugging info
-        cursor.execute(query)
-        conn.commit()
-
-        # Feedback to user
-        if cursor.rowcount > 0:
-            print(f"Successfully removed {cursor.rowcount} item(s) from table '{table}'.")
-        else:
+            return
+
+        # Step 2: Prompt for the values to match
+        text = input("\nEnter the rows to remove as 'Column = value' (join several with AND): ")
+        predicates = parse_predicates(text)
+
+        # Step 3: Show what would be removed and confirm
+        would_remove = delete_rows(conn, table, predicates, dry_run=True)
+        if not would_remove[table]:
             print(f"No items matched the condition in table '{table}'.")
+            return
+        print(f"This will remove {format_removed(would_remove)}.")
+        if input("Proceed? (yes/no): ").strip().lower() not in ("yes", "y"):
+            print("Nothing was removed.")
+            return
 
-        # Display the updated contents of the table
-        print(f"\nUpdated contents of table '{table}':")
-        cursor.execute(f"SELECT * FROM {table};")
-        rows = cursor.fetchall()
+        # Step 4: Delete the rows and their dependents together
+        with unit_of_work(conn):
+            removed = delete_rows(conn, table, predicates)
+        print(f"Successfully removed {format_removed(removed)}.")
 
-        if rows:
-            print(f"{' | '.join(column_names)}")
-            print("-" * (len(column_names) * 15))
-            for row in rows:
-                print(" | ".join(map(str, row)))
-        else:
+        print(f"\nUpdated contents of table '{table}':")
+        if not display_table(conn, table, columns):
             print(f"Table '{table}' is now empty.")
 
+    except ValueError as e:
+        print(e)
     except sqlite3.Error as e:
         print(f"An error occurred: {e}")
-    except Exception as e:
-        print(f"An unexpected error occurred: {e}")
-
 
 
 def exit_program(conn):
     """
     Exits the program and closes the database connection.
     """
-    print("\nExiting program... Goodbye!")
+    print_transaction_stats(close_transactions(conn))
+    print_query_report()
+    if QUERY_DUMP:
+        QUERY_LOG.dump(QUERY_DUMP)
+        print(f"Query statistics written to {QUERY_DUMP}.")
+    print_cache_stats()
+    working_set = getattr(conn, "working_set", None)
     if conn:
         conn.close()
+    if working_set:
+        print(f"Wrote the in-memory database back to {working_set.path} {working_set.flushes} time(s) "
+              f"in {working_set.flush_seconds:.2f}s.")
+    print("\nExiting program... Goodbye!")
     exit()
 
+# Menu options in the order they are listed; the labels also name each option's
+# statements in the query report. Exit keeps its original number so scripts piping
+# answers into the menu still work, and new options are added after it.
+MENU_OPERATIONS = {
+    "1": "Create Project and Assign Team Members",
+    "2": "Track Materials for Project",
+    "3": "Track Outside Resources for Project",
+    "4": "Create Maintenance Procedure with Resources and Materials",
+    "5": "Search Responsibilities by Sub-Team",
+    "6": "Retrieve Contact Info for Project or Maintenance Procedure",
+    "7": "Add Item to Table",
+    "8": "Remove Item from Table",
+    "9": "Exit Program",
+    "10": "Search Materials, Research and Procedures",
+    "11": "Project Dashboard",
+}
+
+
 # Main menu
 def main():
+    # Any command-line arguments run a single command or batch file instead of the menu
+    if len(sys.argv) > 1:
+        from Phase3cli import run_cli
+        sys.exit(run_cli(sys.argv[1:]))
+
     conn = connect_to_database()
     if not conn:
         return  # Exit if the database connection fails
 
     while True:
         print("\n=== Project Management Application ===")
-        print("1. Create Project and Assign Team Members")
-        print("2. Track Materials for Project")
-        print("3. Track Outside Resources for Project")
-        print("4. Create Maintenance Procedure with Resources and Materials")
-        print("5. Search Responsibilities by Sub-Team")
-        print("6. Retrieve Contact Info for Project or Maintenance Procedure")
-        print("7. Add Item to Table")
-        print("8. Remove Item from Table")
-        print("9. Exit Program")
-
-        choice = input("Enter your choice (1-9): ")
-        if choice == '1':
-            create_project_and_assign_team_members(conn)
-        elif choice == '2':
-            track_materials_for_project(conn)
-        elif choice == '3':
-            track_outside_resources_for_project(conn)
-        elif choice == '4':
-            create_maintenance_procedure_with_resources_and_materials(conn)
-        elif choice == '5':
-            search_responsibilities_by_sub_team(conn)
-        elif choice == '6':
-            retrieve_contact_info_for_project_or_maintenance_procedure(conn)
-        elif choice == '7':
-            add_item(conn)
-        elif choice == '8':
-            remove_item(conn)
-        elif choice == '9':
-            exit_program(conn)
-            break
-        else:
-            print("Invalid choice. Please try again.")
+        for option, label in MENU_OPERATIONS.items():
+            print(f"{option}. {label}")
+
+        choice = input("Enter your choice (1-11): ")
+
+        # Statements run by the option are attributed to it in the query report
+        with operation(MENU_OPERATIONS.get(choice, "Invalid choice")):
+            # Drop cached reference rows if another connection has changed the database
+            check_data_version(conn)
+            if choice == '1':
+                create_project_and_assign_team_members(conn)
+            elif choice == '2':
+                track_materials_for_project(conn)
+            elif choice == '3':
+                track_outside_resources_for_project(conn)
+            elif choice == '4':
+                create_maintenance_procedure_with_resources_and_materials(conn)
+            elif choice == '5':
+                search_responsibilities_by_sub_team(conn)
+            elif choice == '6':
+                retrieve_contact_info_for_project_or_maintenance_procedure(conn)
+            elif choice == '7':
+                add_item(conn)
+            elif choice == '8':
+                remove_item(conn)
+            elif choice == '9':
+                exit_program(conn)
+                break
+            elif choice == '10':
+                search_materials_research_and_procedures(conn)
+            elif choice == '11':
+                project_dashboard_report(conn)
+            else:
+                print("Invalid choice. Please try again.")
 
     # Close the database connection before exiting
     conn.close()
@@ -0,0 +1,345 @@
+import argparse
+import contextlib
+import datetime
+import multiprocessing
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+from Phase3benchmark import build_database
+from Phase3cache import invalidate_all
+from Phase3catalog import forget_catalogs
+from Phase3database import connect_to_database, load_connection_profile
+from Phase3Setup import SEARCH_TABLES, rebuild_search_index
+from Phase3stress import collect_results, writer_process
+
+# Database pages copied per backup step; the source is only read-locked during a step,
+# so writers get in between steps
+PAGES_PER_STEP = int(os.environ.get("PHASE3_BACKUP_PAGES", "1024"))
+
+# Seconds to pause between backup steps, giving writers more room
+STEP_PAUSE = float(os.environ.get("PHASE3_BACKUP_PAUSE", "0"))
+
+# A backup is restarted from scratch whenever another connection writes to the source.
+# After this many restarts it is redone in one step, which in WAL mode holds only a
+# read snapshot and so does not block writers either.
+MAX_RESTARTS = 3
+
+# Directory backups are written to when no path is given
+BACKUP_DIRECTORY = os.environ.get("PHASE3_BACKUP_DIRECTORY", "backups")
+
+
+class TooManyRestarts(Exception):
+    pass
+
+
+class BackupProgress:
+    """
+    The progress callback of Connection.backup: counts the steps and restarts, pauses
+    between steps and reports progress about once a second.
+    """
+
+    def __init__(self, pause=STEP_PAUSE, max_restarts=MAX_RESTARTS, report=True):
+        self.pause = pause
+        self.max_restarts = max_restarts
+        self.report = report
+        self.steps = 0
+        self.restarts = 0
+        self.total = 0
+        self.last_remaining = None
+        self.started = self.last_report = time.perf_counter()
+
+    def __call__(self, status, remaining, total):
+        self.steps += 1
+        self.total = total
+        if self.last_remaining is not None and remaining > self.last_remaining:
+            self.restarts += 1
+            if self.restarts > self.max_restarts:
+                raise TooManyRestarts()
+        self.last_remaining = remaining
+
+        now = time.perf_counter()
+        if self.report and now - self.last_report >= 1.0:
+            print(f"    {total - remaining:,}/{total:,} pages ({(total - remaining) / max(total, 1):.0%}), "
+                  f"{self.restarts} restart(s)")
+            self.last_report = now
+        if self.pause and remaining:
+            time.sleep(self.pause)
+
+
+def default_backup_path(database, directory=BACKUP_DIRECTORY):
+    name = os.path.splitext(os.path.basename(database))[0]
+    return os.path.join(directory, f"{name}-{datetime.datetime.now():%Y%m%d-%H%M%S}.db")
+
+
+def copy_database(source, target_path, pages=PAGES_PER_STEP, pause=STEP_PAUSE, report=True):
+    """
+    Copies the database open on `source` to a new file at `target_path` with the online
+    backup API, `pages` pages per step. Falls back to one step if writes from other
+    connections keep restarting it. Returns the number of pages copied, the steps taken
+    and the restarts.
+    """
+    progress = BackupProgress(pause, report=report)
+    target = sqlite3.connect(target_path)
+    try:
+        try:
+            source.backup(target, pages=pages, progress=progress)
+        except TooManyRestarts:
+            if report:
+                print(f"    Restarted {progress.restarts} times by concurrent writes; copying in one step.")
+            source.backup(target, pages=-1)
+            progress.steps += 1
+        # A snapshot is a single file, even when copied from a database in WAL mode
+        target.execute("PRAGMA journal_mode = DELETE")
+    finally:
+        target.close()
+    return progress.total, progress.steps, progress.restarts
+
+
+def vacuum_into(source, target_path):
+    """
+    Writes a compacted copy of the database to a new file with VACUUM INTO. VACUUM may
+    renumber the rowids of MATERIALS and OUTSIDE_RESEARCH, so the copy's search
+    indexes are rebuilt.
+    """
+    source.execute("VACUUM INTO ?", (target_path,))
+    target = sqlite3.connect(target_path)
+    try:
+        target.execute("PRAGMA journal_mode = DELETE")
+        cursor = target.cursor()
+        rebuild_search_index(cursor)
+        cursor.close()
+        target.commit()
+    finally:
+        target.close()
+
+
+def verify_snapshot(path, quick=False):
+    """
+    Checks a snapshot file and returns a list of the problems found; an empty list
+    means it is sound. Runs PRAGMA integrity_check (or quick_check), the foreign key
+    check and each search index's own integrity check.
+    """
+    if not os.path.exists(path):
+        return [f"{path} does not exist"]
+    # Not opened read-only: FTS5 runs its integrity check as an INSERT, though it writes nothing
+    conn = sqlite3.connect(path)
+    problems = []
+    try:
+        check = "quick_check" if quick else "integrity_check"
+        problems += [row[0] for row in conn.execute(f"PRAGMA {check}").fetchall() if row[0] != "ok"]
+        problems += [f"row {rowid} of {table} refers to a missing {parent} row"
+                     for table, rowid, parent, _ in conn.execute("PRAGMA foreign_key_check").fetchmany(20)]
+        existing = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        for search_table in SEARCH_TABLES:
+            if search_table not in existing:
+                continue
+            try:
+                conn.execute(f"INSERT INTO {search_table} ({search_table}, rank) VALUES ('integrity-check', 1)")
+            except sqlite3.Error as e:
+                problems.append(f"{search_table}: {e}")
+    except sqlite3.Error as e:
+        problems.append(str(e))
+    finally:
+        conn.rollback()
+        conn.close()
+    return problems
+
+
+def backup_database(conn, path, pages=PAGES_PER_STEP, pause=STEP_PAUSE, vacuum=False, verify=True, report=True):
+    """
+    Writes a snapshot of the live database to `path` without stopping other operators:
+    copied with the backup API a few pages at a time, or compacted with VACUUM INTO.
+    The snapshot is written to path + ".partial" and only renamed into place once it
+    is complete and, with `verify`, has passed verify_snapshot. Raises ValueError if
+    `path` exists or the snapshot fails verification. Returns the snapshot's size in
+    bytes.
+    """
+    if os.path.exists(path):
+        raise ValueError(f"{path} already exists.")
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    partial = path + ".partial"
+    if os.path.exists(partial):
+        os.remove(partial)
+
+    started = time.perf_counter()
+    try:
+        if vacuum:
+            vacuum_into(conn, partial)
+            detail = "compacted with VACUUM INTO"
+        else:
+            pages_copied, steps, restarts = copy_database(conn, partial, pages, pause, report)
+            detail = f"{pages_copied:,} pages in {steps:,} steps, {restarts} restart(s)"
+        copied = time.perf_counter() - started
+
+        if verify:
+            problems = verify_snapshot(partial)
+            if problems:
+                raise ValueError(f"The snapshot failed verification: {'; '.join(problems[:5])}")
+        os.replace(partial, path)
+    except BaseException:
+        if os.path.exists(partial):
+            os.remove(partial)
+        raise
+
+    size = os.path.getsize(path)
+    if report:
+        elapsed = time.perf_counter() - started
+        print(f"Backed up to {path}: {size / 2 ** 20:,.1f} MB, {detail}, in {copied:.2f}s "
+              f"({size / 2 ** 20 / max(copied, 1e-9):,.1f} MB/s)"
+              + (f", verified in {elapsed - copied:.2f}s." if verify else "."))
+    return size
+
+
+def restore_database(conn, path, pages=PAGES_PER_STEP, verify=True, report=True):
+    """
+    Replaces the contents of the database open on `conn` with the snapshot at `path`
+    through the backup API. The snapshot is verified first unless `verify` is False,
+    and the database stays write-locked until the restore is done, so other
+    operators never see a half-restored database. Raises ValueError if the snapshot
+    fails verification.
+    """
+    if verify:
+        problems = verify_snapshot(path)
+        if problems:
+            raise ValueError(f"{path} failed verification: {'; '.join(problems[:5])}")
+
+    started = time.perf_counter()
+    snapshot = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    progress = BackupProgress(pause=0, report=report)
+    try:
+        snapshot.backup(conn, pages=pages, progress=progress)
+    finally:
+        snapshot.close()
+    invalidate_all()
+    forget_catalogs()
+    if report:
+        print(f"Restored {path}: {progress.total:,} pages in {time.perf_counter() - started:.2f}s.")
+
+
+def measure_writes(path, size, seconds, seed, during=None):
+    """
+    Runs a writer process creating projects for `seconds` while `during()` is called
+    repeatedly in this process, and returns the writer's writes per second together
+    with the results of `during`.
+    """
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+    writer = context.Process(target=writer_process, args=(path, size, seconds, seed, 1, 0, results))
+    writer.start()
+    outcomes = []
+    deadline = time.perf_counter() + seconds
+    time.sleep(0.5)
+    while during and time.perf_counter() < deadline:
+        outcomes.append(during())
+    (writes, failures, _), = collect_results([writer], results)
+    writer.join()
+    return writes / seconds, failures, outcomes
+
+
+def run_benchmark(size, page_settings, seconds, seed, pause=STEP_PAUSE):
+    """
+    Measures backup throughput for each pages-per-step setting and VACUUM INTO, alone
+    and while a writer process creates projects, and how much each slows the writer.
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "backup.db")
+        with contextlib.redirect_stdout(sys.stderr):
+            build_database(path, size, seed)
+        conn = connect_to_database(path, report=False)
+        database_mb = os.path.getsize(path) / 2 ** 20
+        baseline, _, _ = measure_writes(path, size, seconds, seed)
+        print(f"Database {database_mb:,.1f} MB; writer alone: {baseline:,.0f} writes/s")
+        print(f"{'Method':<18} {'Idle MB/s':>10} {'Loaded MB/s':>12} {'Restarts':>9} {'Writes/s':>10} {'Slowdown':>9}")
+
+        counter = iter(range(1000000))
+
+        def backup(pages, vacuum):
+            target = os.path.join(directory, f"snapshot-{next(counter)}.db")
+            started = time.perf_counter()
+            if vacuum:
+                vacuum_into(conn, target)
+                restarts = 0
+            else:
+                restarts = copy_database(conn, target, pages, pause, report=False)[2]
+            elapsed = time.perf_counter() - started
+            megabytes = os.path.getsize(target) / 2 ** 20
+            os.remove(target)
+            return megabytes / elapsed, restarts
+
+        methods = [(f"backup {pages} pages" if pages > 0 else "backup one step", pages, False)
+                   for pages in page_settings] + [("VACUUM INTO", 0, True)]
+        for label, pages, vacuum in methods:
+            idle, _ = backup(pages, vacuum)
+            writes, failures, outcomes = measure_writes(path, size, seconds, seed, lambda: backup(pages, vacuum))
+            loaded = sum(outcome[0] for outcome in outcomes) / max(len(outcomes), 1)
+            restarts = sum(outcome[1] for outcome in outcomes)
+            print(f"{label:<18} {idle:>10,.1f} {loaded:>12,.1f} {restarts:>9} {writes:>10,.0f} "
+                  f"{1 - writes / max(baseline, 1e-9):>9.0%}" + (f"  ({failures} failed writes)" if failures else ""))
+        conn.close()
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description="Back up, restore and verify the project database while it is in use.")
+    parser.add_argument("--database", help="database file (defaults to the connection profile's database)")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    command = commands.add_parser("backup", help="write a snapshot of the database")
+    command.add_argument("path", nargs="?", help=f"snapshot file (defaults to a timestamped file in {BACKUP_DIRECTORY}/)")
+    command.add_argument("--vacuum", action="store_true", help="write a compacted snapshot with VACUUM INTO")
+    command.add_argument("--pages", type=int, default=PAGES_PER_STEP, help="pages copied per step (-1 for one step)")
+    command.add_argument("--pause", type=float, default=STEP_PAUSE, help="seconds to pause between steps")
+    command.add_argument("--no-verify", action="store_true", help="skip checking the snapshot")
+
+    command = commands.add_parser("restore", help="replace the database's contents with a snapshot")
+    command.add_argument("path")
+    command.add_argument("--pages", type=int, default=PAGES_PER_STEP, help="pages copied per step (-1 for one step)")
+    command.add_argument("--no-verify", action="store_true", help="skip checking the snapshot first")
+
+    command = commands.add_parser("verify", help="check a snapshot's integrity")
+    command.add_argument("path")
+    command.add_argument("--quick", action="store_true", help="run quick_check instead of the full integrity_check")
+
+    command = commands.add_parser("benchmark", help="measure backup throughput and its effect on concurrent writes")
+    command.add_argument("--size", type=lambda value: int(float(value)), default=100000,
+                         help="members and projects in the test database")
+    command.add_argument("--pages", type=int, nargs="+", default=[100, 1024, 10000, -1], help="pages per step to try")
+    command.add_argument("--pause", type=float, default=STEP_PAUSE, help="seconds to pause between steps")
+    command.add_argument("--seconds", type=float, default=5.0, help="length of each measurement")
+    command.add_argument("--seed", type=int, default=0)
+    return parser.parse_args()
+
+
+def main():
+    args = parse_arguments()
+    if args.command == "benchmark":
+        run_benchmark(args.size, args.pages, args.seconds, args.seed, args.pause)
+        return
+    if args.command == "verify":
+        problems = verify_snapshot(args.path, args.quick)
+        for problem in problems[:20]:
+            print(problem)
+        print(f"{args.path} failed verification." if problems else f"{args.path} is sound.")
+        exit(1 if problems else 0)
+
+    database = args.database or load_connection_profile()["database"]
+    conn = connect_to_database(database, report=False)
+    if not conn:
+        exit(1)
+    try:
+        if args.command == "backup":
+            backup_database(conn, args.path or default_backup_path(database), args.pages, args.pause,
+                            args.vacuum, not args.no_verify)
+        else:
+            restore_database(conn, args.path, args.pages, not args.no_verify)
+    except (ValueError, OSError, sqlite3.Error) as e:
+        print(f"An error occurred: {e}")
+        exit(1)
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,316 @@
+import argparse
+import builtins
+import contextlib
+import json
+import multiprocessing
+import os
+import platform
+import queue
+import random
+import resource
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+
+import Phase3application as app
+from Phase3database import connect_to_database
+from Phase3fillwithdata import count, fill_database
+from Phase3migrations import migrate
+
+# Number of materials / resources submitted per call of options 2 and 3
+ITEMS_PER_CALL = 10
+
+
+class ScriptedInput:
+    """
+    Stands in for input(), answering each prompt with the next scripted value.
+    """
+
+    def __init__(self, answers):
+        self.answers = iter(answers)
+
+    def __call__(self, prompt=""):
+        try:
+            return next(self.answers)
+        except StopIteration:
+            raise RuntimeError(f"Scripted input exhausted at prompt: {prompt!r}")
+
+
+class LineCounter:
+    """
+    A write-only stdout replacement that counts the lines printed.
+    """
+
+    def __init__(self):
+        self.lines = 0
+
+    def write(self, text):
+        self.lines += text.count("\n")
+        return len(text)
+
+    def flush(self):
+        pass
+
+
+# Scripted answers for each menu option, given the iteration number, the database
+# size and a random generator. Option 9 (exit) is not benchmarked.
+def create_project_inputs(i, size, rng):
+    members = ", ".join(str(rng.randint(1, size)) for _ in range(3))
+    return [f"Benchmark project {i}", "2024-01-01", "2024-06-30", "yes", str(rng.randint(1, size)), members]
+
+
+def track_materials_inputs(i, size, rng):
+    materials = ", ".join(f"BenchMaterial{i}-{k}|Type A|Benchmark material|http://example.com/bench" for k in range(ITEMS_PER_CALL))
+    return [str(rng.randint(1, size)), materials]
+
+
+def track_resources_inputs(i, size, rng):
+    resources = ", ".join(f"BenchResearch{i}-{k}|Benchmark research|http://example.com/bench" for k in range(ITEMS_PER_CALL))
+    return [str(rng.randint(1, size)), resources]
+
+
+def create_procedure_inputs(i, size, rng):
+    project_id = rng.randint(1, size)
+    return [f"Benchmark procedure {i}", str(rng.randint(1, size)), "2024-01-01",
+            f"Material{project_id}-1, Material{project_id}-2", f"Research{project_id}-1"]
+
+
+def search_sub_team_inputs(i, size, rng):
+    return [str(rng.randint(1, max(size // 100, 1)))]
+
+
+def contact_info_inputs(i, size, rng):
+    if i % 2:
+        return [str(rng.randint(1, max(size // 10, 1))), "maintenance procedure"]
+    return [str(rng.randint(1, size)), "project"]
+
+
+def add_item_inputs(i, size, rng):
+    member_id = size * 10 + i
+    return ["TEAM_MEMBER", str(member_id), f"bench{member_id}@example.com", "5550000000", f"Benchmark Member {i}"]
+
+
+def remove_item_inputs(i, size, rng):
+    return ["PROJECT_MEMBERS", f"Project = {rng.randint(1, size)}", "yes"]
+
+
+def search_inputs(i, size, rng):
+    return [f"Material{rng.randint(1, size)}"]
+
+
+def dashboard_inputs(i, size, rng):
+    # Idle projects that had started by early January, so each run walks every page
+    return ["no", "", f"2023-01-{rng.randint(1, 9):02d}"]
+
+
+OPERATIONS = {
+    "1": ("create_project_and_assign_team_members", create_project_inputs),
+    "2": ("track_materials_for_project", track_materials_inputs),
+    "3": ("track_outside_resources_for_project", track_resources_inputs),
+    "4": ("create_maintenance_procedure_with_resources_and_materials", create_procedure_inputs),
+    "5": ("search_responsibilities_by_sub_team", search_sub_team_inputs),
+    "6": ("retrieve_contact_info_for_project_or_maintenance_procedure", contact_info_inputs),
+    "7": ("add_item", add_item_inputs),
+    "8": ("remove_item", remove_item_inputs),
+    "10": ("search_materials_research_and_procedures", search_inputs),
+    "11": ("project_dashboard_report", dashboard_inputs),
+}
+
+
+def build_database(path, size, seed):
+    """
+    Creates and fills a benchmark database with `size` members and projects.
+    """
+    conn = connect_to_database(path, report=False, in_memory=False)
+    migrate(conn, report=False)
+    fill_database(conn, members=size, sub_teams=max(size // 100, 1), projects=size,
+                  procedures=max(size // 10, 1), materials_per_project=5, research_per_project=1,
+                  members_per_project=5, contributors_per_procedure=5, seed=seed)
+    conn.close()
+
+
+def percentile(sorted_values, percent):
+    # Nearest-rank percentile of an already sorted list
+    index = max(int(round(percent / 100 * len(sorted_values) + 0.5)) - 1, 0)
+    return sorted_values[min(index, len(sorted_values) - 1)]
+
+
+def run_operation(path, option, size, iterations, seed, mode, results):
+    """
+    Runs one menu option `iterations` times against the database at `path` and
+    puts its latency percentiles, throughput and peak RSS on the `results` queue.
+    In "memory" mode the database is loaded into memory first (see WorkingSet), and
+    the time taken to load it and to write it back on close are reported too.
+
+    Runs in its own process so the peak RSS belongs to this operation alone. Rows
+    are counted as rows written (Connection.total_changes) plus lines displayed.
+    """
+    name, make_inputs = OPERATIONS[option]
+    operation = getattr(app, name)
+    rng = random.Random(seed)
+    output = LineCounter()
+
+    with contextlib.redirect_stdout(output):
+        started = time.perf_counter()
+        conn = connect_to_database(path, report=False, in_memory=mode == "memory")
+        load_seconds = time.perf_counter() - started
+    original_input = builtins.input
+    latencies = []
+    try:
+        for i in range(iterations):
+            builtins.input = ScriptedInput(make_inputs(i, size, rng))
+            with contextlib.redirect_stdout(output):
+                started = time.perf_counter()
+                operation(conn)
+                latencies.append(time.perf_counter() - started)
+        conn.commit()
+        rows = conn.total_changes + output.lines
+    except Exception as e:
+        results.put({"size": size, "mode": mode, "option": option, "operation": name, "error": repr(e)})
+        return
+    finally:
+        builtins.input = original_input
+        conn.close()
+
+    latencies.sort()
+    total = sum(latencies)
+    working_set = getattr(conn, "working_set", None)
+    results.put({
+        "size": size,
+        "mode": mode,
+        "option": option,
+        "operation": name,
+        "iterations": iterations,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p95_ms": percentile(latencies, 95) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "rows_per_sec": rows / total if total else 0.0,
+        "peak_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        "load_ms": load_seconds * 1000,
+        "flush_ms": working_set.flush_seconds * 1000 if working_set else 0.0,
+    })
+
+
+def wait_for_result(worker, results, poll=1.0):
+    """
+    Returns the result a worker process puts on `results`, or an error result if the
+    worker exits without putting one (e.g. it crashed).
+    """
+    while True:
+        try:
+            return results.get(timeout=poll)
+        except queue.Empty:
+            if not worker.is_alive():
+                break
+    # The worker may have put its result just before exiting
+    try:
+        return results.get(timeout=poll)
+    except queue.Empty:
+        return {"operation": "worker process", "error": f"exited with code {worker.exitcode} without a result"}
+
+
+def run_benchmarks(sizes, options, iterations, seed, modes=("disk",)):
+    """
+    Builds a database for each size and benchmarks each option against a fresh copy
+    of it in each mode ("disk" or "memory").
+    Returns the list of per-operation results.
+    """
+    context = multiprocessing.get_context("spawn")
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        for size in sizes:
+            path = os.path.join(directory, f"benchmark_{size}.db")
+            with contextlib.redirect_stdout(sys.stderr):
+                build_database(path, size, seed)
+            for mode in modes:
+                for option in options:
+                    # Every run starts from the database as built, so no run replays writes
+                    # an earlier run already made
+                    run_path = os.path.join(directory, "run.db")
+                    for leftover in (f"{run_path}-wal", f"{run_path}-shm"):
+                        if os.path.exists(leftover):
+                            os.remove(leftover)
+                    shutil.copyfile(path, run_path)
+                    worker_results = context.Queue()
+                    worker = context.Process(target=run_operation,
+                                             args=(run_path, option, size, iterations, seed, mode, worker_results))
+                    worker.start()
+                    result = wait_for_result(worker, worker_results)
+                    worker.join()
+                    if "error" in result:
+                        raise RuntimeError(f"Option {option} ({result['operation']}) failed at size {size} "
+                                           f"on {mode}: {result['error']}")
+                    results.append(result)
+                    print(f"size={size} {mode} option {option} ({result['operation']}): "
+                          f"p50={result['p50_ms']:.2f}ms p95={result['p95_ms']:.2f}ms p99={result['p99_ms']:.2f}ms "
+                          f"rows/s={result['rows_per_sec']:,.0f} peak RSS={result['peak_rss_kb']} KB "
+                          f"load={result['load_ms']:.0f}ms flush={result['flush_ms']:.0f}ms", file=sys.stderr)
+    return results
+
+
+def compare_results(baseline, results, tolerance):
+    """
+    Returns a message for every operation whose p95 latency grew by more than
+    `tolerance` (a fraction) compared to the matching baseline result.
+    """
+    # Reports from before the in-memory mode existed were all on disk
+    previous = {(result["size"], result.get("mode", "disk"), result["option"]): result
+                for result in baseline["results"]}
+    regressions = []
+    for result in results:
+        before = previous.get((result["size"], result["mode"], result["option"]))
+        if before and result["p95_ms"] > before["p95_ms"] * (1 + tolerance):
+            regressions.append(f"size={result['size']} {result['mode']} option {result['option']} ({result['operation']}): "
+                               f"p95 {before['p95_ms']:.2f}ms -> {result['p95_ms']:.2f}ms")
+    return regressions
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description="Benchmark every menu operation of Phase3application.py.")
+    parser.add_argument("--sizes", type=count, nargs="+", default=[1000, 10000],
+                        help="database sizes (members and projects) to benchmark against")
+    parser.add_argument("--options", nargs="+", default=list(OPERATIONS), choices=list(OPERATIONS),
+                        help="menu options to benchmark")
+    parser.add_argument("--modes", nargs="+", default=["disk"], choices=["disk", "memory"],
+                        help="run against the database file, an in-memory working set of it, or both")
+    parser.add_argument("--iterations", type=count, default=20)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write the JSON report to this file instead of stdout")
+    parser.add_argument("--compare", help="previous JSON report to check for p95 regressions")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="allowed p95 growth over the --compare report before failing (default 0.2)")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_arguments()
+    results = run_benchmarks(args.sizes, args.options, args.iterations, args.seed, args.modes)
+    report = {
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "iterations": args.iterations,
+        "seed": args.seed,
+        "results": results,
+    }
+
+    if args.output:
+        with open(args.output, "w") as report_file:
+            json.dump(report, report_file, indent=2)
+        print(f"Benchmark report written to {args.output}.")
+    else:
+        print(json.dumps(report, indent=2))
+
+    if args.compare:
+        with open(args.compare) as baseline_file:
+            regressions = compare_results(json.load(baseline_file), results, args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION: {regression}")
+        if regressions:
+            exit(1)
+        print("No p95 regressions against the baseline.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+import os
+import threading
+from collections import OrderedDict
+
+# Maximum number of entries held by each reference-table cache
+CACHE_ENTRIES = int(os.environ.get("PHASE3_CACHE_ENTRIES", "10000"))
+
+
+class LRUCache:
+    """
+    A bounded least-recently-used cache that counts its hits and misses.
+    Lookups that found no row are cached too, so repeated checks for a
+    missing ID do not go back to the database either.
+
+    Safe to share between the threads of a connection pool; `load()` runs outside
+    the lock so a slow lookup does not hold up hits on other keys.
+    """
+
+    def __init__(self, max_entries=CACHE_ENTRIES):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        # Bumped by clear() so a value loaded before an invalidation is not cached after it
+        self.generation = 0
+
+    def get(self, key, load):
+        """
+        Returns the cached value for `key`, calling `load()` and caching its result on a miss.
+        """
+        with self.lock:
+            if key in self.entries:
+                self.hits += 1
+                self.entries.move_to_end(key)
+                return self.entries[key]
+            self.misses += 1
+            generation = self.generation
+
+        value = load()
+        with self.lock:
+            if generation != self.generation:
+                return value
+            self.entries[key] = value
+            if len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+        return value
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.generation += 1
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {"hits": self.hits, "misses": self.misses, "entries": len(self.entries),
+                    "hit_rate": self.hits / lookups if lookups else 0.0}
+
+
+TEAM_MEMBER_CACHE = LRUCache()
+SUB_TEAM_CACHE = LRUCache()
+
+# The cache holding rows of each cached table
+TABLE_CACHES = {
+    "TEAM_MEMBER": TEAM_MEMBER_CACHE,
+    "SUB_TEAM": SUB_TEAM_CACHE,
+}
+
+# PRAGMA data_version last seen on each connection, to notice commits made by other
+# connections, and the tables written in each connection's open transaction. Both are
+# keyed by the connection itself, not its id(), so a connection opened after another
+# closed never inherits its entries, and are shared by the threads of a pool.
+last_data_versions = {}
+pending_invalidations = {}
+connection_state_lock = threading.Lock()
+
+
+def cache_key(value):
+    """
+    Normalises an ID typed as text or given as a number to the integer it refers to.
+    Returns None for values that are not integers, which are never cached.
+    """
+    try:
+        return int(str(value).strip())
+    except ValueError:
+        return None
+
+
+def invalidate_table(table):
+    """
+    Drops the cached rows of `table` after a write to it.
+    """
+    cache = TABLE_CACHES.get(table.strip().upper())
+    if cache:
+        cache.clear()
+
+
+def invalidate_after_commit(conn, table):
+    """
+    Drops the cached rows of `table` once the connection's transaction ends. Clearing
+    them before it commits is not enough: another connection could read and cache the
+    old row in between.
+    """
+    with connection_state_lock:
+        pending_invalidations.setdefault(conn, set()).add(table.strip().upper())
+
+
+def invalidate_pending(conn):
+    """
+    Drops the cached rows of every table written in the transaction the connection
+    just committed or rolled back.
+    """
+    with connection_state_lock:
+        tables = pending_invalidations.pop(conn, ())
+    for table in tables:
+        invalidate_table(table)
+
+
+def invalidate_all():
+    for cache in TABLE_CACHES.values():
+        cache.clear()
+
+
+def check_data_version(conn):
+    """
+    Clears every cache if another connection has committed since the last check.
+    """
+    version = conn.execute("PRAGMA data_version;").fetchall()[0][0]
+    with connection_state_lock:
+        changed = last_data_versions.get(conn, version) != version
+        last_data_versions[conn] = version
+    if changed:
+        invalidate_all()
+
+
+def forget_connection(conn):
+    """
+    Drops what is kept about a connection that is closing. Tables it wrote in a
+    transaction that never ended are cleared, since the close rolls it back.
+    """
+    invalidate_pending(conn)
+    with connection_state_lock:
+        last_data_versions.pop(conn, None)
+
+
+def print_cache_stats():
+    """
+    Prints the hit and miss counts of each reference-table cache that was used.
+    """
+    for table, cache in TABLE_CACHES.items():
+        stats = cache.stats()
+        if stats["hits"] or stats["misses"]:
+            print(f"{table} cache: {stats['hits']} hits, {stats['misses']} misses "
+                  f"({stats['hit_rate']:.0%} hit rate), {stats['entries']} entries")
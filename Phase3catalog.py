@@ -0,0 +1,192 @@
+import datetime
+import threading
+
+from Phase3queries import fetch_all, fetch_one
+
+# Values accepted for BOOLEAN columns, in any case
+TRUE_VALUES = ("1", "true", "yes", "y")
+FALSE_VALUES = ("0", "false", "no", "n")
+
+
+def convert_integer(value):
+    """
+    Returns a whole number given as an int, a float with no fraction (e.g. 3.0 from
+    JSON) or a string of digits. Raises ValueError for anything else, including
+    booleans.
+    """
+    if isinstance(value, str):
+        value = value.strip()
+        if not value.lstrip("-").isdigit():
+            raise ValueError(f"'{value}' is not an integer")
+        return int(value)
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    if isinstance(value, int) and not isinstance(value, bool):
+        return value
+    raise ValueError(f"'{value}' is not an integer")
+
+
+def convert_boolean(value):
+    text = str(value).strip().lower()
+    if text in TRUE_VALUES:
+        return 1
+    if text in FALSE_VALUES:
+        return 0
+    raise ValueError(f"'{value}' is not a boolean")
+
+
+def convert_date(value):
+    """
+    Returns a date, datetime or ISO-8601 date or timestamp (with - or / between the
+    parts of the date) as YYYY-MM-DD.
+    """
+    if isinstance(value, datetime.date):
+        return value.isoformat()[:10]
+    try:
+        return datetime.datetime.fromisoformat(str(value).strip().replace("/", "-")).date().isoformat()
+    except ValueError:
+        raise ValueError(f"'{value}' is not a date (YYYY-MM-DD)")
+
+
+# Converter for each declared column type; values of any other type are stored as given
+CONVERTERS = {
+    "INTEGER": convert_integer,
+    "BOOLEAN": convert_boolean,
+    "DATE": convert_date,
+}
+
+
+class TableSchema:
+    """
+    What the application needs to know about one table: its columns in order with
+    their declared types, which are required, its primary key, foreign keys and indexed
+    columns, and a prebuilt INSERT of every column.
+    """
+
+    def __init__(self, name, table_info, foreign_keys, index_columns):
+        self.name = name
+        self.columns = [row[1] for row in table_info]
+        self.types = {row[1]: row[2].upper() for row in table_info}
+        self.primary_key = [row[1] for row in sorted(table_info, key=lambda row: row[5]) if row[5]]
+        # An INTEGER PRIMARY KEY is the rowid; SQLite fills it in when left NULL
+        self.integer_key = (self.primary_key[0] if len(self.primary_key) == 1
+                            and self.types[self.primary_key[0]] == "INTEGER" else None)
+        self.required = [row[1] for row in table_info if (row[3] or row[5]) and row[1] != self.integer_key]
+        # (column, parent table, parent column) for each foreign key
+        self.foreign_keys = [(row[3], row[2], row[4]) for row in foreign_keys]
+        self.indexed = {"rowid", *self.primary_key[:1], *index_columns}
+        self.lookup = {column.lower(): column for column in self.columns}
+        self.conversions = [(index, CONVERTERS[self.types[column]]) for index, column in enumerate(self.columns)
+                            if self.types[column] in CONVERTERS]
+        self.insert = {"table": name, "columns": ", ".join(self.columns),
+                       "placeholders": ", ".join("?" * len(self.columns))}
+
+    def column(self, name):
+        """
+        Returns the column called `name` in any case, or raises ValueError.
+        """
+        column = self.lookup.get(name.strip().lower())
+        if column is None:
+            raise ValueError(f"Table '{self.name}' has no column '{name.strip()}'.")
+        return column
+
+    def coerce(self, column, value):
+        """
+        Converts a value for `column` to the column's declared type; None and blank
+        strings become NULL. Raises ValueError naming the column.
+        """
+        if value is None or (isinstance(value, str) and not value.strip()):
+            return None
+        converter = CONVERTERS.get(self.types[column])
+        if not converter:
+            return value
+        try:
+            return converter(value)
+        except ValueError as e:
+            raise ValueError(f"{column}: {e}")
+
+    def row(self, values):
+        """
+        Turns a dict of column name to value into the parameters of the prebuilt
+        INSERT, in column order with every value coerced. Raises ValueError for an
+        unknown column or a missing required value.
+        """
+        given = {self.column(name): value for name, value in values.items()}
+        row = [self.coerce(column, given.get(column)) for column in self.columns]
+        missing = [column for column, value in zip(self.columns, row) if value is None and column in self.required]
+        if missing:
+            raise ValueError(f"Table '{self.name}' needs a value for {', '.join(missing)}.")
+        return row
+
+
+class SchemaCatalog:
+    """
+    Every table's TableSchema, read from sqlite_master and the table PRAGMAs in one
+    go and kept until the database's schema_version changes.
+    """
+
+    def __init__(self):
+        self.schema_version = None
+        self.tables = {}
+
+    def load(self, conn, schema_version):
+        tables = {}
+        for (name,) in fetch_all(conn, "table_names"):
+            index_columns = set()
+            for index in fetch_all(conn, "index_list", table=name):
+                info = fetch_all(conn, "index_info", index=index[1])
+                if info:
+                    index_columns.add(min(info)[2])
+            tables[name.upper()] = TableSchema(name, fetch_all(conn, "table_info", table=name),
+                                               fetch_all(conn, "foreign_key_list", table=name), index_columns)
+        self.tables = tables
+        self.schema_version = schema_version
+
+    def table(self, name):
+        """
+        Returns the TableSchema of `name` in any case, or raises ValueError.
+        """
+        schema = self.tables.get(name.strip().upper())
+        if schema is None:
+            raise ValueError(f"Table '{name.strip()}' does not exist.")
+        return schema
+
+    def referencing(self, table):
+        """
+        Returns (child TableSchema, child column, parent column) for every foreign key
+        that refers to `table`.
+        """
+        return [(child, column, parent_column) for child in self.tables.values()
+                for column, parent, parent_column in child.foreign_keys if parent.upper() == table.upper()]
+
+
+# One catalog per database file (or per in-memory connection)
+CATALOGS = {}
+CATALOGS_LOCK = threading.Lock()
+
+
+def schema_catalog(conn):
+    """
+    Returns the catalog of the connection's database, reloading it first if the
+    schema has changed since it was read. Costs one query when nothing has changed.
+    """
+    database, schema_version = fetch_one(conn, "schema_version")
+    key = database or id(conn)
+    with CATALOGS_LOCK:
+        catalog = CATALOGS.setdefault(key, SchemaCatalog())
+    if catalog.schema_version != schema_version:
+        catalog.load(conn, schema_version)
+    return catalog
+
+
+def forget_catalogs():
+    """
+    Drops every catalog, e.g. after a restore replaced a database file's schema
+    without necessarily changing its schema_version.
+    """
+    with CATALOGS_LOCK:
+        CATALOGS.clear()
+
+
+def table_schema(conn, table):
+    return schema_catalog(conn).table(table)
@@ -0,0 +1,563 @@
+import argparse
+import csv
+import json
+import os
+import sqlite3
+import sys
+import time
+
+import Phase3application as app
+from Phase3database import connect_to_database
+from Phase3instrument import QUERY_LOG, operation
+from Phase3membership import (MEMBERSHIPS, add_memberships, export_adjacency, move_memberships, parse_member_ids,
+                              read_roster, remove_memberships, sync_memberships)
+from Phase3pool import TransactionManager, close_transactions, print_transaction_stats, unit_of_work
+from Phase3queries import TABLES
+from Phase3Setup import SUMMARY_TABLES, check_summary_tables, rebuild_summary_tables
+from Phase3transfer import CHUNK_SIZE, TRANSACTION_SIZE, export_table, import_table, table_path
+
+# Operations per transaction when running a batch file
+GROUP_SIZE = 1000
+
+# Commands that take a list of items, with the record field holding the list and
+# the fields making up one item
+ITEM_COMMANDS = {
+    "track-materials": ("materials", ("name", "material_type", "description", "link")),
+    "track-resources": ("resources", ("name", "description", "link")),
+}
+
+
+def split_list(value):
+    """
+    Turns a list or a comma-separated string into a list of stripped, non-empty strings.
+    """
+    if isinstance(value, list):
+        return [str(item).strip() for item in value if str(item).strip()]
+    return [item.strip() for item in str(value or "").split(",") if item.strip()]
+
+
+def parse_bool(value):
+    return str(value).strip().lower() in ("1", "true", "yes", "y")
+
+
+def read_item_file(path, field_names):
+    """
+    Reads materials or resources from a CSV file with a header naming `field_names`.
+    """
+    with open(path, newline="") as item_file:
+        return [tuple((row.get(field) or "").strip() for field in field_names) for row in csv.DictReader(item_file)]
+
+
+# Batch operations. Each takes the connection and one operation record (a dict of
+# field name to value) and returns a one-line summary of what it did.
+def op_create_project(conn, record):
+    project_id, assigned, skipped = app.create_project(
+        conn, record["start_date"], record["end_date"], parse_bool(record.get("in_use", "no")),
+        record["owner_id"], split_list(record.get("member_ids", "")), record.get("name"))
+    return f"Project {project_id} created with {len(assigned)} member(s) assigned, {len(skipped)} skipped."
+
+
+def op_track_materials(conn, record):
+    materials = [tuple(material) for material in record["materials"]]
+    counts = app.track_materials_batch(conn, record["project_id"], materials)
+    return f"Project {record['project_id']}: {counts['inserted']} material(s) inserted, {counts['linked']} linked."
+
+
+def op_track_resources(conn, record):
+    resources = [tuple(resource) for resource in record["resources"]]
+    counts = app.track_outside_resources_batch(conn, record["project_id"], resources)
+    return f"Project {record['project_id']}: {counts['inserted']} resource(s) inserted, {counts['linked']} linked."
+
+
+def op_create_procedure(conn, record):
+    procedure_id, added_materials, added_resources = app.create_maintenance_procedure(
+        conn, record["description"], record["maintainer_id"], record["last_edited"],
+        split_list(record.get("materials", "")), split_list(record.get("resources", "")))
+    return (f"Maintenance procedure {procedure_id} created, {len(added_materials)} material(s) and "
+            f"{len(added_resources)} resource(s) added.")
+
+
+def op_add(conn, record):
+    values = record["values"]
+    if isinstance(values, str):
+        values = json.loads(values)
+    row_id = app.add_row(conn, record["table"], values)
+    return f"Added row {row_id} to table '{record['table']}'."
+
+
+def op_remove(conn, record):
+    where = record["where"]
+    if isinstance(where, str):
+        where = json.loads(where) if where.lstrip().startswith("{") else app.parse_predicates(where)
+    dry_run = parse_bool(record.get("dry_run", False))
+    removed = app.delete_rows(conn, record["table"], where, dry_run)
+    if dry_run:
+        return f"Would remove {app.format_removed(removed)}."
+    return f"Removed {app.format_removed(removed)}."
+
+
+BATCH_OPERATIONS = {
+    "create-project": op_create_project,
+    "track-materials": op_track_materials,
+    "track-resources": op_track_resources,
+    "create-procedure": op_create_procedure,
+    "add": op_add,
+    "remove": op_remove,
+}
+
+# Single-item records that runs of lines for the same project are merged from,
+# and the list operation they are merged into
+MERGED_OPERATIONS = {
+    "track-material": "track-materials",
+    "track-resource": "track-resources",
+}
+
+
+def read_batch_file(path):
+    """
+    Yields (line number, record) for every operation in a JSON-lines or CSV batch file.
+    CSV files need an "op" column; empty cells are left out of the record. A line that
+    is not an operation yields a string saying why instead of a record.
+    """
+    with open(path, newline="") as batch_file:
+        if path.lower().endswith(".csv"):
+            for line_number, row in enumerate(csv.DictReader(batch_file), start=2):
+                yield line_number, {field: value for field, value in row.items() if value not in (None, "")}
+        else:
+            for line_number, line in enumerate(batch_file, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError as e:
+                    yield line_number, f"invalid JSON: {e}"
+                    continue
+                yield line_number, record if isinstance(record, dict) else "expected a JSON object"
+
+
+def merge_records(records):
+    """
+    Merges runs of single-item track-material / track-resource records for the same
+    project into one track-materials / track-resources record, so each run becomes a
+    single batched upsert. Yields (first line number, operation count, record).
+    Unreadable lines are passed through in order.
+    """
+    pending = None
+    for line_number, record in records:
+        op = record.get("op") if isinstance(record, dict) else None
+        if op in MERGED_OPERATIONS:
+            merged_op = MERGED_OPERATIONS[op]
+            list_field, item_fields = ITEM_COMMANDS[merged_op]
+            item = tuple(str(record.get(field, "")).strip() for field in item_fields)
+            if pending and pending[2]["op"] == merged_op and str(pending[2]["project_id"]) == str(record.get("project_id")):
+                pending[2][list_field].append(item)
+                pending[1] += 1
+                continue
+            if pending:
+                yield tuple(pending)
+            pending = [line_number, 1, {"op": merged_op, "project_id": record.get("project_id"), list_field: [item]}]
+            continue
+
+        if pending:
+            yield tuple(pending)
+            pending = None
+        yield line_number, 1, record
+
+    if pending:
+        yield tuple(pending)
+
+
+def run_batch(conn, path, group_size=GROUP_SIZE, verbose=False):
+    """
+    Runs every operation in a batch file over one connection, committing once per
+    `group_size` operations. Each operation is a unit of work, so a failing one is
+    rolled back on its own and reported without losing the rest of its group.
+    Returns the number of operations that succeeded and failed.
+    """
+    transactions = TransactionManager(conn, commit_window_ms=float("inf"), group_size=group_size)
+    succeeded = failed = 0
+    started = time.perf_counter()
+
+    try:
+        for line_number, operations, record in merge_records(read_batch_file(path)):
+            if isinstance(record, str):
+                failed += operations
+                print(f"Line {line_number} failed: {record}")
+                continue
+            try:
+                with transactions.unit(durable=False):
+                    operation = BATCH_OPERATIONS.get(record.get("op"))
+                    if not operation:
+                        raise ValueError(f"Unknown operation '{record.get('op')}'.")
+                    summary = operation(conn, record)
+                succeeded += operations
+                if verbose:
+                    print(f"Line {line_number}: {summary}")
+            except KeyError as e:
+                failed += operations
+                print(f"Line {line_number} ({record.get('op')}) failed: missing field {e}")
+            except (ValueError, TypeError, sqlite3.Error) as e:
+                failed += operations
+                print(f"Line {line_number} ({record.get('op')}) failed: {e}")
+    finally:
+        # Operations that succeeded are kept even if reading the file fails part way
+        transactions.flush()
+    elapsed = time.perf_counter() - started
+    total = succeeded + failed
+    print(f"Batch complete: {succeeded} succeeded, {failed} failed in {elapsed:.2f}s "
+          f"({total / max(elapsed, 1e-9):,.0f} operations/s).")
+    print_transaction_stats(transactions.stats())
+    return succeeded, failed
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="Phase3application.py",
+                                     description="Run project database operations without the interactive menu.")
+    parser.add_argument("--database", help="database file (defaults to the connection profile's database)")
+    parser.add_argument("--query-log", metavar="PATH", help="write the statements run and their timings to a JSON file")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    command = commands.add_parser("create-project", help="create a project and assign team members")
+    command.add_argument("--name", help="project name")
+    command.add_argument("--start-date", required=True)
+    command.add_argument("--end-date", required=True)
+    command.add_argument("--owner", required=True, help="owner team member ID")
+    command.add_argument("--in-use", action="store_true")
+    command.add_argument("--members", default="", help="comma-separated team member IDs")
+
+    for name, (list_field, item_fields) in ITEM_COMMANDS.items():
+        command = commands.add_parser(name, help=f"add and link {list_field} to a project")
+        command.add_argument("--project", required=True)
+        source = command.add_mutually_exclusive_group(required=True)
+        source.add_argument("--file", help=f"CSV file with a {','.join(item_fields)} header")
+        source.add_argument("--items", help=f"comma-separated list of {'|'.join(item_fields)} items")
+
+    command = commands.add_parser("create-procedure", help="create a maintenance procedure")
+    command.add_argument("--description", required=True)
+    command.add_argument("--maintainer", required=True, help="maintainer team member ID")
+    command.add_argument("--last-edited", required=True)
+    command.add_argument("--materials", default="", help="comma-separated material names")
+    command.add_argument("--resources", default="", help="comma-separated outside resource names")
+
+    command = commands.add_parser("responsibilities", help="show the responsibilities of a sub-team")
+    command.add_argument("--team", required=True)
+
+    command = commands.add_parser("contacts", help="show contact info for a project or maintenance procedure")
+    entity = command.add_mutually_exclusive_group(required=True)
+    entity.add_argument("--project")
+    entity.add_argument("--procedure")
+
+    command = commands.add_parser("search", help="search materials, outside research and maintenance procedures")
+    command.add_argument("text", nargs="+")
+    command.add_argument("--page", type=int, default=1)
+    command.add_argument("--page-size", type=int, help="results per page")
+
+    command = commands.add_parser("dashboard", help="show each project's team size and linked items")
+    command.add_argument("--in-use", choices=["yes", "no"], help="only projects in use, or only those not")
+    command.add_argument("--from", dest="active_from", help="only projects active on or after this date")
+    command.add_argument("--to", dest="active_to", help="only projects active on or before this date")
+    command.add_argument("--page-size", type=int, help="projects fetched per query")
+
+    command = commands.add_parser("projects-ending", help="list the projects ending between two dates")
+    command.add_argument("--from", dest="start_date", help="first end date (defaults to the start of this quarter)")
+    command.add_argument("--to", dest="end_date", help="last end date (defaults to the end of this quarter)")
+    command.add_argument("--in-use", choices=["yes", "no"], help="only projects in use, or only those not")
+    command.add_argument("--page-size", type=int, help="projects fetched per query")
+
+    command = commands.add_parser("procedures-edited", help="list the maintenance procedures edited between two dates")
+    command.add_argument("--from", dest="start_date", help="first date (defaults to the start of this quarter)")
+    command.add_argument("--to", dest="end_date", help="last date (defaults to the end of this quarter)")
+    command.add_argument("--page-size", type=int, help="procedures fetched per query")
+
+    command = commands.add_parser("summaries", help="check or rebuild the summary count tables")
+    action = command.add_mutually_exclusive_group(required=True)
+    action.add_argument("--check", action="store_true", help="compare every stored count with a fresh count")
+    action.add_argument("--rebuild", action="store_true", help="recount every summary table")
+
+    command = commands.add_parser("add", help="add a row to a table")
+    command.add_argument("--table", required=True)
+    command.add_argument("values", nargs="+", metavar="COLUMN=VALUE", help="an empty VALUE stores NULL")
+
+    command = commands.add_parser("remove", help="remove rows from a table, and the rows that depend on them")
+    command.add_argument("--table", required=True)
+    command.add_argument("where", nargs="+", metavar="COLUMN=VALUE", help="values the rows must match; an empty VALUE matches NULL")
+    command.add_argument("--dry-run", action="store_true", help="show how many rows each table would lose")
+
+    for name, action in (("members-add", "link"), ("members-remove", "unlink")):
+        command = commands.add_parser(name, help=f"{action} team members to a project or procedure in one pass")
+        command.add_argument("owner", help="project (or procedure) ID")
+        command.add_argument("--members", required=True, help="member IDs and ranges, e.g. 3,7,10-20")
+
+    command = commands.add_parser("members-move", help="move team members from one project or procedure to another")
+    command.add_argument("source", help="project (or procedure) ID to move members from")
+    command.add_argument("target", help="project (or procedure) ID to move them to")
+    command.add_argument("--members", help="member IDs and ranges to move (defaults to every member)")
+
+    command = commands.add_parser("members-sync", help="make each listed project's or procedure's members "
+                                                       "exactly those in a roster file")
+    command.add_argument("file", help="CSV or JSON-lines file of Project (or Procedure) and Member pairs")
+
+    command = commands.add_parser("members-export", help="export who is on what as adjacency lists")
+    command.add_argument("path", help="output file (.csv or .jsonl)")
+    command.add_argument("--by", choices=["member", "owner"], default="member",
+                         help="one line per member with its projects, or per project with its members")
+
+    for name in ("members-add", "members-remove", "members-move", "members-sync", "members-export"):
+        commands.choices[name].add_argument("--kind", choices=list(MEMBERSHIPS), default="project",
+                                            help="project members or procedure contributors")
+
+    command = commands.add_parser("batch", help="run a JSON-lines or CSV file of operations")
+    command.add_argument("file")
+    command.add_argument("--group-size", type=int, default=GROUP_SIZE, help="operations per transaction")
+    command.add_argument("--verbose", action="store_true", help="print a line for every operation")
+
+    command = commands.add_parser("export", help="export a table, or every table, to CSV or JSON lines")
+    command.add_argument("table", help="table name, or 'all' to export every table into a directory")
+    command.add_argument("path", help="output file (.csv or .jsonl), or a directory with 'all'")
+    command.add_argument("--format", choices=["csv", "jsonl"], default="csv", help="file format used with 'all'")
+
+    command = commands.add_parser("import", help="import a table, or every table, from CSV or JSON lines")
+    command.add_argument("table", help="table name, or 'all' to import every TABLE.csv/TABLE.jsonl in a directory")
+    command.add_argument("path", help="input file (.csv or .jsonl), or a directory with 'all'")
+    command.add_argument("--errors", help="file for rejected rows (defaults to <input>.errors.<ext>)")
+    command.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, help="rows validated and inserted together")
+    command.add_argument("--transaction-size", type=int, default=TRANSACTION_SIZE, help="rows per transaction")
+
+    return parser
+
+
+def run_transfer(conn, args):
+    """
+    Runs the export or import command and returns the process exit status.
+    Importing every table goes parents first so their rows exist before the rows
+    that refer to them.
+    """
+    if args.table.lower() == "all":
+        if args.command == "export":
+            os.makedirs(args.path, exist_ok=True)
+        paths = []
+        for table in TABLES:
+            for file_type in ([args.format] if args.command == "export" else ["csv", "jsonl"]):
+                path = table_path(args.path, table, file_type)
+                if args.command == "export" or os.path.exists(path):
+                    paths.append((table, path))
+    else:
+        paths = [(args.table, args.path)]
+
+    rejected = 0
+    for table, path in paths:
+        if args.command == "export":
+            started = time.perf_counter()
+            exported = export_table(conn, table, path)
+            elapsed = time.perf_counter() - started
+            print(f"{table}: {exported:,} rows exported to {path} in {elapsed:.2f}s "
+                  f"({exported / max(elapsed, 1e-9):,.0f} rows/s).")
+        else:
+            errors = args.errors if len(paths) == 1 else None
+            rejected += import_table(conn, table, path, errors, args.chunk_size, args.transaction_size)[1]
+    return 1 if rejected else 0
+
+
+def run_memberships(conn, args):
+    """
+    Runs a members-* command and returns the process exit status. Changes are
+    committed as one unit of work.
+    """
+    if args.command == "members-export":
+        started = time.perf_counter()
+        lines = export_adjacency(conn, args.kind, args.path, args.by)
+        print(f"{lines:,} adjacency lists written to {args.path} in {time.perf_counter() - started:.2f}s.")
+        return 0
+
+    rejected = []
+    with unit_of_work(conn):
+        if args.command == "members-move":
+            member_ids = None if args.members is None else parse_member_ids(args.members)
+            counts = move_memberships(conn, args.kind, args.source, args.target, member_ids)
+            print(f"{counts['moved']} member(s) moved from {args.kind} {args.source} to {args.target}, "
+                  f"{counts['merged']} already there.")
+            return 0
+        if args.command == "members-sync":
+            pairs, rejected = read_roster(args.file, args.kind)
+            counts = sync_memberships(conn, args.kind, pairs)
+        else:
+            pairs = [(args.owner, member_id) for member_id in parse_member_ids(args.members)]
+            if args.command == "members-add":
+                counts = add_memberships(conn, args.kind, pairs)
+            else:
+                counts = remove_memberships(conn, args.kind, pairs)
+
+    for line_number, reason in rejected:
+        print(f"Skipping line {line_number} of {args.file}: {reason}")
+    for owner_id, member_id, reason in counts.get("unknown", []):
+        print(f"Skipping {args.kind} {owner_id} member {member_id}: {reason}")
+    print(", ".join(f"{counts[count]} link(s) {count}" for count in ("added", "removed") if count in counts) + ".")
+    return 1 if rejected or counts.get("unknown") else 0
+
+
+def parse_column_values(arguments):
+    """
+    Turns COLUMN=VALUE arguments into a dict of column to value, where an empty VALUE
+    stands for NULL. Raises ValueError for an argument of any other form.
+    """
+    values = {}
+    for argument in arguments:
+        column, separator, value = argument.partition("=")
+        if not separator or not column.strip():
+            raise ValueError(f"Expected COLUMN=VALUE, got '{argument}' (use COLUMN= for NULL).")
+        values[column.strip()] = value if value else None
+    return values
+
+
+def record_from_arguments(args):
+    """
+    Turns the arguments of a single write command into a batch operation record.
+    """
+    if args.command == "create-project":
+        return {"op": args.command, "name": args.name, "start_date": args.start_date, "end_date": args.end_date,
+                "in_use": args.in_use, "owner_id": args.owner, "member_ids": args.members}
+    if args.command in ITEM_COMMANDS:
+        list_field, item_fields = ITEM_COMMANDS[args.command]
+        if args.file:
+            items = read_item_file(args.file, item_fields)
+        else:
+            items, skipped = app.parse_delimited_items(args.items, len(item_fields))
+            for item in skipped:
+                print(f"Skipping invalid input: {item}")
+        return {"op": args.command, "project_id": args.project, list_field: items}
+    if args.command == "create-procedure":
+        return {"op": args.command, "description": args.description, "maintainer_id": args.maintainer,
+                "last_edited": args.last_edited, "materials": args.materials, "resources": args.resources}
+    if args.command == "add":
+        return {"op": args.command, "table": args.table, "values": parse_column_values(args.values)}
+    return {"op": args.command, "table": args.table, "where": parse_column_values(args.where),
+            "dry_run": args.dry_run}
+
+
+def run_summaries(conn, args):
+    """
+    Checks the summary tables against fresh counts, or recounts them.
+    """
+    cursor = conn.cursor()
+    try:
+        if args.rebuild:
+            with unit_of_work(conn):
+                rebuild_summary_tables(cursor)
+            print(f"Rebuilt {len(SUMMARY_TABLES)} summary tables.")
+            return 0
+
+        differences = check_summary_tables(cursor)
+        for summary, group, stored, actual in differences[:20]:
+            print(f"{summary}: {SUMMARY_TABLES[summary][1]} {group} has {stored} stored but {actual} counted")
+        if differences:
+            print(f"{len(differences)} summary count(s) are out of date; run summaries --rebuild.")
+            return 1
+        print(f"All {len(SUMMARY_TABLES)} summary tables match their counts.")
+        return 0
+    finally:
+        cursor.close()
+
+
+def run_cli(argv):
+    """
+    Runs one command-line command and returns the process exit status.
+    """
+    args = build_parser().parse_args(argv)
+    conn = connect_to_database(args.database, report=False)
+    if not conn:
+        return 1
+
+    try:
+        with operation(args.command):
+            return run_command(conn, args)
+    finally:
+        close_transactions(conn)
+        conn.close()
+        if args.query_log:
+            QUERY_LOG.dump(args.query_log)
+
+
+def run_command(conn, args):
+    """
+    Runs the parsed command on an open connection and returns the exit status.
+    """
+    try:
+        if args.command in ("export", "import"):
+            return run_transfer(conn, args)
+
+        if args.command == "batch":
+            succeeded, failed = run_batch(conn, args.file, args.group_size, args.verbose)
+            return 1 if failed else 0
+
+        if args.command == "responsibilities":
+            result = app.get_sub_team_responsibilities(conn, args.team)
+            if not result:
+                print(f"No sub-team found with ID {args.team}.")
+                return 1
+            print(result[0] if result[0] else "No responsibilities assigned.")
+            return 0
+
+        if args.command == "contacts":
+            entity_type = "project" if args.project else "maintenance procedure"
+            entity_id = args.project or args.procedure
+            if not app.get_contact_entity(conn, entity_type, entity_id):
+                print(f"No {entity_type} found with ID {entity_id}.")
+                return 1
+            for member_id, contact_info in app.iter_contact_info(conn, entity_type, entity_id):
+                print(contact_info if contact_info else f"No contact information found for team member ID {member_id}.")
+            return 0
+
+        if args.command == "search":
+            results = app.search_catalog(conn, " ".join(args.text), args.page, args.page_size)
+            for kind, item, summary in results:
+                print(f"{kind.title()}: {item} - {summary}")
+            if not results:
+                print("No matches found.")
+            return 0
+
+        if args.command == "summaries":
+            return run_summaries(conn, args)
+
+        if args.command.startswith("members-"):
+            return run_memberships(conn, args)
+
+        if args.command == "dashboard":
+            in_use = None if args.in_use is None else args.in_use == "yes"
+            shown = 0
+            for rows in app.iter_project_dashboard(conn, in_use, args.active_from, args.active_to, args.page_size):
+                for row in rows:
+                    print(app.format_dashboard_row(row))
+                shown += len(rows)
+            if not shown:
+                print("No projects match those filters.")
+            return 0
+
+        if args.command in ("projects-ending", "procedures-edited"):
+            quarter_start, quarter_end = app.quarter_dates()
+            start_date, end_date = args.start_date or quarter_start, args.end_date or quarter_end
+            if args.command == "projects-ending":
+                in_use = None if args.in_use is None else args.in_use == "yes"
+                pages, format_row = app.iter_projects_ending(conn, start_date, end_date, in_use, args.page_size), app.format_project
+            else:
+                pages, format_row = app.iter_procedures_edited(conn, start_date, end_date, args.page_size), app.format_procedure
+            shown = 0
+            for rows in pages:
+                for row in rows:
+                    print(format_row(row))
+                shown += len(rows)
+            print(f"{shown} found between {start_date} and {end_date}.")
+            return 0
+
+        record = record_from_arguments(args)
+        with unit_of_work(conn):
+            summary = BATCH_OPERATIONS[args.command](conn, record)
+        print(summary)
+        return 0
+
+    except (ValueError, OSError, sqlite3.Error) as e:
+        print(f"An error occurred: {e}")
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(run_cli(sys.argv[1:]))
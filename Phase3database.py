@@ -0,0 +1,282 @@
+import atexit
+import configparser
+import os
+import signal
+import sqlite3
+import sys
+import threading
+import time
+
+from Phase3instrument import INSTRUMENT, InstrumentedConnection
+from Phase3queries import STATEMENT_CACHE_SIZE
+
+# Config file read by load_connection_profile, overridable with PHASE3_CONFIG
+CONFIG_FILE = os.environ.get("PHASE3_CONFIG", "phase3.ini")
+
+# Connection profile used by all of the Phase3 scripts. Each setting can be overridden
+# in the [connection] section of the config file, and then by a PHASE3_<SETTING>
+# environment variable (e.g. PHASE3_SYNCHRONOUS=FULL).
+DEFAULT_PROFILE = {
+    "database": "project_database.db",
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "mmap_size": "268435456",
+    "cache_size": "-65536",
+    "temp_store": "MEMORY",
+    "foreign_keys": "ON",
+    "busy_timeout": "5000",
+    "in_memory": "OFF",
+    "flush_interval": "5",
+}
+
+# PRAGMAs applied from the profile, in the order they are set
+PROFILE_PRAGMAS = ["journal_mode", "synchronous", "mmap_size", "cache_size", "temp_store", "foreign_keys",
+                   "busy_timeout"]
+
+# SQLite reports these PRAGMAs as numbers; map them back to their names for the report
+PRAGMA_VALUE_NAMES = {
+    "synchronous": {0: "OFF", 1: "NORMAL", 2: "FULL", 3: "EXTRA"},
+    "temp_store": {0: "DEFAULT", 1: "FILE", 2: "MEMORY"},
+    "foreign_keys": {0: "OFF", 1: "ON"},
+}
+
+
+def load_connection_profile(config_file=None):
+    """
+    Builds the connection profile from the defaults, the config file and the environment.
+    """
+    profile = dict(DEFAULT_PROFILE)
+
+    parser = configparser.ConfigParser()
+    if parser.read(config_file or CONFIG_FILE) and parser.has_section("connection"):
+        for setting, value in parser["connection"].items():
+            if setting in profile:
+                profile[setting] = value
+
+    for setting in profile:
+        value = os.environ.get(f"PHASE3_{setting.upper()}")
+        if value is not None:
+            profile[setting] = value
+
+    return profile
+
+
+def apply_connection_profile(conn, profile):
+    """
+    Applies the profile's PRAGMAs to an open connection and returns the settings
+    SQLite actually reports afterwards, which can differ from what was asked for
+    (e.g. an in-memory database cannot use WAL).
+    """
+    cursor = conn.cursor()
+    for pragma in PROFILE_PRAGMAS:
+        cursor.execute(f"PRAGMA {pragma} = {profile[pragma]};")
+
+    settings = {}
+    for pragma in PROFILE_PRAGMAS:
+        cursor.execute(f"PRAGMA {pragma};")
+        rows = cursor.fetchall()
+        # Some PRAGMAs report nothing for an in-memory database (e.g. mmap_size)
+        value = rows[0][0] if rows else "n/a"
+        settings[pragma] = PRAGMA_VALUE_NAMES.get(pragma, {}).get(value, value)
+    cursor.close()
+    return settings
+
+
+# Seconds close() waits for a write-back already under way before giving up on it
+CLOSE_TIMEOUT = float(os.environ.get("PHASE3_CLOSE_TIMEOUT", "30"))
+
+
+class WorkingSet:
+    """
+    An in-memory copy of a database file that is written back to the file on a
+    background thread every `flush_interval` seconds when it has changed, and when
+    its connection is closed or the process exits (including on SIGTERM). At most
+    `flush_interval` seconds of writes are lost if the process is killed outright.
+
+    The file is overwritten with the in-memory copy on every flush, so `disk` holds an
+    exclusive lock on it for as long as the working set is open and other connections
+    cannot use it. Should the file change anyway, flushes stop rather than overwrite
+    the other connection's writes, and the in-memory changes are not written back.
+    """
+
+    def __init__(self, memory, disk, path, flush_interval):
+        self.memory = memory
+        self.disk = disk
+        self.path = path
+        self.flush_interval = flush_interval
+        self.lock = threading.Lock()
+        self.flushed_changes = memory.total_changes
+        self.disk_version = self.data_version()
+        self.conflict = False
+        self.flushes = 0
+        self.flush_seconds = 0.0
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, name="working-set-flush", daemon=True)
+        self.thread.start()
+
+    def data_version(self):
+        return self.disk.execute("PRAGMA data_version").fetchall()[0][0]
+
+    def run(self):
+        while not self.stopped.wait(self.flush_interval):
+            try:
+                self.flush()
+            except sqlite3.Error as e:
+                print(f"Could not write the in-memory database back to {self.path}: {e}", file=sys.stderr)
+
+    def flush(self, timeout=-1):
+        """
+        Copies the in-memory database to the file if it has changed since the last
+        flush and no transaction is open on it. Returns True if it was written, and
+        False if not, including when another flush held the lock for `timeout` seconds.
+        """
+        if not self.lock.acquire(timeout=timeout):
+            return False
+        try:
+            changes = self.memory.total_changes
+            if changes == self.flushed_changes or self.memory.in_transaction or self.conflict:
+                return False
+            if self.data_version() != self.disk_version:
+                self.conflict = True
+                print(f"{self.path} was changed by another connection; the in-memory changes will not be "
+                      "written back to it.", file=sys.stderr)
+                return False
+            started = time.perf_counter()
+            # One step copies the whole database while holding the in-memory connection, so
+            # no statement on it can run part way through the copy. If a transaction opened
+            # since the check above, the step waits for it to end.
+            self.memory.backup(self.disk, pages=-1)
+            self.flush_seconds += time.perf_counter() - started
+            self.flushes += 1
+            self.flushed_changes = changes
+            self.disk_version = self.data_version()
+            return True
+        finally:
+            self.lock.release()
+
+    def close(self):
+        """
+        Stops the background flushes, writes the working set back one last time and
+        releases the file. A transaction still open is rolled back first, as closing
+        the connection would discard it anyway, so a flush waiting on it can finish.
+        """
+        if self.stopped.is_set():
+            return
+        self.stopped.set()
+        if self.memory.in_transaction:
+            self.memory.rollback()
+        self.thread.join(CLOSE_TIMEOUT)
+        try:
+            if not self.flush(CLOSE_TIMEOUT) and self.memory.total_changes != self.flushed_changes:
+                print(f"Changes to the in-memory database were not written back to {self.path}.", file=sys.stderr)
+        finally:
+            self.disk.close()
+            OPEN_WORKING_SETS.discard(self)
+
+
+class WorkingSetConnectionMixin:
+    """
+    Writes a connection's working set back to its file before the connection closes.
+    """
+
+    working_set = None
+
+    def close(self):
+        if self.working_set:
+            self.working_set.close()
+        super().close()
+
+
+class WorkingSetConnection(WorkingSetConnectionMixin, sqlite3.Connection):
+    pass
+
+
+class InstrumentedWorkingSetConnection(WorkingSetConnectionMixin, InstrumentedConnection):
+    pass
+
+
+# Working sets still open, flushed when the process exits
+OPEN_WORKING_SETS = set()
+
+
+def flush_open_working_sets():
+    for working_set in list(OPEN_WORKING_SETS):
+        try:
+            working_set.close()
+        except sqlite3.Error as e:
+            print(f"Could not write the in-memory database back to {working_set.path}: {e}", file=sys.stderr)
+
+
+atexit.register(flush_open_working_sets)
+
+
+def exit_on_sigterm():
+    # SIGTERM normally ends the process without running atexit; exit normally instead
+    if threading.current_thread() is threading.main_thread() and signal.getsignal(signal.SIGTERM) == signal.SIG_DFL:
+        signal.signal(signal.SIGTERM, lambda signal_number, frame: sys.exit(128 + signal_number))
+
+
+def load_working_set(database, profile):
+    """
+    Opens an in-memory database holding a copy of the database file, loaded in one
+    step with the backup API, and starts writing it back every flush_interval seconds.
+    The connection is always usable from any thread, since the flush thread copies
+    from it. Raises sqlite3.OperationalError if another connection is using the file.
+    """
+    disk = sqlite3.connect(database, check_same_thread=False)
+    apply_connection_profile(disk, profile)
+    memory = sqlite3.connect(":memory:", cached_statements=STATEMENT_CACHE_SIZE, check_same_thread=False,
+                             factory=InstrumentedWorkingSetConnection if INSTRUMENT else WorkingSetConnection)
+    try:
+        # In exclusive locking mode the lock taken here is kept after the transaction,
+        # so no other connection can write the file between loading and flushing
+        disk.execute("PRAGMA locking_mode = EXCLUSIVE")
+        disk.execute("BEGIN EXCLUSIVE")
+        disk.commit()
+        disk.backup(memory)
+    except sqlite3.Error:
+        memory.close()
+        disk.close()
+        raise
+    memory.working_set = WorkingSet(memory, disk, database, float(profile["flush_interval"]))
+    OPEN_WORKING_SETS.add(memory.working_set)
+    exit_on_sigterm()
+    return memory
+
+
+# Connect to SQLite database
+def connect_to_database(database=None, profile=None, report=True, check_same_thread=True, in_memory=None):
+    """
+    Opens the project database with the tuned connection profile applied.
+    Reports the connection and the settings in effect unless `report` is False.
+    Pass check_same_thread=False for a connection handed between threads by a pool.
+    Every statement run on the connection is timed unless PHASE3_INSTRUMENT=0.
+
+    With in_memory=True, or the profile's in_memory setting ON, the whole database is
+    loaded into memory and the connection works on that copy, which is written back
+    to the file as described in WorkingSet. Such a connection is always shared with
+    its flush thread, so check_same_thread does not apply to it.
+    """
+    profile = profile or load_connection_profile()
+    database = database or profile["database"]
+    if in_memory is None:
+        in_memory = profile["in_memory"].upper() in ("ON", "1", "TRUE", "YES")
+    try:
+        started = time.perf_counter()
+        if in_memory:
+            conn = load_working_set(database, profile)
+        else:
+            conn = sqlite3.connect(database, cached_statements=STATEMENT_CACHE_SIZE,
+                                   check_same_thread=check_same_thread,
+                                   factory=InstrumentedConnection if INSTRUMENT else sqlite3.Connection)
+        settings = apply_connection_profile(conn, profile)
+        if report:
+            print("Connected to the database successfully.")
+            print("Connection settings: " + ", ".join(f"{pragma}={value}" for pragma, value in settings.items()))
+            if in_memory:
+                print(f"Loaded {database} into memory in {time.perf_counter() - started:.2f}s; changes are written "
+                      f"back every {conn.working_set.flush_interval:g}s and on exit.")
+        return conn
+    except sqlite3.Error as e:
+        print(f"An error occurred while connecting to the database: {e}")
+        return None
@@ -1,102 +1,195 @@
+import argparse
 import sqlite3
-from datetime import datetime, timedelta
+import time
+from datetime import date, timedelta
+from itertools import islice
 import random
 
-# Connect to the SQLite database
-conn = sqlite3.connect('project_database.db')
-cursor = conn.cursor()
+from Phase3database import connect_to_database
 
-# Helper function to generate random dates
-def random_date(start_date, end_date):
-    delta = end_date - start_date
-    random_days = random.randint(0, delta.days)
-    return start_date + timedelta(days=random_days)
-
-# Populate the tables with synthetic data
-try:
-    # Fill TEAM_MEMBER
-    team_members = [
-        (1, "john.doe@example.com", 1234567890, "John Doe"),
-        (2, "jane.smith@example.com", 9876543210, "Jane Smith"),
-        (3, "bob.brown@example.com", 4567891230, "Bob Brown"),
-        (4, "alice.white@example.com", 3216549870, "Alice White")
-    ]
-    cursor.executemany("INSERT INTO TEAM_MEMBER (Member_ID, Email, Phone, Name) VALUES (?, ?, ?, ?)", team_members)
-
-    # Fill SUB_TEAM
-    sub_teams = [
-        (1, "Backend Team", "Handle server-side logic", 1),
-        (2, "Frontend Team", "Handle UI/UX design", 2)
-    ]
-    cursor.executemany("INSERT INTO SUB_TEAM (Team_ID, Description, Responsibilities, Team_Lead) VALUES (?, ?, ?, ?)", sub_teams)
-
-    # Fill PROJECT
-    start_date = datetime(2023, 1, 1)
-    end_date = datetime(2024, 1, 1)
-    projects = [
-        (1, random_date(start_date, end_date), random_date(start_date, end_date), random.choice([True, False]), 1),
-        (2, random_date(start_date, end_date), random_date(start_date, end_date), random.choice([True, False]), 2)
-    ]
-    cursor.executemany("INSERT INTO PROJECT (Project_ID, Start_date, End_date, In_use, Owner) VALUES (?, ?, ?, ?, ?)", projects)
-
-    # Fill MATERIALS
-    materials = [
-        (1, 1, "Material1", "http://example.com/material1", "Type A", "A description of material 1"),
-        (1, 2, "Material2", "http://example.com/material2", "Type B", "A description of material 2")
-    ]
-    cursor.executemany("INSERT INTO MATERIALS (Uses, Needs, Name, Link, Material_type, Description) VALUES (?, ?, ?, ?, ?, ?)", materials)
+# Number of rows handed to each executemany call
+BATCH_SIZE = 10000
 
-    # Fill MAINTENANCE_PROCEDURE
-    maintenance_procedures = [
-        (1, "Procedure for material maintenance", random_date(start_date, end_date), 1),
-        (2, "Another procedure", random_date(start_date, end_date), 2)
-    ]
-    cursor.executemany("INSERT INTO MAINTENANCE_PROCEDURE (Procedure_ID, Description, Last_edited, Maintainer) VALUES (?, ?, ?, ?)", maintenance_procedures)
+MATERIAL_TYPES = ["Type A", "Type B", "Type C", "Type D"]
+DATE_RANGE_START = date(2023, 1, 1)
+DATE_RANGE_DAYS = 365
 
-    # Fill DIMENSIONS
-    dimensions = [
-        (1, "10x20x30 cm"),
-        (2, "50x60x70 cm")
-    ]
-    cursor.executemany("INSERT INTO DIMENSIONS (Material, Dimensions) VALUES (?, ?)", dimensions)
 
-    # Fill OUTSIDE_RESEARCH
-    outside_research = [
-        (1, "Research1", "Research about project 1", "http://example.com/research1", 1),
-        (2, "Research2", "Research about project 2", "http://example.com/research2", 2)
-    ]
-    cursor.executemany("INSERT INTO OUTSIDE_RESEARCH (Research, Name, Description, Link, Reference_ID) VALUES (?, ?, ?, ?, ?)", outside_research)
-
-    # Fill PROJECT_MEMBERS
-    project_members = [
-        (1, 1),
-        (1, 2),
-        (2, 3),
-        (2, 4)
-    ]
-    cursor.executemany("INSERT INTO PROJECT_MEMBERS (Project, Member) VALUES (?, ?)", project_members)
-
-    # Fill PROCEDURE_CONTRIBUTERS
-    procedure_contributors = [
-        (1, 1),
-        (1, 2),
-        (2, 3),
-        (2, 4)
+# Helper function to generate random dates
+def random_date(rng, start_date=DATE_RANGE_START, days=DATE_RANGE_DAYS):
+    return start_date + timedelta(days=rng.randint(0, days))
+
+
+def team_member_rows(rng, members):
+    for member_id in range(1, members + 1):
+        yield (member_id, f"member{member_id}@example.com", rng.randint(1000000000, 9999999999), f"Member {member_id}")
+
+
+def sub_team_rows(rng, sub_teams, members):
+    for team_id in range(1, sub_teams + 1):
+        yield (team_id, f"Sub-Team {team_id}", f"Responsibilities of sub-team {team_id}", rng.randint(1, members))
+
+
+def project_rows(rng, projects, members):
+    for project_id in range(1, projects + 1):
+        start = random_date(rng)
+        end = start + timedelta(days=rng.randint(0, DATE_RANGE_DAYS))
+        yield (project_id, f"Project {project_id}", start.isoformat(), end.isoformat(), rng.randint(0, 1), rng.randint(1, members))
+
+
+def procedure_rows(rng, procedures, members):
+    for procedure_id in range(1, procedures + 1):
+        yield (procedure_id, f"Maintenance procedure {procedure_id}", random_date(rng).isoformat(), rng.randint(1, members))
+
+
+def material_rows(rng, projects, materials_per_project):
+    for project_id in range(1, projects + 1):
+        for number in range(1, materials_per_project + 1):
+            name = f"Material{project_id}-{number}"
+            yield (name, f"http://example.com/{name.lower()}", rng.choice(MATERIAL_TYPES), f"A description of {name}")
+
+
+def dimension_rows(rng, projects, materials_per_project):
+    for project_id in range(1, projects + 1):
+        for number in range(1, materials_per_project + 1):
+            yield (f"Material{project_id}-{number}", f"{rng.randint(1, 100)}x{rng.randint(1, 100)}x{rng.randint(1, 100)} cm")
+
+
+def research_rows(rng, projects, research_per_project):
+    for project_id in range(1, projects + 1):
+        for number in range(1, research_per_project + 1):
+            name = f"Research{project_id}-{number}"
+            yield (name, f"Research about project {project_id}", f"http://example.com/{name.lower()}")
+
+
+def item_link_rows(rng, projects, procedures, items_per_project, prefix, to_procedures):
+    # Each item is linked to the project it was made for, or to one random procedure
+    for project_id in range(1, projects + 1):
+        for number in range(1, items_per_project + 1):
+            name = f"{prefix}{project_id}-{number}"
+            yield (rng.randint(1, procedures), name) if to_procedures else (project_id, name)
+
+
+def membership_rows(rng, entities, members, members_per_entity):
+    # Each entity gets distinct members so the same pair is never linked twice
+    members_per_entity = min(members_per_entity, members)
+    for entity_id in range(1, entities + 1):
+        for member_id in rng.sample(range(1, members + 1), members_per_entity):
+            yield (entity_id, member_id)
+
+
+def insert_rows(conn, statement, rows, batch_size=BATCH_SIZE):
+    """
+    Streams `rows` into the database in executemany batches of `batch_size`
+    inside a single transaction, so only one batch is held in memory at a time.
+    Returns the number of rows inserted.
+    """
+    cursor = conn.cursor()
+    inserted = 0
+    with conn:
+        while True:
+            batch = list(islice(rows, batch_size))
+            if not batch:
+                break
+            cursor.executemany(statement, batch)
+            inserted += len(batch)
+    cursor.close()
+    return inserted
+
+
+def fill_database(conn, members=4, sub_teams=2, projects=2, procedures=2, materials_per_project=1,
+                  research_per_project=1, members_per_project=2, contributors_per_procedure=2,
+                  seed=0, batch_size=BATCH_SIZE):
+    """
+    Fills every table with referentially consistent synthetic data.
+
+    The data is fully determined by the sizes and the seed. Tables are filled parents
+    first so every foreign key points at an existing row. Returns a dict of the
+    number of rows inserted per table.
+    """
+    rng = random.Random(seed)
+    members, procedures = max(members, 1), max(procedures, 1)
+    tables = [
+        ("TEAM_MEMBER", "INSERT INTO TEAM_MEMBER (Member_ID, Email, Phone, Name) VALUES (?, ?, ?, ?)",
+         team_member_rows(rng, members)),
+        ("SUB_TEAM", "INSERT INTO SUB_TEAM (Team_ID, Description, Responsibilities, Team_Lead) VALUES (?, ?, ?, ?)",
+         sub_team_rows(rng, sub_teams, members)),
+        ("PROJECT", "INSERT INTO PROJECT (Project_ID, Name, Start_Date, End_Date, In_Use, Owner) VALUES (?, ?, ?, ?, ?, ?)",
+         project_rows(rng, projects, members)),
+        ("MAINTENANCE_PROCEDURE", "INSERT INTO MAINTENANCE_PROCEDURE (Procedure_ID, Description, Last_Edited, Maintainer) VALUES (?, ?, ?, ?)",
+         procedure_rows(rng, procedures, members)),
+        ("MATERIALS", "INSERT INTO MATERIALS (Name, Link, Material_Type, Description) VALUES (?, ?, ?, ?)",
+         material_rows(rng, projects, materials_per_project)),
+        ("DIMENSIONS", "INSERT INTO DIMENSIONS (Material, Dimensions) VALUES (?, ?)",
+         dimension_rows(rng, projects, materials_per_project)),
+        ("OUTSIDE_RESEARCH", "INSERT INTO OUTSIDE_RESEARCH (Name, Description, Link) VALUES (?, ?, ?)",
+         research_rows(rng, projects, research_per_project)),
+        ("PROJECT_MEMBERS", "INSERT INTO PROJECT_MEMBERS (Project, Member) VALUES (?, ?)",
+         membership_rows(rng, projects, members, members_per_project)),
+        ("PROCEDURE_CONTRIBUTERS", "INSERT INTO PROCEDURE_CONTRIBUTERS (Procedure, Member) VALUES (?, ?)",
+         membership_rows(rng, procedures, members, contributors_per_procedure)),
+        ("PROJECT_MATERIALS", "INSERT INTO PROJECT_MATERIALS (Project, Material) VALUES (?, ?)",
+         item_link_rows(rng, projects, procedures, materials_per_project, "Material", False)),
+        ("PROCEDURE_MATERIALS", "INSERT INTO PROCEDURE_MATERIALS (Procedure, Material) VALUES (?, ?)",
+         item_link_rows(rng, projects, procedures, materials_per_project, "Material", True)),
+        ("PROJECT_RESEARCH", "INSERT INTO PROJECT_RESEARCH (Project, Research) VALUES (?, ?)",
+         item_link_rows(rng, projects, procedures, research_per_project, "Research", False)),
+        ("PROCEDURE_RESEARCH", "INSERT INTO PROCEDURE_RESEARCH (Procedure, Research) VALUES (?, ?)",
+         item_link_rows(rng, projects, procedures, research_per_project, "Research", True)),
     ]
-    cursor.executemany("INSERT INTO PROCEDURE_CONTRIBUTERS (Procedure, Member) VALUES (?, ?)", procedure_contributors)
-
-    # Commit the changes
-    conn.commit()
-    print("Database filled with synthetic data successfully.")
-
-except sqlite3.Error as e:
-    print(f"An error occurred: {e}")
-
-
-finally:
-    cursor.execute("SELECT name FROM sqlite_master WHERE type='table';")
-    tables = cursor.fetchall()
-    print("Tables in the database:", tables)
 
-    # Close the database connection
-    conn.close()
+    counts = {}
+    for table, statement, rows in tables:
+        counts[table] = insert_rows(conn, statement, rows, batch_size)
+    return counts
+
+
+def count(value):
+    # Accepts plain and scientific notation counts such as 1e6
+    return int(float(value))
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description="Fill the project database with synthetic data.")
+    parser.add_argument("--members", type=count, default=4)
+    parser.add_argument("--sub-teams", type=count, default=2)
+    parser.add_argument("--projects", type=count, default=2)
+    parser.add_argument("--procedures", type=count, default=2)
+    parser.add_argument("--materials-per-project", type=count, default=1)
+    parser.add_argument("--research-per-project", type=count, default=1)
+    parser.add_argument("--members-per-project", type=count, default=2)
+    parser.add_argument("--contributors-per-procedure", type=count, default=2)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--batch-size", type=count, default=BATCH_SIZE)
+    parser.add_argument("--database", help="database file to fill (defaults to the connection profile's database)")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_arguments()
+
+    # Connect to the SQLite database
+    conn = connect_to_database(args.database)
+    if not conn:
+        exit(1)
+
+    # Populate the tables with synthetic data
+    try:
+        started = time.perf_counter()
+        counts = fill_database(conn, args.members, args.sub_teams, args.projects, args.procedures,
+                               args.materials_per_project, args.research_per_project,
+                               args.members_per_project, args.contributors_per_procedure,
+                               args.seed, args.batch_size)
+        elapsed = time.perf_counter() - started
+
+        for table, rows in counts.items():
+            print(f"{table}: {rows} rows")
+        total = sum(counts.values())
+        print(f"Database filled with {total} rows of synthetic data in {elapsed:.2f}s ({total / max(elapsed, 1e-9):,.0f} rows/s).")
+
+    except sqlite3.Error as e:
+        print(f"An error occurred: {e}")
+
+    finally:
+        # Close the database connection
+        conn.close()
@@ -0,0 +1,339 @@
+import contextlib
+import datetime
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from bisect import bisect_left
+from functools import lru_cache
+
+# Statements are timed on every connection unless PHASE3_INSTRUMENT=0
+INSTRUMENT = os.environ.get("PHASE3_INSTRUMENT", "1") != "0"
+
+# Statements taking at least this many milliseconds are counted as slow, and written
+# to the slow-query log if PHASE3_SLOW_QUERY_LOG names one (e.g. slow_queries.log)
+SLOW_QUERY_MS = float(os.environ.get("PHASE3_SLOW_QUERY_MS", "100"))
+SLOW_QUERY_LOG = os.environ.get("PHASE3_SLOW_QUERY_LOG", "")
+
+# If set, exit_program writes everything recorded to this JSON file
+QUERY_DUMP = os.environ.get("PHASE3_QUERY_DUMP")
+
+# Upper bounds in milliseconds of the latency histogram buckets; one more bucket
+# holds everything slower than the last bound
+HISTOGRAM_BOUNDS_MS = [0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000]
+
+# Raw statements remembered with their normalized form, to bound memory when many
+# statements are built with literals in them
+MAX_DISTINCT_SQL = 10000
+
+STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+NUMBER_LITERAL = re.compile(r"(?<![\w.])-?\d+(?:\.\d+)?\b")
+PLACEHOLDER_LIST = re.compile(r"\?(?:\s*,\s*\?)+")
+WHITESPACE = re.compile(r"\s+")
+
+operation_state = threading.local()
+
+
+@lru_cache(maxsize=4096)
+def normalize_sql(sql):
+    """
+    Reduces a statement to its shape, so every run of the same statement is counted
+    together: literals become ?, a list of placeholders becomes "?, ..." and runs of
+    whitespace become one space.
+    """
+    sql = STRING_LITERAL.sub("?", sql)
+    sql = NUMBER_LITERAL.sub("?", sql)
+    sql = PLACEHOLDER_LIST.sub("?, ...", sql)
+    return WHITESPACE.sub(" ", sql).strip()
+
+
+@contextlib.contextmanager
+def operation(name):
+    """
+    Attributes the statements run on this thread inside the block to `name`, e.g. the
+    menu option or command being run.
+    """
+    previous = getattr(operation_state, "name", None)
+    operation_state.name = name
+    try:
+        yield
+    finally:
+        operation_state.name = previous
+
+
+def current_operation():
+    return getattr(operation_state, "name", None) or "(none)"
+
+
+def percentile(histogram, fraction):
+    """
+    Estimates a percentile in milliseconds from a histogram, as the upper bound of
+    the bucket it falls in.
+    """
+    target = fraction * sum(histogram)
+    seen = 0
+    for bound, count in zip(HISTOGRAM_BOUNDS_MS + [float("inf")], histogram):
+        seen += count
+        if count and seen >= target:
+            return bound
+    return 0.0
+
+
+class QueryLog:
+    """
+    Calls, total and longest time, rows and a latency histogram for every normalized
+    statement, broken down by the operation that ran it. Statements run through the
+    named query registry are reported under their registry name. Safe to share
+    between threads.
+    """
+
+    def __init__(self, slow_query_ms=SLOW_QUERY_MS, slow_query_log=SLOW_QUERY_LOG):
+        self.slow_query_ms = slow_query_ms
+        self.slow_query_log = slow_query_log
+        self.lock = threading.Lock()
+        self.statements = {}
+        self.by_sql = {}
+        self.operations = {}
+        self.slow_queries = 0
+        # Registry name of each normalized statement, and the raw statements already
+        # named; both hold at most MAX_DISTINCT_SQL entries, like by_sql
+        self.names = {}
+        self.named_sql = set()
+
+    def name_statement(self, sql, name):
+        """
+        Reports the statement `sql` normalizes to under the registry name `name`.
+        Once MAX_DISTINCT_SQL statements are named, further ones keep their SQL.
+        """
+        if sql in self.named_sql:
+            return
+        normalized = normalize_sql(sql)
+        with self.lock:
+            if len(self.names) < MAX_DISTINCT_SQL or normalized in self.names:
+                self.names[normalized] = name
+            if len(self.named_sql) < MAX_DISTINCT_SQL:
+                self.named_sql.add(sql)
+
+    def statement_stats(self, sql):
+        """
+        Returns the stats of the statement `sql` normalizes to, remembering them
+        under the raw SQL too so later calls skip normalizing it.
+        """
+        normalized = normalize_sql(sql)
+        with self.lock:
+            stats = self.statements.get(normalized)
+            if stats is None:
+                stats = self.statements[normalized] = {"calls": 0, "seconds": 0.0, "max_seconds": 0.0, "rows": 0,
+                                                       "histogram": [0] * (len(HISTOGRAM_BOUNDS_MS) + 1),
+                                                       "operations": {}}
+            if len(self.by_sql) < MAX_DISTINCT_SQL:
+                self.by_sql[sql] = (normalized, stats)
+        return normalized, stats
+
+    def record(self, sql, seconds, rows):
+        normalized, stats = self.by_sql.get(sql) or self.statement_stats(sql)
+        name = getattr(operation_state, "name", None) or "(none)"
+        milliseconds = seconds * 1000
+        with self.lock:
+            stats["calls"] += 1
+            stats["seconds"] += seconds
+            if seconds > stats["max_seconds"]:
+                stats["max_seconds"] = seconds
+            stats["rows"] += rows
+            stats["histogram"][bisect_left(HISTOGRAM_BOUNDS_MS, milliseconds)] += 1
+            operations = stats["operations"]
+            operations[name] = operations.get(name, 0) + 1
+
+            totals = self.operations.get(name)
+            if totals is None:
+                totals = self.operations[name] = {"statements": 0, "seconds": 0.0}
+            totals["statements"] += 1
+            totals["seconds"] += seconds
+
+            if milliseconds >= self.slow_query_ms:
+                self.slow_queries += 1
+                self.write_slow_query(sql, normalized, name, milliseconds, rows)
+
+    def write_slow_query(self, sql, normalized, name, milliseconds, rows):
+        if not self.slow_query_log:
+            return
+        entry = {"time": datetime.datetime.now().isoformat(timespec="milliseconds"), "operation": name,
+                 "ms": round(milliseconds, 3), "rows": rows, "sql": normalized, "statement": sql.strip()}
+        try:
+            with open(self.slow_query_log, "a") as log:
+                log.write(json.dumps(entry) + "\n")
+        except OSError:
+            self.slow_query_log = None
+
+    def snapshot(self):
+        """
+        Returns everything recorded as plain data, for the report or a JSON dump.
+        """
+        with self.lock:
+            statements = [{"sql": sql, "name": self.names.get(sql), **stats,
+                           "histogram": list(stats["histogram"]), "operations": dict(stats["operations"])}
+                          for sql, stats in self.statements.items()]
+            operations = {name: dict(totals) for name, totals in self.operations.items()}
+            slow_queries = self.slow_queries
+        for stats in statements:
+            stats["p50_ms"] = percentile(stats["histogram"], 0.5)
+            stats["p95_ms"] = percentile(stats["histogram"], 0.95)
+        statements.sort(key=lambda stats: stats["seconds"], reverse=True)
+        return {"histogram_bounds_ms": HISTOGRAM_BOUNDS_MS, "slow_query_ms": self.slow_query_ms,
+                "slow_queries": slow_queries, "statements": statements, "operations": operations}
+
+    def dump(self, path):
+        with open(path, "w") as output:
+            json.dump(self.snapshot(), output, indent=2)
+
+    def reset(self):
+        with self.lock:
+            self.statements.clear()
+            self.by_sql.clear()
+            self.operations.clear()
+            self.slow_queries = 0
+
+
+# Everything recorded by instrumented connections in this process
+QUERY_LOG = QueryLog()
+
+
+class InstrumentedCursor(sqlite3.Cursor):
+    """
+    A cursor that records each statement it runs in QUERY_LOG. A query's time and
+    rows include fetching its results, so it is recorded once they have all been
+    read, or when the cursor runs something else or is closed.
+    """
+
+    pending = None
+
+    def start(self, sql, started):
+        seconds = time.perf_counter() - started
+        if self.description is None:
+            QUERY_LOG.record(sql, seconds, max(self.rowcount, 0))
+        else:
+            self.pending = [sql, seconds, 0]
+
+    def finish(self):
+        if self.pending:
+            QUERY_LOG.record(*self.pending)
+            self.pending = None
+
+    def fetched(self, started, rows, exhausted):
+        if self.pending:
+            self.pending[1] += time.perf_counter() - started
+            self.pending[2] += rows
+            if exhausted:
+                self.finish()
+
+    def execute(self, sql, parameters=()):
+        self.finish()
+        started = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            self.start(sql, started)
+
+    def executemany(self, sql, seq_of_parameters):
+        self.finish()
+        started = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            self.start(sql, started)
+
+    def executescript(self, script):
+        self.finish()
+        started = time.perf_counter()
+        try:
+            return super().executescript(script)
+        finally:
+            QUERY_LOG.record(script, time.perf_counter() - started, 0)
+
+    def fetchone(self):
+        started = time.perf_counter()
+        row = super().fetchone()
+        self.fetched(started, row is not None, row is None)
+        return row
+
+    def fetchmany(self, size=None):
+        size = self.arraysize if size is None else size
+        started = time.perf_counter()
+        rows = super().fetchmany(size)
+        self.fetched(started, len(rows), len(rows) < size)
+        return rows
+
+    def fetchall(self):
+        started = time.perf_counter()
+        rows = super().fetchall()
+        self.fetched(started, len(rows), True)
+        return rows
+
+    def __next__(self):
+        started = time.perf_counter()
+        try:
+            row = super().__next__()
+        except StopIteration:
+            self.fetched(started, 0, True)
+            raise
+        self.fetched(started, 1, False)
+        return row
+
+    def close(self):
+        self.finish()
+        super().close()
+
+    def __del__(self):
+        self.finish()
+
+
+class InstrumentedConnection(sqlite3.Connection):
+    """
+    A connection whose statements, including commits, are all recorded in QUERY_LOG.
+    Passed as the factory to sqlite3.connect.
+    """
+
+    def cursor(self, factory=InstrumentedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def executescript(self, script):
+        return self.cursor().executescript(script)
+
+    def commit(self):
+        started = time.perf_counter()
+        try:
+            super().commit()
+        finally:
+            QUERY_LOG.record("COMMIT", time.perf_counter() - started, 0)
+
+
+def print_query_report(limit=10):
+    """
+    Prints the statements that took the most total time with their latency
+    percentiles, then the time spent in each operation.
+    """
+    report = QUERY_LOG.snapshot()
+    if not report["statements"]:
+        return
+    print(f"\n{'Statement':<60} {'Calls':>7} {'Total ms':>10} {'p50 ms':>8} {'p95 ms':>8} {'Max ms':>9} {'Rows':>9}")
+    for stats in report["statements"][:limit]:
+        sql = stats["name"] or stats["sql"]
+        sql = sql if len(sql) <= 60 else sql[:57] + "..."
+        print(f"{sql:<60} {stats['calls']:>7} {stats['seconds'] * 1000:>10.2f} {stats['p50_ms']:>8g} "
+              f"{stats['p95_ms']:>8g} {stats['max_seconds'] * 1000:>9.2f} {stats['rows']:>9}")
+
+    print(f"\n{'Operation':<60} {'Statements':>10} {'Total ms':>10}")
+    for name, totals in sorted(report["operations"].items(), key=lambda item: item[1]["seconds"], reverse=True):
+        print(f"{name:<60} {totals['statements']:>10} {totals['seconds'] * 1000:>10.2f}")
+
+    if report["slow_queries"]:
+        print(f"\n{report['slow_queries']} statement(s) took {report['slow_query_ms']:g} ms or more"
+              + (f"; see {QUERY_LOG.slow_query_log}." if QUERY_LOG.slow_query_log else "."))
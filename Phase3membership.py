@@ -0,0 +1,185 @@
+from Phase3catalog import convert_integer
+from Phase3queries import fetch_all, iterate_chunks, run, run_many
+from Phase3transfer import file_format, read_rows
+
+# What members belong to: kind -> (membership table, its owner column, owner table, owner key)
+MEMBERSHIPS = {
+    "project": ("PROJECT_MEMBERS", "Project", "PROJECT", "Project_ID"),
+    "procedure": ("PROCEDURE_CONTRIBUTERS", "Procedure", "MAINTENANCE_PROCEDURE", "Procedure_ID"),
+}
+
+# Rows of an adjacency export written at a time
+EXPORT_CHUNK_SIZE = 10000
+
+
+def membership(kind):
+    """
+    Returns the identifiers filling in the membership statements for `kind`, or
+    raises ValueError.
+    """
+    if kind not in MEMBERSHIPS:
+        raise ValueError(f"Unknown membership '{kind}'; use {' or '.join(MEMBERSHIPS)}.")
+    table, owner, owner_table, owner_key = MEMBERSHIPS[kind]
+    return {"table": table, "owner": owner, "owner_table": owner_table, "owner_key": owner_key}
+
+
+def parse_member_ids(value):
+    """
+    Turns a comma-separated list of member IDs and inclusive ranges, e.g. "3,7,10-20",
+    into a list of integers. Raises ValueError for anything else.
+    """
+    member_ids = []
+    for part in str(value).split(","):
+        part = part.strip()
+        if not part:
+            continue
+        first, separator, last = part.partition("-")
+        if separator and first.strip():
+            first, last = convert_integer(first), convert_integer(last)
+            if last < first:
+                raise ValueError(f"'{part}' is not a range of member IDs")
+            member_ids.extend(range(first, last + 1))
+        else:
+            member_ids.append(convert_integer(part))
+    return member_ids
+
+
+def stage(conn, pairs):
+    """
+    Replaces the staged change with the given (owner ID, member ID) pairs.
+    """
+    run(conn, "create_membership_changes")
+    run(conn, "clear_membership_changes")
+    run_many(conn, "stage_membership", pairs)
+
+
+def unknown_pairs(conn, names, discard=True):
+    """
+    Returns the staged (owner ID, member ID) pairs whose owner or member does not
+    exist, each with the reason, and takes them out of the change unless `discard`
+    is False.
+    """
+    unknown = []
+    for owner_id, member_id, missing_owner, missing_member in fetch_all(conn, "unknown_memberships", **names):
+        missing = f"{names['owner_table']} {owner_id}" if missing_owner else f"TEAM_MEMBER {member_id}"
+        unknown.append((owner_id, member_id, f"{missing} does not exist"))
+    if unknown and discard:
+        run(conn, "discard_unknown_memberships", **names)
+    return unknown
+
+
+def add_memberships(conn, kind, pairs):
+    """
+    Links each (owner ID, member ID) pair that is not linked yet with one
+    INSERT ... SELECT. Pairs naming a project, procedure or member that does not
+    exist are skipped. Returns a dict with the number of links added and the list of
+    skipped pairs with the reason.
+    """
+    names = membership(kind)
+    stage(conn, pairs)
+    unknown = unknown_pairs(conn, names)
+    added = run(conn, "add_memberships", **names).rowcount
+    return {"added": added, "unknown": unknown}
+
+
+def remove_memberships(conn, kind, pairs):
+    """
+    Unlinks every given (owner ID, member ID) pair with one DELETE and returns a dict
+    with the number of links removed.
+    """
+    names = membership(kind)
+    stage(conn, pairs)
+    return {"removed": run(conn, "remove_memberships", **names).rowcount}
+
+
+def move_memberships(conn, kind, source_id, target_id, member_ids=None):
+    """
+    Moves members from one project or procedure to another: every member of the
+    source when `member_ids` is None, otherwise those of `member_ids` on it. Members
+    already on the target are just unlinked from the source. Returns a dict with the
+    number of links moved and the number merged into an existing link.
+    Raises ValueError if the target does not exist.
+    """
+    names = membership(kind)
+    source_id, target_id = convert_integer(source_id), convert_integer(target_id)
+    if not fetch_all(conn, "existing_keys", (f"[{target_id}]",), table=names["owner_table"],
+                     column=names["owner_key"]):
+        raise ValueError(f"No {kind} found with ID {target_id}.")
+    if member_ids is None:
+        stage(conn, [])
+        run(conn, "stage_all_members", (source_id,), **names)
+    else:
+        stage(conn, [(source_id, member_id) for member_id in member_ids])
+    if source_id == target_id:
+        return {"moved": 0, "merged": 0}
+    moved = run(conn, "move_memberships", (target_id,), **names).rowcount
+    merged = run(conn, "remove_memberships", **names).rowcount
+    return {"moved": moved, "merged": merged}
+
+
+def sync_memberships(conn, kind, pairs):
+    """
+    Makes the membership of every project or procedure named in `pairs` exactly the
+    members paired with it, adding and removing links in one pass each. Projects or
+    procedures not named are left as they are. Pairs naming a project, procedure or
+    member that does not exist are skipped. Returns a dict with the number of links added and removed and
+    the list of skipped pairs with the reason.
+    """
+    names = membership(kind)
+    stage(conn, pairs)
+    # Owners are taken from the roster before unknown pairs are dropped from it, so a
+    # roster listing only unknown members still empties that project or procedure
+    unknown = unknown_pairs(conn, names, discard=False)
+    removed = run(conn, "remove_unlisted_memberships", **names).rowcount
+    if unknown:
+        run(conn, "discard_unknown_memberships", **names)
+    added = run(conn, "add_memberships", **names).rowcount
+    return {"added": added, "removed": removed, "unknown": unknown}
+
+
+def read_roster(path, kind):
+    """
+    Reads (owner ID, member ID) pairs from a CSV or JSON-lines file with Project (or
+    Procedure) and Member columns. Returns the pairs and (line number, reason) for
+    every line that could not be read.
+    """
+    columns = [membership(kind)["owner"], "Member"]
+    pairs = []
+    rejected = []
+    for line_number, record, values in read_rows(path, columns):
+        if isinstance(values, str):
+            rejected.append((line_number, values))
+            continue
+        try:
+            if None in values:
+                raise ValueError(f"{' and '.join(columns)} are required")
+            pairs.append(tuple(convert_integer(value) for value in values))
+        except ValueError as e:
+            rejected.append((line_number, str(e)))
+    return pairs, rejected
+
+
+def export_adjacency(conn, kind, path, by="member", chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Writes one line per member with the projects (or procedures) it is on, or with
+    by="owner" one line per project or procedure with its members, and returns the
+    number of lines written. JSON-lines files hold e.g. {"Member": 4, "Projects": [1,9]};
+    CSV files hold the IDs separated by spaces. Each list is built by SQLite from one
+    scan of a covering index.
+    """
+    names = membership(kind)
+    key, value = ("Member", names["owner"]) if by == "member" else (names["owner"], "Member")
+    label = f"{value}s"
+    lines = 0
+    csv_file = file_format(path) == "csv"
+    with open(path, "w", newline="") as output:
+        if csv_file:
+            output.write(f"{key},{label}\n")
+        for chunk in iterate_chunks(conn, "membership_adjacency", chunk_size=chunk_size,
+                                    table=names["table"], key=key, value=value):
+            if csv_file:
+                output.writelines(f"{node},{ids[1:-1].replace(',', ' ')}\n" for node, ids in chunk)
+            else:
+                output.writelines(f'{{"{key}": {node}, "{label}": {ids}}}\n' for node, ids in chunk)
+            lines += len(chunk)
+    return lines
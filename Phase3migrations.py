@@ -0,0 +1,456 @@
+import argparse
+import sqlite3
+import time
+
+from Phase3database import connect_to_database
+from Phase3pool import begin_immediate
+from Phase3catalog import FALSE_VALUES, TRUE_VALUES
+from Phase3Setup import (CHECKED_COLUMNS, MEMBERSHIP_TABLES, create_indexes, create_membership_keys,
+                         create_range_indexes, create_schema, create_search_index, create_summary_tables,
+                         create_value_checks, invalid_value)
+
+# Rows of the source table covered by each backfill transaction. The write lock is
+# only held for one chunk at a time, so other operators keep working during a backfill.
+CHUNK_SIZE = 10000
+
+# Seconds between progress lines while a backfill runs
+PROGRESS_INTERVAL = 1.0
+
+
+def add_column(cursor, table, column, definition):
+    """
+    Adds a column to `table` unless an interrupted run already added it.
+    """
+    cursor.execute(f"PRAGMA table_info({table})")
+    if column not in [row[1] for row in cursor.fetchall()]:
+        cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+
+
+# Migration steps. Schema steps take a cursor and run inside the migration's
+# transaction, so they must leave the schema unchanged when rolled back.
+def add_project_name(cursor):
+    add_column(cursor, "PROJECT", "Name", "TEXT")
+
+
+# Link tables replacing the single-project / single-procedure columns of MATERIALS and
+# OUTSIDE_RESEARCH: (table, owner column, owner table and key, item column, item table)
+LINK_TABLES = [
+    ("PROJECT_MATERIALS", "Project", "PROJECT(Project_ID)", "Material", "MATERIALS(Name)"),
+    ("PROCEDURE_MATERIALS", "Procedure", "MAINTENANCE_PROCEDURE(Procedure_ID)", "Material", "MATERIALS(Name)"),
+    ("PROJECT_RESEARCH", "Project", "PROJECT(Project_ID)", "Research", "OUTSIDE_RESEARCH(Name)"),
+    ("PROCEDURE_RESEARCH", "Procedure", "MAINTENANCE_PROCEDURE(Procedure_ID)", "Research", "OUTSIDE_RESEARCH(Name)"),
+]
+
+# Tables rebuilt without their link columns: (table, new definition, columns kept)
+REBUILT_TABLES = [
+    ("MATERIALS", """
+        Name TEXT PRIMARY KEY NOT NULL,
+        Link TEXT,
+        Material_Type TEXT,
+        Description TEXT
+    """, "Name, Link, Material_Type, Description"),
+    ("OUTSIDE_RESEARCH", """
+        Name TEXT PRIMARY KEY,
+        Description TEXT,
+        Link TEXT
+    """, "Name, Description, Link"),
+]
+
+
+def create_link_tables(cursor):
+    """
+    Creates the many-to-many link tables. The composite primary key serves lookups
+    from the project or procedure; the reverse index serves lookups from the item.
+    """
+    for table, owner, owner_key, item, item_key in LINK_TABLES:
+        cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS {table} (
+            {owner} INTEGER NOT NULL,
+            {item} TEXT NOT NULL,
+            PRIMARY KEY ({owner}, {item}),
+            FOREIGN KEY ({owner}) REFERENCES {owner_key},
+            FOREIGN KEY ({item}) REFERENCES {item_key}
+        );
+        """)
+        cursor.execute(f"CREATE INDEX IF NOT EXISTS idx_{table.lower()}_{item.lower()} ON {table} ({item}, {owner});")
+
+
+def start_table_rebuilds(cursor):
+    """
+    Creates the rebuilt copy of each table, plus triggers that mirror every write to
+    the original into the copy while the copy is being filled in chunks. Rowids are
+    kept so the full-text search index stays valid.
+    """
+    for table, definition, columns in REBUILT_TABLES:
+        new_values = ", ".join(f"new.{column.strip()}" for column in columns.split(","))
+        cursor.execute(f"CREATE TABLE IF NOT EXISTS {table}_REBUILD ({definition});")
+        cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS {table}_REBUILD_insert AFTER INSERT ON {table} BEGIN
+            INSERT OR REPLACE INTO {table}_REBUILD (rowid, {columns}) VALUES (new.rowid, {new_values});
+        END;
+        """)
+        cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS {table}_REBUILD_update AFTER UPDATE ON {table} BEGIN
+            DELETE FROM {table}_REBUILD WHERE rowid = old.rowid;
+            INSERT OR REPLACE INTO {table}_REBUILD (rowid, {columns}) VALUES (new.rowid, {new_values});
+        END;
+        """)
+        cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS {table}_REBUILD_delete AFTER DELETE ON {table} BEGIN
+            DELETE FROM {table}_REBUILD WHERE rowid = old.rowid;
+        END;
+        """)
+
+
+def finish_table_rebuilds(cursor):
+    """
+    Swaps each rebuilt copy in for its original (which drops the original's indexes
+    and triggers along with it) and recreates the search index triggers.
+    """
+    for table, _, _ in REBUILT_TABLES:
+        cursor.execute(f"DROP TABLE {table}")
+        cursor.execute(f"ALTER TABLE {table}_REBUILD RENAME TO {table}")
+    create_search_index(cursor)
+
+
+def copy_chunk(table, columns):
+    # Rows a mirror trigger already wrote are newer than the original's, so they are kept
+    return (table, f"INSERT OR IGNORE INTO {table}_REBUILD (rowid, {columns}) "
+                   f"SELECT rowid, {columns} FROM {table} WHERE rowid > ? AND rowid <= ?")
+
+
+def link_chunk(table, link_table, owner, item, column):
+    return (table, f"INSERT OR IGNORE INTO {link_table} ({owner}, {item}) "
+                   f"SELECT {column}, Name FROM {table} WHERE rowid > ? AND rowid <= ? AND {column} IS NOT NULL")
+
+
+def normalized_value(column, column_type):
+    """
+    Returns SQL turning a stored date or boolean into its ISO-8601 or 0/1 form, e.g.
+    '2024/03/01' or '2024-03-01 09:30:00.123' to '2024-03-01' and 'True' to 1.
+    A value that cannot be read is left as it is and reported once the backfill is
+    done (see report_unconverted_values).
+    """
+    if column_type == "DATE":
+        return f"coalesce(date(replace(trim({column}), '/', '-'), '+0 days'), {column})"
+    true_values = ", ".join(f"'{value}'" for value in TRUE_VALUES)
+    false_values = ", ".join(f"'{value}'" for value in FALSE_VALUES)
+    return (f"CASE WHEN lower(trim({column})) IN ({true_values}) THEN 1 "
+            f"WHEN lower(trim({column})) IN ({false_values}) THEN 0 ELSE {column} END")
+
+
+def normalize_chunk(table):
+    columns = CHECKED_COLUMNS[table]
+    values = {column: normalized_value(column, column_type) for column, column_type in columns.items()}
+    assignments = ", ".join(f"{column} = {value}" for column, value in values.items())
+    changed = " OR ".join(f"{column} IS NOT {value}" for column, value in values.items())
+    return (table, f"UPDATE {table} SET {assignments} WHERE rowid > ? AND rowid <= ? AND ({changed})")
+
+
+def unconverted_values(conn, limit=5):
+    """
+    Returns {table: (number of rows, first few (rowid, {column: value}))} for the rows
+    still holding a date or boolean that normalizing could not convert, e.g.
+    Start_Date='garbage' or In_Use='maybe'.
+    """
+    unconverted = {}
+    for table, columns in CHECKED_COLUMNS.items():
+        checks = {column: invalid_value(column, column_type, row=table) for column, column_type in columns.items()}
+        invalid = " OR ".join(checks.values())
+        count = conn.execute(f"SELECT count(*) FROM {table} WHERE {invalid}").fetchall()[0][0]
+        if not count:
+            continue
+        # Each sample shows only the columns that are invalid, as NULL stands for a valid one
+        shown = ", ".join(f"CASE WHEN {check} THEN {column} END" for column, check in checks.items())
+        samples = [(row[0], {column: value for column, value in zip(columns, row[1:]) if value is not None})
+                   for row in conn.execute(f"SELECT rowid, {shown} FROM {table} WHERE {invalid} ORDER BY rowid LIMIT ?",
+                                           (limit,)).fetchall()]
+        unconverted[table] = (count, samples)
+    return unconverted
+
+
+def report_unconverted_values(conn):
+    """
+    Prints the rows left holding a value that could not be converted. The value
+    checks refuse any update of those columns until the value is corrected.
+    """
+    for table, (count, samples) in unconverted_values(conn).items():
+        print(f"    {count:,} row(s) of {table} hold a value that could not be converted and were left as they are:")
+        for rowid, values in samples:
+            print(f"        row {rowid}: " + ", ".join(f"{column}={value!r}" for column, value in values.items()))
+
+
+def duplicate_memberships(table):
+    """
+    Returns the condition matching every row of a membership table that repeats the
+    (owner, Member) pair of a row with a lower rowid, so deleting them keeps the first.
+    """
+    owner = MEMBERSHIP_TABLES[table][0]
+    return (f"EXISTS (SELECT 1 FROM {table} AS kept WHERE kept.{owner} = {table}.{owner} "
+            f"AND kept.Member = {table}.Member AND kept.rowid < {table}.rowid)")
+
+
+def dedupe_chunk(table):
+    # Each delete fires the summary triggers, so the member counts stay right
+    return (table, f"DELETE FROM {table} WHERE rowid > ? AND rowid <= ? AND {duplicate_memberships(table)}")
+
+
+def remove_duplicate_memberships(cursor):
+    """
+    Deletes duplicates linked since the backfill passed them, before the unique
+    indexes are created.
+    """
+    for table in MEMBERSHIP_TABLES:
+        cursor.execute(f"DELETE FROM {table} WHERE {duplicate_memberships(table)}")
+
+
+# Every migration in the order it is applied: (version, description, schema steps,
+# backfills, finishing steps). The database's PRAGMA user_version is the version of
+# the last migration fully applied.
+#
+# A backfill is (source table, statement). The statement is run once per chunk of the
+# source table's rowids with the chunk's (first, last] bounds as its two parameters,
+# and must be safe to run again over a chunk it already did. Finishing steps run in
+# one transaction after every backfill is done, e.g. to swap in a rebuilt table, with
+# foreign key enforcement off so a table can be dropped and replaced; the foreign keys
+# are checked before that transaction commits.
+MIGRATIONS = [
+    (1, "Create the application tables", [create_schema], [], []),
+    (2, "Index every foreign-key lookup path", [create_indexes], [], []),
+    (3, "Create the full-text search index", [create_search_index], [], []),
+    (4, "Add a Name column to PROJECT", [add_project_name],
+     [("PROJECT", "UPDATE PROJECT SET Name = 'Project ' || Project_ID "
+                  "WHERE rowid > ? AND rowid <= ? AND Name IS NULL")], []),
+    (5, "Link materials and research to projects and procedures through link tables",
+     [create_link_tables, start_table_rebuilds],
+     [link_chunk("MATERIALS", "PROJECT_MATERIALS", "Project", "Material", "Uses"),
+      link_chunk("MATERIALS", "PROCEDURE_MATERIALS", "Procedure", "Material", "Needs"),
+      link_chunk("OUTSIDE_RESEARCH", "PROJECT_RESEARCH", "Project", "Research", "Research"),
+      link_chunk("OUTSIDE_RESEARCH", "PROCEDURE_RESEARCH", "Procedure", "Research", "Reference_ID"),
+      copy_chunk("MATERIALS", REBUILT_TABLES[0][2]),
+      copy_chunk("OUTSIDE_RESEARCH", REBUILT_TABLES[1][2])],
+     [finish_table_rebuilds]),
+    (6, "Keep per-project, per-procedure and per-owner counts in summary tables",
+     [create_summary_tables], [], []),
+    (7, "Store dates as YYYY-MM-DD and booleans as 0/1, and index date ranges",
+     [create_range_indexes, create_value_checks],
+     [normalize_chunk("PROJECT"), normalize_chunk("MAINTENANCE_PROCEDURE")], []),
+    (8, "Link each member to a project or procedure at most once",
+     [], [dedupe_chunk(table) for table in MEMBERSHIP_TABLES], [remove_duplicate_memberships, create_membership_keys]),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+# Reports printed once a migration is applied, of rows it had to leave for an operator to fix
+MIGRATION_REPORTS = {7: report_unconverted_values}
+
+
+def get_version(conn):
+    return conn.execute("PRAGMA user_version").fetchall()[0][0]
+
+
+def create_progress_table(conn):
+    """
+    Creates the table recording how far each backfill has got, so an interrupted
+    migration resumes where it stopped instead of starting over.
+    """
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS MIGRATION_PROGRESS (
+        Version INTEGER NOT NULL,
+        Backfill INTEGER NOT NULL,
+        Last_Rowid INTEGER NOT NULL,
+        PRIMARY KEY (Version, Backfill)
+    );
+    """)
+    conn.commit()
+
+
+def run_in_transaction(conn, steps):
+    """
+    Runs schema steps in one write transaction; any failure rolls them all back.
+    """
+    begin_immediate(conn)
+    cursor = conn.cursor()
+    try:
+        for step in steps:
+            step(cursor)
+    except BaseException:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+    conn.commit()
+
+
+def run_backfill(conn, version, number, table, statement, chunk_size=CHUNK_SIZE, report=True, label=None):
+    """
+    Runs one backfill over `table` a chunk of rowids at a time, committing each chunk
+    together with the progress it made. Returns the number of rows changed.
+    """
+    row = conn.execute("SELECT Last_Rowid FROM MIGRATION_PROGRESS WHERE Version = ? AND Backfill = ?",
+                       (version, number)).fetchall()
+    last_rowid = row[0][0] if row else 0
+    bounds = conn.execute(f"SELECT max(rowid), count(*) FROM {table} WHERE rowid > ?", (last_rowid,)).fetchall()
+    max_rowid, remaining = bounds[0]
+    if max_rowid is None:
+        return 0
+
+    changed = 0
+    done = 0
+    started = last_report = time.perf_counter()
+    while last_rowid < max_rowid:
+        begin_immediate(conn)
+        try:
+            # The chunk ends at the chunk_size-th rowid still to go, so gaps in the rowids never make a chunk empty
+            chunk = conn.execute(f"SELECT max(rowid), count(*) FROM (SELECT rowid FROM {table} WHERE rowid > ? "
+                                 "ORDER BY rowid LIMIT ?)", (last_rowid, chunk_size)).fetchall()
+            chunk_end, chunk_rows = chunk[0]
+            if chunk_end is None:
+                conn.rollback()
+                break
+            changed += max(conn.execute(statement, (last_rowid, chunk_end)).rowcount, 0)
+            conn.execute("INSERT OR REPLACE INTO MIGRATION_PROGRESS (Version, Backfill, Last_Rowid) VALUES (?, ?, ?)",
+                         (version, number, chunk_end))
+        except BaseException:
+            conn.rollback()
+            raise
+        conn.commit()
+        last_rowid = chunk_end
+        done += chunk_rows
+
+        now = time.perf_counter()
+        if report and (now - last_report >= PROGRESS_INTERVAL or last_rowid >= max_rowid):
+            elapsed = now - started
+            print(f"    {label or table}: {done:,}/{remaining:,} rows ({done / max(remaining, 1):.0%}), "
+                  f"{done / max(elapsed, 1e-9):,.0f} rows/s")
+            last_report = now
+    return changed
+
+
+def foreign_key_violations(cursor):
+    """
+    Returns the set of (table, rowid, parent table, foreign key number) for every row
+    referring to a missing parent row.
+    """
+    return set(cursor.execute("PRAGMA foreign_key_check").fetchall())
+
+
+def finish_migration(conn, version, steps):
+    """
+    Runs a migration's finishing steps and records its version in one transaction.
+    Foreign key enforcement is turned off around it, since it cannot be changed inside
+    a transaction, and the foreign keys of the whole database are checked instead
+    before the transaction commits. Only rows the steps left referring to a missing
+    parent fail the migration; returns the set of violations that were already there.
+    """
+    foreign_keys = conn.execute("PRAGMA foreign_keys").fetchall()[0][0]
+    if steps:
+        conn.execute("PRAGMA foreign_keys = OFF")
+    existing = set()
+    try:
+        begin_immediate(conn)
+        cursor = conn.cursor()
+        try:
+            if steps and foreign_keys:
+                existing = foreign_key_violations(cursor)
+            for step in steps:
+                step(cursor)
+            if steps and foreign_keys:
+                introduced = sorted(foreign_key_violations(cursor) - existing, key=repr)
+                if introduced:
+                    table, rowid, parent, _ = introduced[0]
+                    raise sqlite3.IntegrityError(f"Row {rowid} of {table} refers to a missing {parent} row.")
+            cursor.execute("DELETE FROM MIGRATION_PROGRESS WHERE Version = ?", (version,))
+            cursor.execute(f"PRAGMA user_version = {version}")
+        except BaseException:
+            conn.rollback()
+            raise
+        finally:
+            cursor.close()
+        conn.commit()
+    finally:
+        conn.execute(f"PRAGMA foreign_keys = {foreign_keys}")
+    return existing
+
+
+def report_orphans(violations, limit=5):
+    """
+    Prints how many rows already referred to a missing parent row, and the first few.
+    """
+    print(f"    {len(violations):,} row(s) already referred to a missing parent row and were left as they are:")
+    for table, rowid, parent, _ in sorted(violations, key=repr)[:limit]:
+        print(f"        row {rowid} of {table} -> {parent}")
+
+
+def migrate(conn, target=LATEST_VERSION, chunk_size=CHUNK_SIZE, report=True):
+    """
+    Applies every migration newer than the database's user_version, up to `target`.
+
+    Each migration's schema steps run in one transaction, then its backfills run in
+    chunks, then its finishing steps and the new user_version are committed together.
+    A migration interrupted part way is picked up again on the next run. Returns the
+    version the database is at afterwards.
+    """
+    create_progress_table(conn)
+    version = get_version(conn)
+    for migration_version, description, steps, backfills, finish in MIGRATIONS:
+        if migration_version <= version or migration_version > target:
+            continue
+        if report:
+            print(f"Migration {migration_version}: {description}")
+        started = time.perf_counter()
+
+        run_in_transaction(conn, steps)
+        changed = 0
+        for number, (table, statement) in enumerate(backfills):
+            label = f"Backfill {number + 1}/{len(backfills)} over {table}"
+            changed += run_backfill(conn, migration_version, number, table, statement, chunk_size, report, label)
+
+        orphans = finish_migration(conn, migration_version, finish)
+        version = migration_version
+        if report and orphans:
+            report_orphans(orphans)
+        if report and migration_version in MIGRATION_REPORTS:
+            MIGRATION_REPORTS[migration_version](conn)
+        if report:
+            backfilled = f", {changed:,} rows backfilled" if backfills else ""
+            print(f"    done in {time.perf_counter() - started:.2f}s{backfilled}")
+    return version
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description="Bring the project database schema up to date.")
+    parser.add_argument("--database", help="database file (defaults to the connection profile's database)")
+    parser.add_argument("--target", type=int, default=LATEST_VERSION, help="version to migrate up to")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, help="rows per backfill transaction")
+    parser.add_argument("--status", action="store_true", help="only show the current and latest versions")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_arguments()
+    conn = connect_to_database(args.database, report=False)
+    if not conn:
+        exit(1)
+
+    try:
+        version = get_version(conn)
+        if args.status:
+            print(f"Schema version {version}, latest is {LATEST_VERSION}.")
+            for migration_version, description, _, _, _ in MIGRATIONS:
+                print(f"  {'applied' if migration_version <= version else 'pending'}  {migration_version}: {description}")
+            return
+        if version >= args.target:
+            print(f"Schema is up to date (version {version}).")
+            return
+        version = migrate(conn, args.target, args.chunk_size)
+        print(f"Schema migrated to version {version}.")
+    except sqlite3.Error as e:
+        print(f"An error occurred while migrating: {e}")
+        exit(1)
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
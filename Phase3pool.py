@@ -0,0 +1,349 @@
+import asyncio
+import contextlib
+import os
+import queue
+import random
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from Phase3cache import check_data_version, forget_connection, invalidate_all, invalidate_pending
+from Phase3database import connect_to_database, load_connection_profile
+
+# Reader connections kept open by a pool; override with PHASE3_POOL_READERS
+POOL_READERS = int(os.environ.get("PHASE3_POOL_READERS", "4"))
+
+# How many times a locked BEGIN IMMEDIATE is retried after busy_timeout has
+# already run out, and the first backoff delay in seconds (doubled each time)
+BUSY_RETRIES = 5
+BACKOFF_SECONDS = 0.05
+
+# Operations finishing within this many milliseconds of the first one in a group are
+# committed together; 0 commits each operation as soon as it finishes
+COMMIT_WINDOW_MS = float(os.environ.get("PHASE3_COMMIT_WINDOW_MS", "0"))
+
+# A group is committed once it holds this many operations, however young it is
+GROUP_COMMIT_SIZE = int(os.environ.get("PHASE3_GROUP_COMMIT_SIZE", "1000"))
+
+
+def is_busy_error(error):
+    """
+    Returns True for the errors SQLite raises when another connection holds the lock.
+    """
+    message = str(error).lower()
+    return isinstance(error, sqlite3.OperationalError) and ("locked" in message or "busy" in message)
+
+
+def retry_on_busy(function, *args, retries=BUSY_RETRIES, backoff=BACKOFF_SECONDS):
+    """
+    Calls `function(*args)`, retrying with jittered exponential backoff while the
+    database is locked. Re-raises the last busy error once the retries run out.
+    """
+    for attempt in range(retries + 1):
+        try:
+            return function(*args)
+        except sqlite3.OperationalError as e:
+            if attempt == retries or not is_busy_error(e):
+                raise
+            time.sleep(backoff * 2 ** attempt * random.uniform(0.5, 1.5))
+
+
+def begin_immediate(conn):
+    """
+    Starts a write transaction that takes the write lock up front, so the
+    transaction never has to upgrade a read lock part way through (which fails
+    straight away instead of waiting out busy_timeout).
+    """
+    retry_on_busy(conn.execute, "BEGIN IMMEDIATE")
+
+
+def syncs_per_commit(conn):
+    """
+    Estimates how many times SQLite waits for the disk (fsync) on each commit with the
+    connection's journal_mode and synchronous settings: in WAL mode once with FULL or
+    EXTRA and never with NORMAL (the WAL is only synced at checkpoints); with a
+    rollback journal twice (the journal, then the database) unless synchronous is OFF.
+    """
+    journal_mode = conn.execute("PRAGMA journal_mode").fetchall()[0][0].lower()
+    synchronous = conn.execute("PRAGMA synchronous").fetchall()[0][0]
+    if journal_mode == "wal":
+        return 1 if synchronous >= 2 else 0
+    if journal_mode in ("memory", "off"):
+        return 1 if synchronous else 0
+    return 2 if synchronous else 0
+
+
+class TransactionManager:
+    """
+    Runs every write operation on one connection as a unit of work, e.g.
+
+        with unit_of_work(conn):
+            create_project(conn, ...)
+
+    Each unit runs inside a savepoint, so an operation that raises is rolled back as a
+    whole while the operations grouped with it are kept. Units are grouped into one
+    transaction and commit: a group is committed once it holds `group_size` units or
+    `commit_window_ms` has passed since it began. A durable unit (the default) only
+    returns once its group is committed, so a crash never loses an operation that
+    has returned; units from other threads that finish meanwhile share the commit.
+    A unit with durable=False returns at once and is committed with a later group or
+    by flush().
+    """
+
+    def __init__(self, conn, commit_window_ms=COMMIT_WINDOW_MS, group_size=GROUP_COMMIT_SIZE):
+        self.conn = conn
+        self.commit_window = commit_window_ms / 1000
+        self.group_size = max(group_size, 1)
+        self.condition = threading.Condition(threading.RLock())
+        self.depth = 0
+        self.group_open = False
+        self.group_started = 0.0
+        self.group_units = 0
+        self.groups_done = 0
+        self.failed_group = None
+        self.syncs_per_commit = syncs_per_commit(conn)
+        self.started = time.perf_counter()
+        self.units = 0
+        self.rolled_back = 0
+        self.commits = 0
+        self.commit_seconds = 0.0
+
+    @contextlib.contextmanager
+    def unit(self, durable=True):
+        with self.condition:
+            outermost = self.depth == 0
+            if outermost and not self.group_open:
+                begin_immediate(self.conn)
+                self.group_open = True
+                self.group_started = time.perf_counter()
+            self.depth += 1
+            self.conn.execute("SAVEPOINT unit_of_work")
+            try:
+                yield self.conn
+            except BaseException:
+                self.depth -= 1
+                self.conn.execute("ROLLBACK TO unit_of_work")
+                self.conn.execute("RELEASE unit_of_work")
+                invalidate_all()
+                if outermost:
+                    self.rolled_back += 1
+                    if not self.group_units:
+                        self.conn.rollback()
+                        self.group_open = False
+                        invalidate_pending(self.conn)
+                raise
+            self.depth -= 1
+            self.conn.execute("RELEASE unit_of_work")
+            if not outermost:
+                return
+
+            self.units += 1
+            self.group_units += 1
+            group = self.groups_done + 1
+            if self.group_units >= self.group_size or self.window_passed():
+                self.commit_group()
+            elif durable:
+                while self.groups_done < group:
+                    remaining = self.group_started + self.commit_window - time.perf_counter()
+                    if remaining <= 0:
+                        self.commit_group()
+                        break
+                    self.condition.wait(remaining)
+                if self.failed_group == group:
+                    raise sqlite3.OperationalError("The transaction this operation was grouped into failed to commit.")
+
+    def window_passed(self):
+        return time.perf_counter() - self.group_started >= self.commit_window
+
+    def commit_group(self):
+        """
+        Commits the open group and wakes every unit waiting for it. If the commit
+        fails the whole group is rolled back and the error raised.
+        """
+        started = time.perf_counter()
+        try:
+            retry_on_busy(self.conn.commit)
+        except sqlite3.Error:
+            self.conn.rollback()
+            self.failed_group = self.groups_done + 1
+            raise
+        else:
+            self.commits += 1
+            self.commit_seconds += time.perf_counter() - started
+        finally:
+            # Committed or rolled back, the group's writes are now what readers see
+            invalidate_pending(self.conn)
+            self.groups_done += 1
+            self.group_open = False
+            self.group_units = 0
+            self.condition.notify_all()
+
+    def flush(self):
+        """
+        Commits the open group now, if there is one and no unit is running.
+        """
+        with self.condition:
+            if self.group_open and not self.depth:
+                self.commit_group()
+
+    def stats(self):
+        elapsed = max(time.perf_counter() - self.started, 1e-9)
+        return {"operations": self.units, "rolled_back": self.rolled_back, "commits": self.commits,
+                "commits_per_sec": self.commits / elapsed,
+                "operations_per_commit": self.units / self.commits if self.commits else 0.0,
+                "commit_ms": self.commit_seconds * 1000 / self.commits if self.commits else 0.0,
+                "fsyncs_per_operation": self.commits * self.syncs_per_commit / self.units if self.units else 0.0}
+
+
+# The transaction manager of each connection that has run a unit of work
+TRANSACTION_MANAGERS = {}
+TRANSACTION_MANAGERS_LOCK = threading.Lock()
+
+
+def transaction_manager(conn, **settings):
+    """
+    Returns the connection's transaction manager, creating it with `settings` (see
+    TransactionManager) the first time.
+    """
+    with TRANSACTION_MANAGERS_LOCK:
+        manager = TRANSACTION_MANAGERS.get(conn)
+        if manager is None:
+            manager = TRANSACTION_MANAGERS[conn] = TransactionManager(conn, **settings)
+        return manager
+
+
+def unit_of_work(conn, durable=True):
+    return transaction_manager(conn).unit(durable)
+
+
+def close_transactions(conn):
+    """
+    Commits anything the connection's manager still holds and forgets the manager and
+    the connection's cache state, before the connection is closed. Returns the
+    manager's final stats, or None if the connection never ran a unit of work.
+    """
+    with TRANSACTION_MANAGERS_LOCK:
+        manager = TRANSACTION_MANAGERS.pop(conn, None)
+    try:
+        if manager is None:
+            return None
+        manager.flush()
+        return manager.stats()
+    finally:
+        forget_connection(conn)
+
+
+def print_transaction_stats(stats):
+    if not stats or not stats["operations"]:
+        return
+    print(f"\nWrite operations: {stats['operations']} committed, {stats['rolled_back']} rolled back; "
+          f"{stats['commits']} commits ({stats['commits_per_sec']:,.1f}/s, "
+          f"{stats['operations_per_commit']:.1f} operations and {stats['commit_ms']:.2f} ms each), "
+          f"~{stats['fsyncs_per_operation']:.2f} fsyncs per operation")
+
+
+class ConnectionPool:
+    """
+    One writer connection and up to `readers` reader connections to the same
+    database file, for use from many threads.
+
+    In WAL mode readers never block the writer or each other. Writes are serialised
+    on the writer connection inside this process, and against other processes by
+    BEGIN IMMEDIATE with busy_timeout plus retry and backoff. Writes from several
+    threads that finish within `commit_window_ms` of each other share one commit.
+    """
+
+    def __init__(self, database=None, readers=POOL_READERS, profile=None, commit_window_ms=COMMIT_WINDOW_MS):
+        self.profile = profile or load_connection_profile()
+        self.database = database or self.profile["database"]
+        self.writer = self.connect()
+        self.transactions = transaction_manager(self.writer, commit_window_ms=commit_window_ms)
+        self.readers = queue.LifoQueue()
+        self.reader_slots = threading.Semaphore(readers)
+        self.all_connections = [self.writer]
+
+    def connect(self):
+        conn = connect_to_database(self.database, self.profile, report=False, check_same_thread=False,
+                                   in_memory=False)
+        if not conn:
+            raise sqlite3.OperationalError(f"Could not open {self.database}")
+        return conn
+
+    @contextlib.contextmanager
+    def read(self):
+        """
+        Lends out a reader connection, opening one if none is idle. Blocks while
+        every reader is in use.
+        """
+        with self.reader_slots:
+            try:
+                conn = self.readers.get_nowait()
+            except queue.Empty:
+                conn = self.connect()
+                conn.execute("PRAGMA query_only = ON")
+                self.all_connections.append(conn)
+            # Drop cached rows if the writer or another process has committed since
+            check_data_version(conn)
+            try:
+                yield conn
+            finally:
+                if conn.in_transaction:
+                    conn.rollback()
+                self.readers.put(conn)
+
+    @contextlib.contextmanager
+    def write(self, durable=True):
+        """
+        Lends out the writer connection inside a unit of work of its transaction
+        manager: committed when the block ends (together with other threads' writes
+        finishing within the commit window), or rolled back if it raises.
+        """
+        with self.transactions.unit(durable) as conn:
+            yield conn
+
+    def close(self):
+        """
+        Commits any writes still waiting for their group, closes every connection and
+        returns the writer's transaction stats.
+        """
+        with self.transactions.condition:
+            stats = close_transactions(self.writer)
+            for conn in self.all_connections:
+                forget_connection(conn)
+                conn.close()
+            self.all_connections = []
+        return stats
+
+
+class AsyncDatabase:
+    """
+    An asyncio facade over a connection pool. Each call runs `function(conn, *args)`
+    on a worker thread with a pooled connection, so the event loop is never blocked
+    by SQLite, e.g.
+
+        project = await database.read(get_project, 7)
+        await database.write(add_row, "TEAM_MEMBER", {"Email": "a@example.com", "Name": "A"})
+    """
+
+    def __init__(self, pool, workers=None):
+        self.pool = pool
+        self.executor = ThreadPoolExecutor(max_workers=workers or POOL_READERS + 1)
+
+    def run_read(self, function, args):
+        with self.pool.read() as conn:
+            return function(conn, *args)
+
+    def run_write(self, function, args):
+        with self.pool.write() as conn:
+            return function(conn, *args)
+
+    async def read(self, function, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.executor, self.run_read, function, args)
+
+    async def write(self, function, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.executor, self.run_write, function, args)
+
+    def close(self):
+        self.executor.shutdown()
+        self.pool.close()
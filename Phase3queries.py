@@ -0,0 +1,304 @@
+from Phase3instrument import QUERY_LOG
+
+# The tables of the project database, in the order their rows can be inserted
+TABLES = [
+    "TEAM_MEMBER", "SUB_TEAM", "PROJECT", "MAINTENANCE_PROCEDURE", "MATERIALS",
+    "DIMENSIONS", "OUTSIDE_RESEARCH", "PROJECT_MEMBERS", "PROCEDURE_CONTRIBUTERS",
+    "PROJECT_MATERIALS", "PROCEDURE_MATERIALS", "PROJECT_RESEARCH", "PROCEDURE_RESEARCH",
+]
+
+# Every statement the application runs, by name. Each lists its columns explicitly.
+# Statements containing {braces} are templates whose table/column identifiers are
+# filled in when they are run; all values are always passed as parameters.
+QUERIES = {
+    # Team members, projects, procedures and sub-teams
+    "team_member": "SELECT Member_ID, Email, Phone, Name FROM TEAM_MEMBER WHERE Member_ID = ?",
+    "project": "SELECT Project_ID, Name, Start_Date, End_Date, In_Use, Owner FROM PROJECT WHERE Project_ID = ?",
+    "maintenance_procedure": "SELECT Procedure_ID, Description, Last_Edited, Maintainer FROM MAINTENANCE_PROCEDURE WHERE Procedure_ID = ?",
+    "sub_teams": "SELECT Team_ID, Description FROM SUB_TEAM",
+    "sub_team_responsibilities": "SELECT Responsibilities FROM SUB_TEAM WHERE Team_ID = ?",
+
+    # Creating projects and procedures
+    "insert_project": "INSERT INTO PROJECT (Name, Start_Date, End_Date, In_Use, Owner) VALUES (?, ?, ?, ?, ?)",
+    "insert_project_member": "INSERT OR IGNORE INTO PROJECT_MEMBERS (Project, Member) VALUES (?, ?)",
+    "insert_procedure": "INSERT INTO MAINTENANCE_PROCEDURE (Description, Last_Edited, Maintainer) VALUES (?, ?, ?)",
+
+    # Date ranges, a page at a time in index order after the last row of the previous
+    # page, starting from (first date, lowest ID). Dates are stored as YYYY-MM-DD so the
+    # range is an index range, and the row-value bound is where each page's seek starts.
+    # Projects are read one In_Use value at a time; with In_Use IN (...) SQLite cannot
+    # seek past the previous page and rescans the range from its start on every page.
+    "projects_ending_between": """
+        SELECT Project_ID, Name, Start_Date, End_Date, In_Use, Owner FROM PROJECT
+        WHERE In_Use = ? AND End_Date <= ? AND (End_Date, Project_ID) > (?, ?)
+        ORDER BY End_Date, Project_ID
+        LIMIT ?
+    """,
+    "procedures_edited_between": """
+        SELECT Procedure_ID, Description, Last_Edited, Maintainer FROM MAINTENANCE_PROCEDURE
+        WHERE Last_Edited <= ? AND (Last_Edited, Procedure_ID) > (?, ?)
+        ORDER BY Last_Edited, Procedure_ID
+        LIMIT ?
+    """,
+
+    # Materials and outside research. Name lists are passed as one JSON array so a
+    # lookup of any number of names is always the same cached statement. Inserting an
+    # item that already exists leaves it as it is, and linking is an append to a link
+    # table that ignores links already made.
+    "existing_material_names": "SELECT Name FROM MATERIALS WHERE Name IN (SELECT value FROM json_each(?))",
+    "existing_research_names": "SELECT Name FROM OUTSIDE_RESEARCH WHERE Name IN (SELECT value FROM json_each(?))",
+    "insert_material": """
+        INSERT INTO MATERIALS (Name, Material_Type, Description, Link)
+        VALUES (?, ?, ?, ?)
+        ON CONFLICT (Name) DO NOTHING
+    """,
+    "insert_research": """
+        INSERT INTO OUTSIDE_RESEARCH (Name, Description, Link)
+        VALUES (?, ?, ?)
+        ON CONFLICT (Name) DO NOTHING
+    """,
+    "insert_material_name": "INSERT INTO MATERIALS (Name) VALUES (?) ON CONFLICT (Name) DO NOTHING",
+    "insert_research_name": "INSERT INTO OUTSIDE_RESEARCH (Name) VALUES (?) ON CONFLICT (Name) DO NOTHING",
+    "link_project_material": "INSERT OR IGNORE INTO PROJECT_MATERIALS (Project, Material) VALUES (?, ?)",
+    "link_project_research": "INSERT OR IGNORE INTO PROJECT_RESEARCH (Project, Research) VALUES (?, ?)",
+    "link_procedure_material": "INSERT OR IGNORE INTO PROCEDURE_MATERIALS (Procedure, Material) VALUES (?, ?)",
+    "link_procedure_research": "INSERT OR IGNORE INTO PROCEDURE_RESEARCH (Procedure, Research) VALUES (?, ?)",
+    "material_projects": "SELECT Project FROM PROJECT_MATERIALS WHERE Material = ? ORDER BY Project",
+    "material_procedures": "SELECT Procedure FROM PROCEDURE_MATERIALS WHERE Material = ? ORDER BY Procedure",
+    "research_projects": "SELECT Project FROM PROJECT_RESEARCH WHERE Research = ? ORDER BY Project",
+    "research_procedures": "SELECT Procedure FROM PROCEDURE_RESEARCH WHERE Research = ? ORDER BY Procedure",
+
+    # Contact directories
+    "project_contacts": """
+        SELECT m.Member, t.Member_ID, t.Email, t.Phone, t.Name
+        FROM PROJECT_MEMBERS AS m
+        LEFT JOIN TEAM_MEMBER AS t ON t.Member_ID = m.Member
+        WHERE m.Project = ?
+    """,
+    "procedure_contacts": """
+        SELECT m.Member, t.Member_ID, t.Email, t.Phone, t.Name
+        FROM PROCEDURE_CONTRIBUTERS AS m
+        LEFT JOIN TEAM_MEMBER AS t ON t.Member_ID = m.Member
+        WHERE m.Procedure = ?
+    """,
+
+    # Bulk membership changes. The (owner, member) pairs of a change are staged in a
+    # temporary table and each step is one set-based statement joining it with the
+    # membership table {table}, whose {owner} column names the project or procedure.
+    "create_membership_changes": """
+        CREATE TEMP TABLE IF NOT EXISTS membership_changes (
+            Owner INTEGER NOT NULL,
+            Member INTEGER NOT NULL,
+            PRIMARY KEY (Owner, Member)
+        ) WITHOUT ROWID
+    """,
+    "clear_membership_changes": "DELETE FROM temp.membership_changes",
+    "stage_membership": "INSERT OR IGNORE INTO temp.membership_changes (Owner, Member) VALUES (?, ?)",
+    "stage_all_members": """
+        INSERT OR IGNORE INTO temp.membership_changes (Owner, Member)
+        SELECT {owner}, Member FROM {table} WHERE {owner} = ?
+    """,
+    "unknown_memberships": """
+        SELECT membership_changes.Owner, membership_changes.Member, o.{owner_key} IS NULL, t.Member_ID IS NULL
+        FROM temp.membership_changes
+        LEFT JOIN {owner_table} AS o ON o.{owner_key} = membership_changes.Owner
+        LEFT JOIN TEAM_MEMBER AS t ON t.Member_ID = membership_changes.Member
+        WHERE o.{owner_key} IS NULL OR t.Member_ID IS NULL
+    """,
+    "discard_unknown_memberships": """
+        DELETE FROM temp.membership_changes
+        WHERE Owner NOT IN (SELECT {owner_key} FROM {owner_table})
+           OR Member NOT IN (SELECT Member_ID FROM TEAM_MEMBER)
+    """,
+    "add_memberships": """
+        INSERT OR IGNORE INTO {table} ({owner}, Member)
+        SELECT Owner, Member FROM temp.membership_changes
+    """,
+    "remove_memberships": """
+        DELETE FROM {table} WHERE ({owner}, Member) IN (SELECT Owner, Member FROM temp.membership_changes)
+    """,
+    "move_memberships": """
+        UPDATE OR IGNORE {table} SET {owner} = ?
+        WHERE ({owner}, Member) IN (SELECT Owner, Member FROM temp.membership_changes)
+    """,
+    "remove_unlisted_memberships": """
+        DELETE FROM {table}
+        WHERE {owner} IN (SELECT Owner FROM temp.membership_changes)
+          AND ({owner}, Member) NOT IN (SELECT Owner, Member FROM temp.membership_changes)
+    """,
+    # One row per {key} value with the {value}s linked to it as a JSON array, in the
+    # order of the covering ({key}, {value}) index the scan follows
+    "membership_adjacency": "SELECT {key}, json_group_array({value}) FROM {table} GROUP BY {key} ORDER BY {key}",
+
+    # Project dashboard: one page of projects after a Project_ID with their team size and
+    # the materials, research and maintenance procedures linked to them. The first three
+    # are read from the summary tables; procedures are counted from the covering indexes
+    # on the link tables. {filters} adds conditions on PROJECT.
+    "project_dashboard": """
+        SELECT p.Project_ID, p.Name, p.Start_Date, p.End_Date, p.In_Use, p.Owner,
+               coalesce((SELECT Members FROM PROJECT_MEMBER_COUNTS WHERE Project = p.Project_ID), 0) AS Members,
+               coalesce((SELECT Materials FROM PROJECT_MATERIAL_COUNTS WHERE Project = p.Project_ID), 0) AS Materials,
+               coalesce((SELECT Research FROM PROJECT_RESEARCH_COUNTS WHERE Project = p.Project_ID), 0) AS Research,
+               (SELECT count(*) FROM (
+                    SELECT pm.Procedure FROM PROJECT_MATERIALS AS m
+                    JOIN PROCEDURE_MATERIALS AS pm ON pm.Material = m.Material
+                    WHERE m.Project = p.Project_ID
+                    UNION
+                    SELECT pr.Procedure FROM PROJECT_RESEARCH AS r
+                    JOIN PROCEDURE_RESEARCH AS pr ON pr.Research = r.Research
+                    WHERE r.Project = p.Project_ID)) AS Procedures
+        FROM PROJECT AS p
+        WHERE p.Project_ID > ?{filters}
+        ORDER BY p.Project_ID
+        LIMIT ?
+    """,
+
+    # Full-text search over materials, outside research and maintenance procedures,
+    # best bm25 match first. Takes the FTS5 query once per table, then LIMIT and OFFSET.
+    "search_catalog": """
+        SELECT 'material' AS Kind, m.Name AS Item,
+               snippet(MATERIALS_SEARCH, -1, '[', ']', '...', 12) AS Summary,
+               bm25(MATERIALS_SEARCH) AS Rank
+        FROM MATERIALS_SEARCH
+        JOIN MATERIALS AS m ON m.rowid = MATERIALS_SEARCH.rowid
+        WHERE MATERIALS_SEARCH MATCH ?
+        UNION ALL
+        SELECT 'outside research', r.Name,
+               snippet(OUTSIDE_RESEARCH_SEARCH, -1, '[', ']', '...', 12),
+               bm25(OUTSIDE_RESEARCH_SEARCH)
+        FROM OUTSIDE_RESEARCH_SEARCH
+        JOIN OUTSIDE_RESEARCH AS r ON r.rowid = OUTSIDE_RESEARCH_SEARCH.rowid
+        WHERE OUTSIDE_RESEARCH_SEARCH MATCH ?
+        UNION ALL
+        SELECT 'maintenance procedure', MAINTENANCE_PROCEDURE_SEARCH.rowid,
+               snippet(MAINTENANCE_PROCEDURE_SEARCH, -1, '[', ']', '...', 12),
+               bm25(MAINTENANCE_PROCEDURE_SEARCH)
+        FROM MAINTENANCE_PROCEDURE_SEARCH
+        WHERE MAINTENANCE_PROCEDURE_SEARCH MATCH ?
+        ORDER BY Rank
+        LIMIT ? OFFSET ?
+    """,
+
+    # Generic table access used by add_item, remove_item and the table viewer
+    "table_info": "PRAGMA table_info({table})",
+    "insert_row": "INSERT INTO {table} ({columns}) VALUES ({placeholders})",
+    "delete_where": "DELETE FROM {table} WHERE {condition}",
+    "count_where": "SELECT count(*) FROM {table} WHERE {condition}",
+    "index_list": "PRAGMA index_list({table})",
+    "index_info": "PRAGMA index_info({index})",
+
+    # Schema catalog
+    "table_names": "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%'",
+    "schema_version": """
+        SELECT (SELECT file FROM pragma_database_list WHERE name = 'main'),
+               (SELECT schema_version FROM pragma_schema_version)
+    """,
+    "first_page": "SELECT rowid, {columns} FROM {table}{where} ORDER BY rowid LIMIT ?",
+    "next_page": "SELECT rowid, {columns} FROM {table} WHERE {where}rowid > ? ORDER BY rowid LIMIT ?",
+
+    # Bulk import and export
+    "foreign_key_list": "PRAGMA foreign_key_list({table})",
+    "export_rows": "SELECT {columns} FROM {table} ORDER BY rowid",
+    "existing_keys": "SELECT {column} FROM {table} WHERE {column} IN (SELECT value FROM json_each(?))",
+    "count_imported": "SELECT count(*) FROM temp.imported_rowids",
+}
+
+# Room in each connection's statement cache for every static statement plus each
+# template instantiated once per table, so the registry never evicts itself
+STATEMENT_CACHE_SIZE = sum(len(TABLES) if "{" in sql else 1 for sql in QUERIES.values()) + 32
+
+
+def statement(name, **identifiers):
+    """
+    Returns the SQL of a named statement, filling in a template's identifiers.
+    """
+    sql = QUERIES[name]
+    return sql.format(**identifiers) if identifiers else sql
+
+
+def named_statement(name, identifiers):
+    # Statements are timed by the instrumented connection, which reports them by name
+    sql = statement(name, **identifiers)
+    QUERY_LOG.name_statement(sql, name)
+    return sql
+
+
+def run(conn, name, params=(), **identifiers):
+    """
+    Runs a named write statement and returns its cursor, for lastrowid and rowcount.
+    """
+    return conn.execute(named_statement(name, identifiers), params)
+
+
+def run_many(conn, name, seq_of_params, **identifiers):
+    """
+    Runs a named write statement once per parameter tuple through executemany and
+    returns the number of rows changed.
+    """
+    cursor = conn.executemany(named_statement(name, identifiers), seq_of_params)
+    rows = max(cursor.rowcount, 0)
+    cursor.close()
+    return rows
+
+
+def fetch_one(conn, name, params=(), **identifiers):
+    """
+    Runs a named query and returns its first row, or None.
+    """
+    cursor = conn.execute(named_statement(name, identifiers), params)
+    row = cursor.fetchone()
+    cursor.close()
+    return row
+
+
+def fetch_all(conn, name, params=(), **identifiers):
+    """
+    Runs a named query and returns all of its rows.
+    """
+    cursor = conn.execute(named_statement(name, identifiers), params)
+    rows = cursor.fetchall()
+    cursor.close()
+    return rows
+
+
+def fetch_all_with_names(conn, name, params=(), **identifiers):
+    """
+    Runs a named query and returns its column names and all of its rows.
+    """
+    cursor = conn.execute(named_statement(name, identifiers), params)
+    rows = cursor.fetchall()
+    column_names = [description[0] for description in cursor.description]
+    cursor.close()
+    return column_names, rows
+
+
+def iterate_chunks(conn, name, params=(), chunk_size=1000, **identifiers):
+    """
+    Runs a named query and yields its rows in lists of up to `chunk_size`, so a
+    large result is streamed with constant memory.
+    """
+    cursor = conn.execute(named_statement(name, identifiers), params)
+    try:
+        while True:
+            chunk = cursor.fetchmany(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+    finally:
+        cursor.close()
+
+
+def iterate(conn, name, params=(), **identifiers):
+    """
+    Runs a named query and yields its rows as they are read. The time spent
+    reading rows is included in the statement's total.
+    """
+    cursor = conn.execute(named_statement(name, identifiers), params)
+    try:
+        while True:
+            row = cursor.fetchone()
+            if row is None:
+                break
+            yield row
+    finally:
+        cursor.close()
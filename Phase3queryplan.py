@@ -0,0 +1,147 @@
+import sqlite3
+import sys
+
+from Phase3application import DASHBOARD_FILTERS, cascade_plan
+from Phase3catalog import schema_catalog
+from Phase3membership import MEMBERSHIPS, membership
+from Phase3queries import QUERIES, TABLES, statement
+from Phase3migrations import migrate
+
+# Paged listings of the materials and research linked to one project, which sort
+# just that project's links
+LINKED_MATERIALS_PAGE = statement("next_page", table="MATERIALS", columns="Name, Material_Type, Description, Link",
+                                  where="(Name IN (SELECT Material FROM PROJECT_MATERIALS WHERE Project = ?)) AND ")
+LINKED_RESEARCH_PAGE = statement("next_page", table="OUTSIDE_RESEARCH", columns="Name, Description, Link",
+                                 where="(Name IN (SELECT Research FROM PROJECT_RESEARCH WHERE Project = ?)) AND ")
+
+# Foreign-key paths the application does not query itself yet (reverse lookups)
+# and the instances of registry templates that template_lookups does not build,
+# paired with sample parameters for EXPLAIN.
+EXTRA_QUERIES = [
+    ("SELECT Material FROM PROJECT_MATERIALS WHERE Project = ?", (1,)),
+    ("SELECT Material FROM PROCEDURE_MATERIALS WHERE Procedure = ?", (1,)),
+    ("SELECT Research FROM PROJECT_RESEARCH WHERE Project = ?", (1,)),
+    ("SELECT Research FROM PROCEDURE_RESEARCH WHERE Procedure = ?", (1,)),
+    ("SELECT Dimensions FROM DIMENSIONS WHERE Material = ?", ("Material1",)),
+    ("SELECT Member FROM PROJECT_MEMBERS WHERE Project = ?", (1,)),
+    ("SELECT Project FROM PROJECT_MEMBERS WHERE Member = ?", (1,)),
+    ("SELECT Member FROM PROCEDURE_CONTRIBUTERS WHERE Procedure = ?", (1,)),
+    ("SELECT Procedure FROM PROCEDURE_CONTRIBUTERS WHERE Member = ?", (1,)),
+    ("SELECT Team_ID FROM SUB_TEAM WHERE Team_Lead = ?", (1,)),
+    ("SELECT Project_ID FROM PROJECT WHERE Owner = ?", (1,)),
+    ("SELECT Procedure_ID FROM MAINTENANCE_PROCEDURE WHERE Maintainer = ?", (1,)),
+    (LINKED_MATERIALS_PAGE, (1, 0, 50)),
+    (LINKED_RESEARCH_PAGE, (1, 0, 50)),
+    (statement("project_dashboard", filters="".join(f" AND {condition}" for condition in DASHBOARD_FILTERS.values())),
+     (0, 1, "2024-01-01", "2024-12-31", 50)),
+]
+
+# Queries allowed to sort their rows in a temporary b-tree, since what they sort is
+# bounded: the full-text matches being ranked, or one project's links
+BOUNDED_SORTS = {statement("search_catalog"), LINKED_MATERIALS_PAGE, LINKED_RESEARCH_PAGE}
+
+
+# Registry templates run against either membership table
+MEMBERSHIP_LOOKUPS = ["stage_all_members", "unknown_memberships", "discard_unknown_memberships",
+                      "remove_memberships", "move_memberships", "remove_unlisted_memberships"]
+
+
+def with_sample_parameters(queries):
+    return [(sql, (1,) * sql.count("?")) for sql in dict.fromkeys(queries)]
+
+
+def registry_lookups():
+    """
+    Returns every static statement in the query registry that has a WHERE clause,
+    paired with sample parameters.
+    """
+    return with_sample_parameters(sql for sql in QUERIES.values() if "{" not in sql and "WHERE" in sql)
+
+
+def template_lookups(conn):
+    """
+    Returns the registry templates with a WHERE clause filled in the way the
+    application fills them in, paired with sample parameters: the bulk membership
+    changes for projects and procedures, a structured delete on each indexed column
+    of every table with its cascade, the reference checks of imports and membership
+    moves, and every table's listing past its first page.
+    """
+    catalog = schema_catalog(conn)
+    queries = [statement(name, **membership(kind)) for kind in MEMBERSHIPS for name in MEMBERSHIP_LOOKUPS]
+    for table in TABLES:
+        schema = catalog.table(table)
+        for column in sorted(schema.indexed):
+            steps, checks = cascade_plan(catalog, schema, f"{column} IS ?")
+            for step_table, condition in steps:
+                queries.append(statement("count_where", table=step_table, condition=condition))
+                queries.append(statement("delete_where", table=step_table, condition=condition))
+            queries.extend(statement("count_where", table=check_table, condition=condition)
+                           for check_table, condition, _ in checks)
+        queries.extend(statement("existing_keys", table=parent, column=parent_column)
+                       for _, parent, parent_column in schema.foreign_keys)
+        queries.append(statement("next_page", table=table, columns=", ".join(schema.columns), where=""))
+    queries.extend(statement("existing_keys", table=names["owner_table"], column=names["owner_key"])
+                   for names in map(membership, MEMBERSHIPS))
+    return with_sample_parameters(queries)
+
+
+def application_queries(conn):
+    """
+    Returns every lookup the application issues with a WHERE clause.
+    """
+    return registry_lookups() + template_lookups(conn) + EXTRA_QUERIES
+
+
+def check_query_plans(conn, queries=None):
+    """
+    Runs EXPLAIN QUERY PLAN on each query and returns (query, plan steps) for
+    every query whose plan still contains a full SCAN instead of a SEARCH, or sorts
+    its rows in a temporary b-tree (e.g. every page of a listing sorting all of the
+    rows it pages through) unless it is one of BOUNDED_SORTS.
+    Scanning json_each is allowed since that walks the parameter list, not a table,
+    as is scanning temp.membership_changes, which holds the change being applied,
+    as are the full-text search tables, whose MATCH is answered by their own index,
+    subqueries in FROM, which read back the rows their own searches produced, and
+    reads of the schema itself (sqlite_master and a constant row of PRAGMA values).
+    """
+    cursor = conn.cursor()
+    # The bulk membership statements read the change staged in this temporary table
+    cursor.execute(statement("create_membership_changes"))
+    failures = []
+    for query, params in queries or application_queries(conn):
+        cursor.execute(f"EXPLAIN QUERY PLAN {query}", params)
+        scans = [row[3] for row in cursor.fetchall()
+                 if row[3].startswith("SCAN") and not row[3].startswith("SCAN json_each")
+                 and "VIRTUAL TABLE INDEX" not in row[3] and not row[3].startswith("SCAN (subquery")
+                 and row[3] not in ("SCAN sqlite_master", "SCAN CONSTANT ROW", "SCAN temp.membership_changes")
+                 or row[3].startswith("USE TEMP B-TREE") and query not in BOUNDED_SORTS]
+        if scans:
+            failures.append((query, scans))
+    cursor.close()
+    return failures
+
+
+def main():
+    # Check a fresh in-memory schema by default, or an existing database file if one is given
+    database = sys.argv[1] if len(sys.argv) > 1 else ":memory:"
+    conn = sqlite3.connect(database)
+    if database == ":memory:":
+        migrate(conn, report=False)
+
+    queries = application_queries(conn)
+    failures = check_query_plans(conn, queries)
+    conn.close()
+
+    for query, scans in failures:
+        print(f"SCAN or SORT: {query}")
+        for step in scans:
+            print(f"    {step}")
+
+    if failures:
+        print(f"{len(failures)} of {len(queries)} queries still scan or sort a table.")
+        sys.exit(1)
+    print(f"All {len(queries)} queries are served by an index search in index order.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+import argparse
+import asyncio
+import contextlib
+import multiprocessing
+import os
+import queue
+import random
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+
+import Phase3application as app
+from Phase3benchmark import build_database, count
+from Phase3pool import AsyncDatabase, ConnectionPool
+
+
+def writer_thread(pool, size, deadline, rng, counts):
+    while time.perf_counter() < deadline:
+        try:
+            with pool.write() as conn:
+                app.create_project(conn, "2024-01-01", "2024-06-30", True, rng.randint(1, size),
+                                   [rng.randint(1, size) for _ in range(3)], "Stress test project")
+            counts["writes"] += 1
+        except sqlite3.OperationalError:
+            counts["failures"] += 1
+
+
+def writer_process(path, size, seconds, seed, threads, commit_window_ms, results):
+    """
+    Creates projects from `threads` threads sharing one connection pool until
+    `seconds` have passed, standing in for one more operator writing to the database.
+    Writes finishing within `commit_window_ms` of each other share a commit. Puts the
+    number of writes, of writes that failed with the database still locked, and of
+    commits on `results`.
+    """
+    pool = ConnectionPool(path, readers=1, commit_window_ms=commit_window_ms)
+    deadline = time.perf_counter() + seconds
+    counts = [{"writes": 0, "failures": 0} for _ in range(threads)]
+    workers = [threading.Thread(target=writer_thread, args=(pool, size, deadline, random.Random(seed * 1000 + i), counts[i]))
+               for i in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    stats = pool.close()
+    results.put((sum(count["writes"] for count in counts), sum(count["failures"] for count in counts),
+                 stats["commits"] if stats else 0))
+
+
+async def reader_task(database, size, deadline, rng):
+    reads = 0
+    while time.perf_counter() < deadline:
+        await database.read(app.get_project, rng.randint(1, size))
+        await database.read(app.search_catalog, f"Material{rng.randint(1, size)}")
+        reads += 2
+    return reads
+
+
+async def run_readers(path, size, readers, seconds, seed):
+    """
+    Runs `readers` concurrent reader tasks through the asyncio facade for `seconds`
+    and returns the number of queries they completed.
+    """
+    database = AsyncDatabase(ConnectionPool(path, readers=readers), workers=readers)
+    deadline = time.perf_counter() + seconds
+    try:
+        counts = await asyncio.gather(*(reader_task(database, size, deadline, random.Random(seed + i))
+                                        for i in range(readers)))
+    finally:
+        database.close()
+    return sum(counts)
+
+
+def collect_results(workers, results, poll=1.0):
+    """
+    Returns one result from `results` per worker process. Raises RuntimeError if the
+    workers have all exited with results still missing (e.g. one crashed).
+    """
+    collected = []
+    while len(collected) < len(workers):
+        try:
+            collected.append(results.get(timeout=poll))
+        except queue.Empty:
+            if any(worker.is_alive() for worker in workers):
+                continue
+            # A worker may have put its result just before exiting
+            try:
+                collected.append(results.get(timeout=poll))
+            except queue.Empty:
+                exit_codes = ", ".join(str(worker.exitcode) for worker in workers)
+                raise RuntimeError(f"{len(workers) - len(collected)} of {len(workers)} writer process(es) "
+                                   f"exited without a result (exit codes {exit_codes})")
+    return collected
+
+
+def run_round(path, size, readers, writers, seconds, seed, writer_threads=1, commit_window_ms=0):
+    """
+    Runs `readers` readers in this process and `writers` writer processes of
+    `writer_threads` threads each against the database at the same time. Returns
+    reads/s, writes/s, commits/s and failed writes.
+    """
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+    workers = [context.Process(target=writer_process,
+                               args=(path, size, seconds, seed + i, writer_threads, commit_window_ms, results))
+               for i in range(writers)]
+    for worker in workers:
+        worker.start()
+
+    started = time.perf_counter()
+    reads = asyncio.run(run_readers(path, size, readers, seconds, seed)) if readers else 0
+    elapsed = max(time.perf_counter() - started, seconds)
+
+    writes = failures = commits = 0
+    for worker_writes, worker_failures, worker_commits in collect_results(workers, results):
+        writes += worker_writes
+        failures += worker_failures
+        commits += worker_commits
+    for worker in workers:
+        worker.join()
+
+    return {"readers": readers, "writers": writers, "reads_per_sec": reads / elapsed,
+            "writes_per_sec": writes / seconds, "commits_per_sec": commits / seconds, "failed_writes": failures}
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description="Measure throughput as concurrent readers and writers are added.")
+    parser.add_argument("--size", type=count, default=10000, help="members and projects in the test database")
+    parser.add_argument("--readers", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--writers", type=int, nargs="+", default=[0, 1, 2, 4])
+    parser.add_argument("--writer-threads", type=int, default=1, help="threads sharing each writer's connection pool")
+    parser.add_argument("--commit-window-ms", type=float, default=0,
+                        help="let writes finishing this close together share a commit")
+    parser.add_argument("--seconds", type=float, default=3.0, help="length of each round")
+    parser.add_argument("--seed", type=int, default=0)
+    return parser.parse_args()
+
+
+def main():
+    args = parse_arguments()
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "stress.db")
+        with contextlib.redirect_stdout(sys.stderr):
+            build_database(path, args.size, args.seed)
+
+        print(f"{'Readers':>8} {'Writers':>8} {'Reads/s':>12} {'Writes/s':>12} {'Commits/s':>12} {'Failed writes':>14}")
+        failed = 0
+        for writers in args.writers:
+            for readers in args.readers:
+                result = run_round(path, args.size, readers, writers, args.seconds, args.seed,
+                                   args.writer_threads, args.commit_window_ms)
+                failed += result["failed_writes"]
+                print(f"{readers:>8} {writers:>8} {result['reads_per_sec']:>12,.0f} "
+                      f"{result['writes_per_sec']:>12,.0f} {result['commits_per_sec']:>12,.0f} "
+                      f"{result['failed_writes']:>14}")
+
+    if failed:
+        print(f"{failed} writes failed with the database locked.")
+        exit(1)
+
+
+if __name__ == "__main__":
+    main()
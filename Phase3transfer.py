@@ -0,0 +1,354 @@
+import csv
+import json
+import os
+import sqlite3
+import time
+from itertools import islice
+
+from Phase3cache import invalidate_table
+from Phase3catalog import table_schema
+from Phase3pool import begin_immediate
+from Phase3queries import TABLES, fetch_all, iterate_chunks, statement
+from Phase3Setup import SEARCH_TABLES, create_search_index
+
+# Rows read, validated and inserted together, and rows committed per transaction
+CHUNK_SIZE = 10000
+TRANSACTION_SIZE = 500000
+
+
+def file_format(path):
+    """
+    Returns "csv" or "jsonl" from a file's extension.
+    """
+    extension = os.path.splitext(path)[1].lower()
+    if extension == ".csv":
+        return "csv"
+    if extension in (".jsonl", ".ndjson", ".json"):
+        return "jsonl"
+    raise ValueError(f"Unsupported file type '{extension}'; use .csv or .jsonl.")
+
+
+def table_path(directory, table, file_type):
+    return os.path.join(directory, f"{table}.{file_type}")
+
+
+def check_table(table):
+    table = table.strip().upper()
+    if table not in TABLES:
+        raise ValueError(f"Unknown table '{table}'.")
+    return table
+
+
+# Types a JSON-lines value may have; arrays and objects have no column type to go in
+SCALAR_TYPES = (str, int, float, bool, type(None))
+
+
+def export_table(conn, table, path, chunk_size=CHUNK_SIZE):
+    """
+    Streams every row of `table` to a CSV or JSON-lines file a chunk at a time and
+    returns the number of rows written. NULLs are written as empty CSV cells.
+    """
+    table = check_table(table)
+    columns = table_schema(conn, table).columns
+    exported = 0
+    with open(path, "w", newline="") as output:
+        chunks = iterate_chunks(conn, "export_rows", chunk_size=chunk_size, table=table, columns=", ".join(columns))
+        if file_format(path) == "csv":
+            writer = csv.writer(output)
+            writer.writerow(columns)
+            for chunk in chunks:
+                writer.writerows(chunk)
+                exported += len(chunk)
+        else:
+            for chunk in chunks:
+                output.writelines(json.dumps(dict(zip(columns, row))) + "\n" for row in chunk)
+                exported += len(chunk)
+    return exported
+
+
+def csv_header(path):
+    with open(path, newline="") as source:
+        return next(csv.reader(source), [])
+
+
+def read_rows(path, columns):
+    """
+    Yields (line number, record, values) for each row of a CSV or JSON-lines file,
+    one at a time. The record is the row as read (a list of CSV fields or a dict).
+    `values` lists the row's values in `columns` order (missing and empty values as
+    None), or is a string saying why the line is not a valid row, e.g. a JSON value
+    that is an array or object.
+    Raises ValueError if the file names a column that `columns` does not have.
+    """
+    with open(path, newline="") as source:
+        if file_format(path) == "csv":
+            reader = csv.reader(source)
+            header = next(reader, [])
+            unknown = set(header) - set(columns)
+            if unknown:
+                raise ValueError(f"{path} has unknown column(s) {', '.join(sorted(unknown))}")
+            positions = [header.index(column) if column in header else None for column in columns]
+            for line_number, row in enumerate(reader, start=2):
+                if len(row) != len(header):
+                    yield line_number, row, f"expected {len(header)} fields, found {len(row)}"
+                    continue
+                yield line_number, row, [row[position] or None if position is not None else None
+                                            for position in positions]
+        else:
+            known = set(columns)
+            for line_number, line in enumerate(source, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError as e:
+                    yield line_number, {"text": line.rstrip("\n")}, f"invalid JSON: {e}"
+                    continue
+                if not isinstance(record, dict):
+                    yield line_number, {"value": record}, "expected a JSON object"
+                elif not known.issuperset(record):
+                    yield line_number, record, f"unknown column(s) {', '.join(sorted(set(record) - known))}"
+                elif not all(isinstance(value, SCALAR_TYPES) for value in record.values()):
+                    nested = [column for column, value in record.items() if not isinstance(value, SCALAR_TYPES)]
+                    yield line_number, record, f"{', '.join(nested)}: expected a single value, not an array or object"
+                else:
+                    yield line_number, record, [record.get(column) for column in columns]
+
+
+class TableImporter:
+    """
+    Validates and inserts rows into one table. Each row is checked for missing
+    required values, values of the wrong type and references to rows that do not
+    exist before it is inserted; rows that fail are returned with the reason instead.
+
+    While a transaction imports, a temporary trigger records the rowid of every row
+    inserted. Tables with a full-text search index have the index's insert trigger
+    dropped meanwhile, and each chunk's recorded rows are indexed with one
+    INSERT ... SELECT, which is several times faster than indexing a row at a time.
+    The trigger is put back before the transaction commits.
+    """
+
+    def __init__(self, conn, table):
+        self.conn = conn
+        self.table = table
+        schema = table_schema(conn, table)
+        self.columns = schema.columns
+        self.conversions = schema.conversions
+        self.required = [self.columns.index(column) for column in schema.required]
+        self.foreign_keys = [(self.columns.index(column), column, parent, parent_column)
+                             for column, parent, parent_column in schema.foreign_keys]
+        self.search_table = next((name for name, (source, _) in SEARCH_TABLES.items() if source == table), None)
+        self.insert = statement("insert_row", **schema.insert)
+
+    def convert(self, values):
+        """
+        Converts a row's values in place, or raises ValueError.
+        """
+        for index in self.required:
+            if values[index] is None:
+                raise ValueError(f"{self.columns[index]} is required")
+        for index, converter in self.conversions:
+            if values[index] is not None:
+                try:
+                    values[index] = converter(values[index])
+                except (ValueError, TypeError) as e:
+                    raise ValueError(f"{self.columns[index]}: {e}")
+        return values
+
+    def missing_references(self, rows):
+        """
+        Returns {row index: reason} for rows referring to a parent row that does not
+        exist, looking each foreign key's values up with one query per chunk.
+        """
+        missing = {}
+        for index, column, parent, parent_column in self.foreign_keys:
+            keys = {row[index] for row in rows if row[index] is not None}
+            if not keys:
+                continue
+            found = {row[0] for row in fetch_all(self.conn, "existing_keys", (json.dumps(list(keys)),),
+                                                 table=parent, column=parent_column)}
+            if len(found) == len(keys):
+                continue
+            for row_number, row in enumerate(rows):
+                if row[index] is not None and row[index] not in found:
+                    missing.setdefault(row_number, f"{column} {row[index]} does not exist in {parent}")
+        return missing
+
+    def begin(self):
+        """
+        Starts an import transaction.
+        """
+        begin_immediate(self.conn)
+        self.conn.execute("PRAGMA defer_foreign_keys = ON")
+        if self.search_table:
+            self.conn.execute(f"DROP TRIGGER IF EXISTS {self.search_table}_insert")
+        self.conn.execute("CREATE TEMP TABLE IF NOT EXISTS imported_rowids (id INTEGER PRIMARY KEY)")
+        self.conn.execute(f"CREATE TEMP TRIGGER import_capture AFTER INSERT ON main.{self.table} BEGIN "
+                          "INSERT INTO imported_rowids (id) VALUES (new.rowid); END")
+
+    def commit(self):
+        """
+        Puts the search index trigger back and commits the import transaction.
+        """
+        self.conn.execute("DROP TRIGGER temp.import_capture")
+        if self.search_table:
+            cursor = self.conn.cursor()
+            create_search_index(cursor)
+            cursor.close()
+        self.conn.commit()
+
+    def index_chunk(self):
+        if self.search_table:
+            columns = ", ".join(SEARCH_TABLES[self.search_table][1])
+            self.conn.execute(f"INSERT INTO {self.search_table} (rowid, {columns}) SELECT rowid, {columns} "
+                              f"FROM {self.table} WHERE rowid IN (SELECT id FROM temp.imported_rowids)")
+        self.conn.execute("DELETE FROM temp.imported_rowids")
+
+    def imported_count(self):
+        return fetch_all(self.conn, "count_imported")[0][0]
+
+    def insert_captured(self, accepted, rows, rejected):
+        """
+        Inserts the rows with executemany. If a row is rejected (e.g. a duplicate key),
+        the rowids recorded so far show how far executemany got, and it carries on
+        from the row after. This avoids a savepoint per chunk: a savepoint makes FTS5
+        flush its pending index data and makes every page the summary triggers touch
+        go through the statement journal, which together slowed imports several times.
+        """
+        start = 0
+        while start < len(rows):
+            before = self.imported_count()
+            try:
+                self.conn.executemany(self.insert, rows[start:])
+                break
+            except sqlite3.IntegrityError as e:
+                start += self.imported_count() - before
+                rejected.append((*accepted[start], str(e)))
+                start += 1
+        return self.imported_count()
+
+    def insert_chunk(self, chunk):
+        """
+        Inserts a chunk of (line number, record, values) rows and returns the number
+        of rows inserted and the list of (line number, record, reason) rejected.
+        """
+        rejected = []
+        accepted = []
+        rows = []
+        for line_number, record, values in chunk:
+            if isinstance(values, str):
+                rejected.append((line_number, record, values))
+                continue
+            try:
+                rows.append(self.convert(values))
+                accepted.append((line_number, record))
+            except ValueError as e:
+                rejected.append((line_number, record, str(e)))
+
+        missing = self.missing_references(rows)
+        if missing:
+            rejected.extend((*accepted[i], missing[i]) for i in sorted(missing))
+            accepted = [line for i, line in enumerate(accepted) if i not in missing]
+            rows = [row for i, row in enumerate(rows) if i not in missing]
+
+        inserted = self.insert_captured(accepted, rows, rejected)
+        self.index_chunk()
+        return inserted, rejected
+
+
+class ErrorWriter:
+    """
+    Writes rejected rows, with their line number and the reason, to a CSV or JSON-lines
+    file. `columns` names the fields of rows read as lists. The file is only created
+    if a row is rejected.
+    """
+
+    def __init__(self, path, columns):
+        self.path = path
+        self.columns = columns
+        self.output = None
+        self.writer = None
+        self.count = 0
+
+    def write(self, line_number, record, reason):
+        if not self.output:
+            self.output = open(self.path, "w", newline="")
+            if file_format(self.path) == "csv":
+                self.writer = csv.DictWriter(self.output, ["line", "error", *self.columns], extrasaction="ignore")
+                self.writer.writeheader()
+        self.count += 1
+        if isinstance(record, list):
+            record = dict(zip(self.columns, record))
+        if self.writer:
+            self.writer.writerow({"line": line_number, "error": reason, **record})
+        else:
+            self.output.write(json.dumps({"line": line_number, "error": reason, "row": record}) + "\n")
+
+    def close(self):
+        if self.output:
+            self.output.close()
+
+
+def errors_path_for(path):
+    root, extension = os.path.splitext(path)
+    return f"{root}.errors{extension}"
+
+
+def import_table(conn, table, path, errors_path=None, chunk_size=CHUNK_SIZE,
+                 transaction_size=TRANSACTION_SIZE, report=True):
+    """
+    Streams a CSV or JSON-lines file into `table` and returns the number of rows
+    imported and rejected.
+
+    Rows are read, validated and inserted a chunk at a time with executemany, and
+    committed every `transaction_size` rows. Foreign keys are checked when each
+    transaction commits, so rows within a transaction may refer to each other in any
+    order. Rejected rows are written to `errors_path` (by default next to the input,
+    e.g. materials.errors.csv) instead of stopping the import.
+    """
+    table = check_table(table)
+    importer = TableImporter(conn, table)
+    header = csv_header(path) if file_format(path) == "csv" else importer.columns
+    errors = ErrorWriter(errors_path or errors_path_for(path), header)
+    rows = read_rows(path, importer.columns)
+    imported = 0
+    in_transaction = 0
+    started = last_report = time.perf_counter()
+
+    try:
+        while True:
+            chunk = list(islice(rows, chunk_size))
+            if not chunk:
+                break
+            if not in_transaction:
+                importer.begin()
+            inserted, rejected = importer.insert_chunk(chunk)
+            imported += inserted
+            in_transaction += len(chunk)
+            for line_number, record, reason in sorted(rejected, key=lambda rejection: rejection[0]):
+                errors.write(line_number, record, reason)
+            if in_transaction >= transaction_size:
+                importer.commit()
+                in_transaction = 0
+
+            now = time.perf_counter()
+            if report and now - last_report >= 1.0:
+                print(f"    {table}: {imported:,} rows imported, {errors.count:,} rejected, "
+                      f"{imported / (now - started):,.0f} rows/s")
+                last_report = now
+        if in_transaction:
+            importer.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    finally:
+        errors.close()
+        invalidate_table(table)
+
+    if report:
+        elapsed = time.perf_counter() - started
+        print(f"{table}: {imported:,} rows imported, {errors.count:,} rejected in {elapsed:.2f}s "
+              f"({imported / max(elapsed, 1e-9):,.0f} rows/s).")
+        if errors.count:
+            print(f"Rejected rows written to {errors.path}.")
+    return imported, errors.count
@@ -0,0 +1,48 @@
+import os
+import sys
+
+from Phase3queries import fetch_all_with_names
+
+# Number of rows printed per page; override with the PHASE3_PAGE_SIZE environment variable
+PAGE_SIZE = int(os.environ.get("PHASE3_PAGE_SIZE", "50"))
+
+
+def iter_pages(conn, table, columns="*", where="", params=(), page_size=None):
+    """
+    Yields (column names, rows) for `table` one page at a time.
+
+    Uses keyset pagination on rowid: each page is an index seek past the last rowid
+    seen, so only one page of rows is ever held in memory and later pages cost the
+    same as the first no matter how large the table is.
+    """
+    page_size = page_size or PAGE_SIZE
+    column_names, rows = fetch_all_with_names(conn, "first_page", (*params, page_size), table=table,
+                                              columns=columns, where=f" WHERE {where}" if where else "")
+    while rows:
+        yield column_names[1:], [row[1:] for row in rows]
+        if len(rows) < page_size:
+            return
+        column_names, rows = fetch_all_with_names(conn, "next_page", (*params, rows[-1][0], page_size), table=table,
+                                                  columns=columns, where=f"({where}) AND " if where else "")
+
+
+def display_table(conn, table, columns="*", where="", params=(), page_size=None, format_row=None):
+    """
+    Prints the rows of `table` a page at a time and returns the number of rows printed.
+
+    Rows are printed as ' | ' separated values under a header unless `format_row` is
+    given. When running in a terminal the user is asked before each further page.
+    """
+    shown = 0
+    for column_names, rows in iter_pages(conn, table, columns, where, params, page_size):
+        if shown and sys.stdin.isatty():
+            if input("-- More -- (press Enter for the next page, 'q' to stop): ").strip().lower() == "q":
+                break
+        if not shown and not format_row:
+            print(f"{' | '.join(column_names)}")
+            print("-" * (len(column_names) * 15))
+
+        for row in rows:
+            print(format_row(row) if format_row else " | ".join(map(str, row)))
+        shown += len(rows)
+    return shown
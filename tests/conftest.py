@@ -0,0 +1,39 @@
+import os
+import sys
+
+import pytest
+
+# The Phase3 modules live at the top of the repository rather than in a package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("PHASE3_SLOW_QUERY_LOG", "")
+
+from Phase3application import (add_row, create_maintenance_procedure, create_project,  # noqa: E402
+                               track_materials_batch, track_outside_resources_batch)
+from Phase3cache import invalidate_all  # noqa: E402
+from Phase3catalog import forget_catalogs  # noqa: E402
+from Phase3database import connect_to_database  # noqa: E402
+from Phase3migrations import migrate  # noqa: E402
+
+
+@pytest.fixture
+def conn(tmp_path):
+    """
+    A connection to a fresh database at the latest schema version holding three team
+    members, project 1 (owned by member 1, members 1 and 2) with material Bolt and
+    research Paper linked to it, and procedure 1 (maintained by member 2) using Bolt.
+    """
+    invalidate_all()
+    forget_catalogs()
+    conn = connect_to_database(str(tmp_path / "test.db"), report=False, in_memory=False)
+    migrate(conn, report=False)
+    for member_id in (1, 2, 3):
+        add_row(conn, "TEAM_MEMBER", {"Member_ID": member_id, "Email": f"member{member_id}@example.com",
+                                      "Name": f"Member {member_id}"})
+    create_project(conn, "2024-01-01", "2024-06-30", True, 1, [1, 2], "Project 1")
+    track_materials_batch(conn, 1, [("Bolt", "Hardware", "M3 bolt", "")])
+    track_outside_resources_batch(conn, 1, [("Paper", "A paper", "")])
+    create_maintenance_procedure(conn, "Tighten bolts", 2, "2024-02-01", ["Bolt"], [])
+    conn.commit()
+    yield conn
+    conn.close()
+    invalidate_all()
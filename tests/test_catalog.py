@@ -0,0 +1,59 @@
+import datetime
+
+import pytest
+
+from Phase3application import add_row
+from Phase3catalog import convert_boolean, convert_date, convert_integer, table_schema
+
+
+@pytest.mark.parametrize("value, expected", [(1, 1), ("7", 7), (" -3 ", -3), (3.0, 3), (-2.0, -2)])
+def test_convert_integer_accepts_whole_numbers(value, expected):
+    assert convert_integer(value) == expected
+    assert type(convert_integer(value)) is int
+
+
+@pytest.mark.parametrize("value", [1.5, True, False, None, [1], {"a": 1}, "x", "1.0", "", "--1"])
+def test_convert_integer_rejects_everything_else(value):
+    with pytest.raises(ValueError):
+        convert_integer(value)
+
+
+@pytest.mark.parametrize("value, expected", [("yes", 1), (" Y ", 1), ("TRUE", 1), (1, 1), (True, 1),
+                                             ("no", 0), ("false", 0), (0, 0), (False, 0)])
+def test_convert_boolean(value, expected):
+    assert convert_boolean(value) == expected
+
+
+def test_convert_boolean_rejects_other_values():
+    with pytest.raises(ValueError, match="'maybe' is not a boolean"):
+        convert_boolean("maybe")
+
+
+@pytest.mark.parametrize("value", ["2024-03-05", "2024/03/05", " 2024-03-05 ", "2024-03-05T10:30:00",
+                                   datetime.date(2024, 3, 5), datetime.datetime(2024, 3, 5, 10, 30)])
+def test_convert_date(value):
+    assert convert_date(value) == "2024-03-05"
+
+
+@pytest.mark.parametrize("value", ["05/03/2024", "2024-02-30", "soon"])
+def test_convert_date_rejects_other_values(value):
+    with pytest.raises(ValueError, match="is not a date"):
+        convert_date(value)
+
+
+def test_coerce_names_the_column_and_maps_blanks_to_null(conn):
+    schema = table_schema(conn, "PROJECT")
+    assert schema.coerce("Owner", " 2 ") == 2
+    assert schema.coerce("In_Use", "no") == 0
+    assert schema.coerce("Name", "  ") is None
+    assert schema.coerce("Name", 5) == 5
+    with pytest.raises(ValueError, match="^Owner: '2.5' is not an integer$"):
+        schema.coerce("Owner", 2.5)
+
+
+def test_add_row_rejects_values_of_the_wrong_type(conn):
+    with pytest.raises(ValueError, match="Member_ID"):
+        add_row(conn, "TEAM_MEMBER", {"Member_ID": 4.5, "Email": "four@example.com", "Name": "Four"})
+    with pytest.raises(ValueError, match="needs a value for Email"):
+        add_row(conn, "TEAM_MEMBER", {"Member_ID": 4, "Name": "Four"})
+    assert conn.execute("SELECT COUNT(*) FROM TEAM_MEMBER").fetchall() == [(3,)]
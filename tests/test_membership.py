@@ -0,0 +1,103 @@
+import json
+
+import pytest
+
+from Phase3application import create_project
+from Phase3membership import (add_memberships, export_adjacency, move_memberships, parse_member_ids, read_roster,
+                              remove_memberships, sync_memberships)
+
+
+@pytest.fixture
+def two_projects(conn):
+    """
+    The `conn` fixture with project 2 (owned by member 3, members 2 and 3) added.
+    """
+    create_project(conn, "2024-03-01", "2024-09-30", True, 3, [2, 3], "Project 2")
+    conn.commit()
+    return conn
+
+
+def members(conn, project_id):
+    return [row[0] for row in conn.execute(
+        "SELECT Member FROM PROJECT_MEMBERS WHERE Project = ? ORDER BY Member", (project_id,))]
+
+
+def test_add_skips_existing_links_and_unknown_pairs(conn):
+    result = add_memberships(conn, "project", [(1, 1), (1, 3), (1, 99), (42, 2)])
+    assert result == {"added": 1, "unknown": [(1, 99, "TEAM_MEMBER 99 does not exist"),
+                                              (42, 2, "PROJECT 42 does not exist")]}
+    assert members(conn, 1) == [1, 2, 3]
+
+
+def test_add_procedure_contributors(conn):
+    assert add_memberships(conn, "procedure", [(1, 1), (1, 2)])["added"] == 2
+    assert conn.execute("SELECT COUNT(*) FROM PROCEDURE_CONTRIBUTERS WHERE Procedure = 1").fetchall() == [(2,)]
+
+
+def test_remove(conn):
+    assert remove_memberships(conn, "project", [(1, 2), (1, 3)]) == {"removed": 1}
+    assert members(conn, 1) == [1]
+
+
+def test_move_merges_members_already_on_the_target(two_projects):
+    assert move_memberships(two_projects, "project", 1, 2) == {"moved": 1, "merged": 1}
+    assert members(two_projects, 1) == []
+    assert members(two_projects, 2) == [1, 2, 3]
+
+
+def test_move_chosen_members(two_projects):
+    assert move_memberships(two_projects, "project", "2", "1", member_ids=[3]) == {"moved": 1, "merged": 0}
+    assert members(two_projects, 1) == [1, 2, 3]
+    assert members(two_projects, 2) == [2]
+
+
+def test_move_to_a_missing_target_is_refused(conn):
+    with pytest.raises(ValueError, match="No project found with ID 42"):
+        move_memberships(conn, "project", 1, 42)
+    assert members(conn, 1) == [1, 2]
+
+
+def test_sync_adds_and_removes_only_on_listed_projects(two_projects):
+    result = sync_memberships(two_projects, "project", [(1, 1), (1, 3), (1, 99)])
+    assert result == {"added": 1, "removed": 1, "unknown": [(1, 99, "TEAM_MEMBER 99 does not exist")]}
+    assert members(two_projects, 1) == [1, 3]
+    assert members(two_projects, 2) == [2, 3]
+
+
+def test_sync_with_only_unknown_members_empties_the_project(conn):
+    result = sync_memberships(conn, "project", [(1, 99)])
+    assert result["removed"] == 2
+    assert result["added"] == 0
+    assert members(conn, 1) == []
+
+
+def test_unknown_kind_is_refused(conn):
+    with pytest.raises(ValueError, match="Unknown membership 'team'"):
+        add_memberships(conn, "team", [(1, 1)])
+
+
+def test_parse_member_ids():
+    assert parse_member_ids("3, 7,10-12,") == [3, 7, 10, 11, 12]
+    assert parse_member_ids(5) == [5]
+    for value in ("12-10", "a-b", "1.5", "3,x"):
+        with pytest.raises(ValueError):
+            parse_member_ids(value)
+
+
+def test_read_roster(tmp_path):
+    path = tmp_path / "roster.csv"
+    path.write_text("Project,Member\n1,2\n1,\nx,3\n2,3\n")
+    assert read_roster(str(path), "project") == ([(1, 2), (2, 3)], [
+        (3, "Project and Member are required"), (4, "'x' is not an integer")])
+
+
+def test_export_adjacency(two_projects, tmp_path):
+    path = tmp_path / "adjacency.jsonl"
+    assert export_adjacency(two_projects, "project", str(path)) == 3
+    lines = [json.loads(line) for line in path.read_text().splitlines()]
+    assert lines == [{"Member": 1, "Projects": [1]}, {"Member": 2, "Projects": [1, 2]},
+                     {"Member": 3, "Projects": [2]}]
+
+    path = tmp_path / "adjacency.csv"
+    assert export_adjacency(two_projects, "project", str(path), by="owner") == 2
+    assert path.read_text() == "Project,Members\n1,1 2\n2,2 3\n"
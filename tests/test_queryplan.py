@@ -0,0 +1,31 @@
+import sqlite3
+
+from Phase3migrations import migrate
+from Phase3queryplan import application_queries, check_query_plans
+
+
+def fresh_schema():
+    conn = sqlite3.connect(":memory:")
+    migrate(conn, report=False)
+    return conn
+
+
+def test_every_application_query_searches_an_index():
+    conn = fresh_schema()
+    assert check_query_plans(conn) == []
+
+
+def test_templated_lookups_are_checked():
+    conn = fresh_schema()
+    queries = [query for query, _ in application_queries(conn)]
+    assert "DELETE FROM PROJECT_MEMBERS WHERE Project IN (SELECT Project_ID FROM PROJECT WHERE Project_ID IS ?)" \
+        in queries
+    assert any("FROM PROCEDURE_CONTRIBUTERS" in query and "temp.membership_changes" in query for query in queries)
+    assert "SELECT Member_ID FROM TEAM_MEMBER WHERE Member_ID IN (SELECT value FROM json_each(?))" in queries
+
+
+def test_missing_index_fails_the_cascade_delete():
+    conn = fresh_schema()
+    conn.execute("DROP INDEX idx_dimensions_material")
+    failed = [query for query, _ in check_query_plans(conn)]
+    assert "DELETE FROM DIMENSIONS WHERE Material IN (SELECT Name FROM MATERIALS WHERE Name IS ?)" in failed
@@ -0,0 +1,71 @@
+import pytest
+
+from Phase3application import delete_rows, parse_predicates
+from Phase3cli import parse_column_values
+
+
+def count(conn, table, condition="1", params=()):
+    return conn.execute(f"SELECT COUNT(*) FROM {table} WHERE {condition}", params).fetchall()[0][0]
+
+
+def test_removing_a_project_removes_its_links(conn):
+    removed = delete_rows(conn, "project", {"project_id": "1"})
+    conn.commit()
+    assert removed == {"PROJECT_MEMBERS": 2, "PROJECT_MATERIALS": 1, "PROJECT_RESEARCH": 1, "PROJECT": 1}
+    for table in ("PROJECT", "PROJECT_MEMBERS", "PROJECT_MATERIALS", "PROJECT_RESEARCH"):
+        assert count(conn, table) == 0
+    # The materials and research themselves, and the team, are left alone
+    assert count(conn, "MATERIALS") == 1
+    assert count(conn, "OUTSIDE_RESEARCH") == 1
+    assert count(conn, "TEAM_MEMBER") == 3
+
+
+def test_dry_run_counts_without_deleting(conn):
+    removed = delete_rows(conn, "MATERIALS", {"Name": "Bolt"}, dry_run=True)
+    assert removed == {"DIMENSIONS": 0, "PROJECT_MATERIALS": 1, "PROCEDURE_MATERIALS": 1, "MATERIALS": 1}
+    assert count(conn, "MATERIALS") == 1
+    assert count(conn, "PROCEDURE_MATERIALS") == 1
+
+
+def test_removing_a_member_still_referred_to_is_refused(conn):
+    with pytest.raises(ValueError, match="1 PROJECT row"):
+        delete_rows(conn, "TEAM_MEMBER", {"Member_ID": 1})
+    assert count(conn, "PROJECT_MEMBERS", "Member = 1") == 1
+
+    assert delete_rows(conn, "TEAM_MEMBER", {"Member_ID": 3}) == {
+        "PROJECT_MEMBERS": 0, "PROCEDURE_CONTRIBUTERS": 0, "TEAM_MEMBER": 1}
+
+
+@pytest.mark.parametrize("table, predicates, message", [
+    ("TEAM_MEMBER", {"Name": "Member 1"}, "None of Name is indexed"),
+    ("TEAM_MEMBER", {"Age": "30"}, "has no column 'Age'"),
+    ("TEAM_MEMBER", {}, "at least one column"),
+    ("sqlite_master", {"name": "PROJECT"}, "does not exist"),
+    ("PROJECT", {"Project_ID": "1 OR 1=1"}, "is not an integer"),
+])
+def test_invalid_removals_are_refused(conn, table, predicates, message):
+    with pytest.raises(ValueError, match=message):
+        delete_rows(conn, table, predicates)
+    assert count(conn, "PROJECT") == 1
+
+
+def test_values_are_matched_not_run(conn):
+    assert delete_rows(conn, "MATERIALS", {"Name": "x' OR '1'='1"}) == {
+        "DIMENSIONS": 0, "PROJECT_MATERIALS": 0, "PROCEDURE_MATERIALS": 0, "MATERIALS": 0}
+    assert count(conn, "MATERIALS") == 1
+
+
+def test_parse_predicates():
+    assert parse_predicates("Project = 1 and Member = '2'") == {"Project": "1", "Member": "2"}
+    assert parse_predicates('Name = "a = b"') == {"Name": "a = b"}
+    assert parse_predicates("URL = null") == {"URL": None}
+    with pytest.raises(ValueError, match="Expected 'Column = value', got 'Project'"):
+        parse_predicates("Project")
+
+
+def test_parse_column_values():
+    assert parse_column_values(["Project=1", " Member =2", "URL="]) == {"Project": "1", "Member": "2", "URL": None}
+    assert parse_column_values(["Name=a=b"]) == {"Name": "a=b"}
+    for argument in ("Project", "=1"):
+        with pytest.raises(ValueError, match="Expected COLUMN=VALUE"):
+            parse_column_values([argument])
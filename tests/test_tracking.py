@@ -0,0 +1,32 @@
+import pytest
+
+from Phase3application import track_materials_batch, track_outside_resources_batch
+
+
+def linked_materials(conn, project_id):
+    return [row[0] for row in conn.execute("SELECT Material FROM PROJECT_MATERIALS WHERE Project = ? ORDER BY Material",
+                                           (project_id,))]
+
+
+def test_counts_only_new_materials_and_links(conn):
+    materials = [("Nut", "Hardware", "M3 nut", ""), ("Nut", "Hardware", "M3 nut", ""), ("Bolt", "Hardware", "", "")]
+    assert track_materials_batch(conn, 1, materials) == {"inserted": 1, "linked": 1}
+    assert linked_materials(conn, 1) == ["Bolt", "Nut"]
+    assert track_materials_batch(conn, 1, materials) == {"inserted": 0, "linked": 0}
+
+
+def test_existing_material_is_linked_without_being_overwritten(conn):
+    conn.execute("INSERT INTO PROJECT (Start_Date, End_Date, In_Use, Owner) VALUES ('2024-01-01', '2024-02-01', 0, 1)")
+    assert track_materials_batch(conn, 2, [("Bolt", "Other", "changed", "")]) == {"inserted": 0, "linked": 1}
+    assert conn.execute("SELECT Material_Type, Description FROM MATERIALS WHERE Name = 'Bolt'").fetchall() == \
+        [("Hardware", "M3 bolt")]
+
+
+def test_resources_count_new_links(conn):
+    resources = [("Paper", "A paper", ""), ("Book", "A book", ""), ("Book", "A book", "")]
+    assert track_outside_resources_batch(conn, 1, resources) == {"inserted": 1, "linked": 1}
+
+
+def test_unknown_project_is_refused(conn):
+    with pytest.raises(ValueError):
+        track_materials_batch(conn, 99, [("Nut", "Hardware", "", "")])
@@ -0,0 +1,84 @@
+import csv
+import json
+
+from Phase3database import connect_to_database
+from Phase3migrations import migrate
+from Phase3transfer import export_table, import_table
+
+
+def write_lines(path, records):
+    path.write_text("".join((record if isinstance(record, str) else json.dumps(record)) + "\n" for record in records))
+    return str(path)
+
+
+def read_errors(path):
+    return {entry["line"]: entry["error"] for entry in map(json.loads, path.read_text().splitlines())}
+
+
+def member_emails(conn):
+    return [row[0] for row in conn.execute("SELECT Email FROM TEAM_MEMBER ORDER BY Member_ID")]
+
+
+def test_nested_json_values_reject_their_line(conn, tmp_path):
+    path = write_lines(tmp_path / "members.jsonl", [
+        {"Member_ID": [10, 11], "Email": "array@example.com", "Name": "Array"},
+        {"Email": "object@example.com", "Name": {"first": "Object"}},
+        {"Member_ID": 12, "Email": "ok@example.com", "Name": "Ok"},
+    ])
+    assert import_table(conn, "TEAM_MEMBER", path, report=False) == (1, 2)
+    errors = read_errors(tmp_path / "members.errors.jsonl")
+    assert errors == {1: "Member_ID: expected a single value, not an array or object",
+                      2: "Name: expected a single value, not an array or object"}
+    assert member_emails(conn)[-1] == "ok@example.com"
+
+
+def test_each_kind_of_bad_line_is_rejected_and_the_rest_imported(conn, tmp_path):
+    path = write_lines(tmp_path / "members.jsonl", [
+        "{not json",
+        "[1, 2]",
+        {"Email": "unknown@example.com", "Name": "Unknown", "Age": 30},
+        {"Email": "missing-name@example.com"},
+        {"Member_ID": 1.5, "Email": "fraction@example.com", "Name": "Fraction"},
+        {"Member_ID": 1, "Email": "duplicate@example.com", "Name": "Duplicate"},
+        {"Member_ID": 20, "Email": "good@example.com", "Name": "Good", "Phone": "5550100"},
+    ])
+    assert import_table(conn, "TEAM_MEMBER", path, report=False) == (1, 6)
+    errors = read_errors(tmp_path / "members.errors.jsonl")
+    assert sorted(errors) == [1, 2, 3, 4, 5, 6]
+    assert errors[2] == "expected a JSON object"
+    assert errors[3] == "unknown column(s) Age"
+    assert errors[4] == "Name is required"
+    assert errors[5] == "Member_ID: '1.5' is not an integer"
+    assert "UNIQUE" in errors[6]
+    assert conn.execute("SELECT Phone FROM TEAM_MEMBER WHERE Member_ID = 20").fetchall() == [(5550100,)]
+
+
+def test_missing_parent_rows_are_rejected(conn, tmp_path):
+    path = write_lines(tmp_path / "links.jsonl", [
+        {"Project": 1, "Member": 3},
+        {"Project": 1, "Member": 99},
+        {"Project": 42, "Member": 3},
+    ])
+    assert import_table(conn, "PROJECT_MEMBERS", path, report=False) == (1, 2)
+    errors = read_errors(tmp_path / "links.errors.jsonl")
+    assert errors == {2: "Member 99 does not exist in TEAM_MEMBER", 3: "Project 42 does not exist in PROJECT"}
+
+
+def test_csv_round_trip(conn, tmp_path):
+    path = str(tmp_path / "members.csv")
+    assert export_table(conn, "TEAM_MEMBER", path) == 3
+    copy = connect_to_database(str(tmp_path / "copy.db"), report=False, in_memory=False)
+    try:
+        migrate(copy, report=False)
+        assert import_table(copy, "TEAM_MEMBER", path, report=False) == (3, 0)
+        assert member_emails(copy) == member_emails(conn)
+    finally:
+        copy.close()
+
+
+def test_csv_rows_with_the_wrong_field_count_are_rejected(conn, tmp_path):
+    path = tmp_path / "members.csv"
+    path.write_text("Member_ID,Email,Name\n30,a@example.com,A\n31,b@example.com\n32,c@example.com,C,extra\n")
+    assert import_table(conn, "TEAM_MEMBER", str(path), report=False) == (1, 2)
+    with open(tmp_path / "members.errors.csv", newline="") as errors:
+        assert [row["line"] for row in csv.DictReader(errors)] == ["3", "4"]